@@ -12,7 +12,7 @@ export const processSnapshot = async (imagePath, session, referenceEmbedding) =>
 
     // Call Python ML service for all detections
     try {
-      const mlResult = await detectObjects(imageBuffer);
+      const mlResult = await detectObjects(imageBuffer, session?._id?.toString());
       if (mlResult.violations && mlResult.violations.length > 0) {
         violations.push(...mlResult.violations);
         mlResult.violations.forEach(violation => {
@@ -0,0 +1,102 @@
+// One long-lived WebSocket to the ML stream server (ml_api/stream_server.py) per backend node.
+// Frames are sent as: 4-byte big-endian header length + JSON header + JPEG bytes, and results
+// come back as JSON messages tagged with the frame's frameId.
+
+const RESULT_TIMEOUT_MS = 20000;
+
+class MLStreamClient {
+  constructor(url) {
+    this.url = url;
+    this.socket = null;
+    this.connecting = null;
+    this.nextFrameId = 1;
+    this.pending = new Map(); // frameId -> { resolve, reject, timer }
+  }
+
+  connect() {
+    if (this.socket && this.socket.readyState === WebSocket.OPEN) return Promise.resolve(this.socket);
+    if (this.connecting) return this.connecting;
+
+    this.connecting = new Promise((resolve, reject) => {
+      const socket = new WebSocket(this.url);
+      socket.binaryType = 'arraybuffer';
+
+      socket.addEventListener('open', () => {
+        console.log(`🔌 Connected to ML stream at ${this.url}`);
+        this.socket = socket;
+        this.connecting = null;
+        resolve(socket);
+      });
+
+      socket.addEventListener('message', (event) => this.onMessage(event.data));
+
+      socket.addEventListener('close', () => {
+        this.socket = null;
+        this.connecting = null;
+        // Frames still waiting for a result will never get one on this connection
+        this.failPending(new Error('ML stream connection closed'));
+        reject(new Error('ML stream connection closed'));
+      });
+
+      socket.addEventListener('error', () => {
+        // 'close' follows and cleans up; the next frame reconnects
+        console.error(`❌ ML stream connection error (${this.url})`);
+      });
+    });
+    return this.connecting;
+  }
+
+  onMessage(data) {
+    let message;
+    try {
+      message = JSON.parse(typeof data === 'string' ? data : Buffer.from(data).toString('utf8'));
+    } catch (error) {
+      console.error('❌ Invalid ML stream message:', error.message);
+      return;
+    }
+
+    const entry = this.pending.get(message.frameId);
+    if (!entry) return;
+    this.pending.delete(message.frameId);
+    clearTimeout(entry.timer);
+    entry.resolve(message);
+  }
+
+  failPending(error) {
+    for (const { reject, timer } of this.pending.values()) {
+      clearTimeout(timer);
+      reject(error);
+    }
+    this.pending.clear();
+  }
+
+  // Send one frame and resolve with its /process-ml style result ({ dropped: true, reason } when the
+  // server skipped it under load)
+  async analyze(imageBuffer, sessionId) {
+    const socket = await this.connect();
+    const frameId = this.nextFrameId++;
+
+    const header = Buffer.from(JSON.stringify({ frameId, sessionId }));
+    const prefix = Buffer.alloc(4);
+    prefix.writeUInt32BE(header.length, 0);
+
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(frameId);
+        reject(new Error(`ML stream result timeout for frame ${frameId}`));
+      }, RESULT_TIMEOUT_MS);
+      this.pending.set(frameId, { resolve, reject, timer });
+      socket.send(Buffer.concat([prefix, header, imageBuffer]));
+    });
+  }
+}
+
+let client = null;
+
+// Shared client for ML_STREAM_URL (e.g. ws://localhost:5002), or null when streaming is not configured
+// or the Node runtime has no global WebSocket (Node 22+)
+export const getStreamClient = () => {
+  if (!process.env.ML_STREAM_URL || typeof WebSocket === 'undefined') return null;
+  if (!client) client = new MLStreamClient(process.env.ML_STREAM_URL);
+  return client;
+};
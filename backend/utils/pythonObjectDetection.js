@@ -1,15 +1,32 @@
 import axios from 'axios';
+import { getStreamClient } from './mlStreamClient.js';
 
-const detectObjects = async (imageBuffer) => {
-  try {
-    // Convert image buffer to base64
-    const base64Image = imageBuffer.toString('base64');
+// How long the ML service may keep a snapshot queued before answering 503 "overloaded";
+// kept below the HTTP timeout so overload shows up as an explicit error, not a timeout
+const ML_DEADLINE_MS = 15000;
+
+const detectObjects = async (imageBuffer, sessionId) => {
+  // Prefer the long-lived stream connection when ML_STREAM_URL is set
+  const streamClient = getStreamClient();
+  if (streamClient) {
+    try {
+      const data = await streamClient.analyze(imageBuffer, sessionId);
+      if (data.dropped) {
+        console.log(`⏭️ ML stream skipped frame (${data.reason})`);
+        return { violations: [] };
+      }
+      console.log(`🔍 ML stream processing completed - violations: ${data.violations?.join(', ') || 'none'}`);
+      return data;
+    } catch (error) {
+      console.error('❌ ML stream error, falling back to HTTP:', error.message);
+    }
+  }
 
-    // Call Flask ML service
-    const response = await axios.post('http://localhost:5001/process-ml', {
-      image: base64Image
-    }, {
-      headers: { 'Content-Type': 'application/json' },
+  try {
+    // Call Flask ML service with the raw JPEG bytes (no base64/JSON overhead)
+    const response = await axios.post('http://localhost:5001/process-ml', imageBuffer, {
+      params: sessionId ? { sessionId } : undefined,
+      headers: { 'Content-Type': 'image/jpeg', 'X-Deadline-Ms': String(ML_DEADLINE_MS) },
       timeout: 20000 // 20 second timeout
     });
 
@@ -20,9 +37,14 @@ const detectObjects = async (imageBuffer) => {
     return data;
 
   } catch (error) {
+    if (error.response?.status === 503 && error.response.data?.error === 'overloaded') {
+      // Shed by the ML service's admission control - the snapshot was not analyzed
+      console.warn(`⚠️ ML service overloaded (${error.response.data.reason}), snapshot skipped`);
+      return { violations: [], overloaded: true };
+    }
     console.error('❌ Flask ML service error:', error.message);
     // Return empty object on error to avoid breaking the flow
-    return { violations: [] };
+    return { violations: [], error: error.message };
   }
 };
 
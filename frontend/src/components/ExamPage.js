@@ -65,6 +65,8 @@ function ExamPage() {
       skipViolation = true;
     } else if (violationMsg.includes('ml_suspicious_object') && mlViolationCooldowns.object_detected > 0) {
       skipViolation = true;
+    } else if (violationMsg.includes('ml_object_detected') && mlViolationCooldowns.object_detected > 0) {
+      skipViolation = true;
     } else if (violationMsg.includes('no_face_detected') && mlViolationCooldowns.no_face_detected > 0) {
       skipViolation = true;
     } else if (violationMsg.includes('multiple_faces_detected') && mlViolationCooldowns.multiple_faces_detected > 0) {
@@ -144,6 +146,12 @@ function ExamPage() {
         setMlViolationCount(prev => prev + 1);
         isMLViolation = true;
         setMlViolationCooldowns(prev => ({ ...prev, object_detected: 5 }));
+      } else if (violationMsg.includes('ml_object_detected')) {
+        newCounts.ml_object_detected += 1;
+        newCounts.ml_violations += 1;
+        setMlViolationCount(prev => prev + 1);
+        isMLViolation = true;
+        setMlViolationCooldowns(prev => ({ ...prev, object_detected: 5 }));
       } else if (violationMsg.includes('ml_person_detected')) {
         newCounts.ml_object_detected += 1;
         newCounts.ml_violations += 1;
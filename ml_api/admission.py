@@ -0,0 +1,172 @@
+import os
+import heapq
+import logging
+import itertools
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+# Admission-control configuration (overridable through the environment)
+ADMISSION_MAX_INFLIGHT = int(os.environ.get("ML_MAX_INFLIGHT", "8"))           # requests analyzed at once
+ADMISSION_MAX_QUEUE = int(os.environ.get("ML_MAX_QUEUE", "32"))                # requests waiting behind them
+REQUEST_DEADLINE_MS = float(os.environ.get("ML_REQUEST_DEADLINE_MS", "15000"))  # longest wait for a slot
+
+# Request priorities; sessions that recently produced violations jump ahead of the rest
+PRIORITY_NORMAL = 0
+PRIORITY_FLAGGED = 1
+FLAGGED_WINDOW_SECONDS = float(os.environ.get("ML_FLAGGED_WINDOW_SECONDS", "120"))  # how long a violation raises priority
+
+# Number of recent admissions used for the wait-time p50/p99 estimate
+WAIT_WINDOW = 512
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of admitted; `reason` is queue_full, shed, deadline or frame_buffers."""
+
+    def __init__(self, reason):
+        super().__init__(f"overloaded: {reason}")
+        self.reason = reason
+
+
+class _Waiter:
+    def __init__(self, priority):
+        self.priority = priority
+        self.event = threading.Event()
+        self.status = None  # "admitted" or "shed" once decided
+
+
+class AdmissionController:
+    """
+    Bounded admission in front of the detectors: at most `max_inflight` requests are analyzed
+    at once and at most `max_queue` wait for a slot, highest priority first.
+
+    A request that finds the queue full is rejected right away, unless it outranks a queued
+    request, which is shed in its place. A request that waits longer than its deadline gives
+    up. Either way the caller gets Overloaded quickly instead of timing out on the client side.
+    """
+
+    def __init__(self, max_inflight=ADMISSION_MAX_INFLIGHT, max_queue=ADMISSION_MAX_QUEUE,
+                 deadline_ms=REQUEST_DEADLINE_MS):
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_queue = max(0, int(max_queue))
+        self.deadline_ms = float(deadline_ms)
+
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._queue = []  # heap of (-priority, sequence, waiter)
+        self._sequence = itertools.count()
+        self._admitted = 0
+        self._shed = Counter()
+        self._waits_ms = deque(maxlen=WAIT_WINDOW)
+
+    def acquire(self, priority=PRIORITY_NORMAL, deadline_ms=None):
+        """Block until a slot is free. Raises Overloaded if the request is shed or its deadline passes."""
+        deadline_ms = self.deadline_ms if deadline_ms is None else float(deadline_ms)
+        start = time.monotonic()
+
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._queue:
+                self._inflight += 1
+                self._record_admission(0.0)
+                return
+            if len(self._queue) >= self.max_queue:
+                self._make_room(priority)
+            waiter = _Waiter(priority)
+            heapq.heappush(self._queue, (-priority, next(self._sequence), waiter))
+
+        waiter.event.wait(max(0.0, deadline_ms / 1000.0))
+
+        with self._lock:
+            if waiter.status == "admitted":
+                self._record_admission((time.monotonic() - start) * 1000.0)
+                return
+            if waiter.status == "shed":
+                raise Overloaded("shed")
+            # Deadline passed while still queued
+            self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+            heapq.heapify(self._queue)
+            self._shed["deadline"] += 1
+            raise Overloaded("deadline")
+
+    def release(self):
+        """Free a slot, handing it straight to the highest-priority waiter if there is one."""
+        with self._lock:
+            if self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                waiter.status = "admitted"
+                waiter.event.set()
+            else:
+                self._inflight -= 1
+
+    def check_threads(self, threads):
+        """
+        Warn when the server's request threads (gunicorn `threads`) cannot reach this controller's
+        limits: requests beyond `threads` wait in the server's own queue, where they are never shed.
+        Returns: True when every in-flight and queued slot can be filled
+        """
+        if threads is None:
+            return True
+        threads = int(threads)
+        if self.max_inflight >= threads:
+            logging.warning(f"Admission control is inactive: ML_MAX_INFLIGHT={self.max_inflight} >= {threads} "
+                            f"request threads, so nothing ever queues or gets shed here")
+            return False
+        if self.max_inflight + self.max_queue > threads:
+            logging.warning(f"Only {threads - self.max_inflight} of ML_MAX_QUEUE={self.max_queue} queue slots are "
+                            f"reachable with {threads} request threads; raise ML_WORKER_THREADS")
+            return False
+        return True
+
+    def admit(self, priority=PRIORITY_NORMAL, deadline_ms=None):
+        """Context manager around acquire()/release()."""
+        return _Admission(self, priority, deadline_ms)
+
+    def stats(self):
+        """Queue depth, in-flight count, shed counters and recent p50/p99 wait for a slot."""
+        with self._lock:
+            waits = list(self._waits_ms)
+            stats = {
+                "inflight": self._inflight,
+                "queued": len(self._queue),
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "deadline_ms": self.deadline_ms,
+                "admitted": self._admitted,
+                "shed": dict(self._shed),
+            }
+        p50, p99 = (np.percentile(waits, [50, 99]).tolist() if waits else (0.0, 0.0))
+        stats.update({"wait_p50_ms": round(p50, 2), "wait_p99_ms": round(p99, 2)})
+        return stats
+
+    def _make_room(self, priority):
+        """Queue is full: shed the lowest-priority, newest waiter if it ranks below `priority`, or reject."""
+        victim = max(self._queue, key=lambda entry: (entry[0], entry[1])) if self._queue else None
+        if victim is None or victim[2].priority >= priority:
+            self._shed["queue_full"] += 1
+            raise Overloaded("queue_full")
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        victim[2].status = "shed"
+        victim[2].event.set()
+        self._shed["shed"] += 1
+
+    def _record_admission(self, wait_ms):
+        self._admitted += 1
+        self._waits_ms.append(wait_ms)
+
+
+class _Admission:
+    def __init__(self, controller, priority, deadline_ms):
+        self.controller = controller
+        self.priority = priority
+        self.deadline_ms = deadline_ms
+
+    def __enter__(self):
+        self.controller.acquire(self.priority, self.deadline_ms)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.controller.release()
+        return False
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# Micro-batching configuration (overridable through the environment)
+BATCH_MAX_SIZE = int(os.environ.get("ML_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("ML_BATCH_MAX_WAIT_MS", "15"))
+LATENCY_BUDGET_MS = float(os.environ.get("ML_LATENCY_BUDGET_MS", "1500"))  # p99 target per request
+
+# Number of recent requests used for the p50/p99 estimate
+LATENCY_WINDOW = 512
+
+
+class MicroBatcher:
+    """
+    Collects single-item submissions from many request threads and hands them to
+    `batch_fn` as one list, so the model runs one batched forward pass instead of N.
+
+    A batch is flushed as soon as it reaches the effective batch size or the oldest
+    item has waited `max_wait_ms`. If the observed p99 latency goes over
+    `latency_budget_ms`, the effective batch size is halved until it recovers.
+
+    Args:
+        batch_fn (callable): Takes a list of items and returns a list of results in the same order.
+        max_batch_size (int): Upper bound on items per forward pass.
+        max_wait_ms (float): Longest time the first item of a batch waits for company.
+        latency_budget_ms (float): p99 end-to-end latency the batcher tries to stay under.
+        name (str): Used for the worker thread name and log lines.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 latency_budget_ms=LATENCY_BUDGET_MS, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.latency_budget_ms = float(latency_budget_ms)
+        self.name = name
+
+        self._effective_batch_size = self.max_batch_size
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self._batches = 0
+        self._items = 0
+
+    def submit(self, item):
+        """Queue one item and return a Future that resolves to its own result."""
+        future = Future()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+            self._pending.append((item, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def run(self, item, timeout=None):
+        """Submit one item and block until its result is available."""
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self):
+        """Return batching counters and recent p50/p99 latency in milliseconds."""
+        with self._cond:
+            latencies = list(self._latencies_ms)
+            batches, items = self._batches, self._items
+            effective = self._effective_batch_size
+            pending = len(self._pending)
+
+        p50, p99 = (np.percentile(latencies, [50, 99]).tolist() if latencies else (0.0, 0.0))
+        return {
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+            "effective_batch_size": effective,
+            "max_batch_size": self.max_batch_size,
+            "pending": pending,
+            "p50_ms": round(p50, 2),
+            "p99_ms": round(p99, 2),
+            "latency_budget_ms": self.latency_budget_ms,
+        }
+
+    def _next_batch(self):
+        """Block until a batch is ready and pop it from the pending queue."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # Wait for more items until the batch is full or the oldest item hits max_wait
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self._effective_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._pending), self._effective_batch_size)
+            return [self._pending.popleft() for _ in range(size)]
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for item, _, _ in batch]
+
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logging.error(f"{self.name}: batch of {len(items)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+            self._record(batch, done)
+
+    def _record(self, batch, done):
+        """Track latency and shrink/grow the effective batch size against the budget."""
+        with self._cond:
+            self._batches += 1
+            self._items += len(batch)
+            for _, _, submitted in batch:
+                self._latencies_ms.append((done - submitted) * 1000.0)
+
+            if self._batches % 16 != 0 or len(self._latencies_ms) < 32:
+                return
+
+            p99 = float(np.percentile(self._latencies_ms, 99))
+            if p99 > self.latency_budget_ms and self._effective_batch_size > 1:
+                self._effective_batch_size = max(1, self._effective_batch_size // 2)
+                logging.warning(f"{self.name}: p99 {p99:.0f}ms over budget, batch size -> {self._effective_batch_size}")
+            elif p99 < 0.5 * self.latency_budget_ms and self._effective_batch_size < self.max_batch_size:
+                self._effective_batch_size += 1
@@ -0,0 +1,205 @@
+"""
+Reproducible latency/throughput benchmark for the ML service pipeline.
+
+Usage:
+    python benchmark.py [--images <dir>] [--repeat 3] [--concurrency 1,2,4,8]
+                        [--output report.json] [--baseline baseline.json] [--tolerance 0.15]
+
+Runs in-process against a fixed fixture set: generated frames at several resolutions and
+webcam-style scenes (seeded, so every run sees the same pixels), plus any JPEGs in --images.
+Reports per-stage timings (decode, resize, YOLO, post-processing, face mesh, gaze, head pose,
+verdict, JSON), end-to-end p50/p95/p99 latency and frames/second at each concurrency level.
+
+With --baseline, every p50/p95/p99 latency and fps figure is compared against the stored
+report; the exit code is 1 when anything regressed by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import ml_detections
+from fixtures import generate_fixtures, load_fixtures
+from image_io import FramePyramid, decode_reduced, YOLO_INPUT_WIDTH, FACE_INPUT_WIDTH
+from landmarks import iris_ratios, gaze_direction, mesh_array, mesh_pose_points, solve_head_poses
+from ml_detections import CONFIDENCE_THRESHOLD, PROHIBITED_CLASS_IDS, model, postprocess_result, _process_face_mesh
+import ml_service
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(samples_ms):
+    """p50/p95/p99/mean of a list of millisecond samples."""
+    if not samples_ms:
+        return {"count": 0}
+    values = np.percentile(samples_ms, PERCENTILES).tolist()
+    summary = {f"p{p}_ms": round(v, 3) for p, v in zip(PERCENTILES, values)}
+    summary.update({"mean_ms": round(float(np.mean(samples_ms)), 3), "count": len(samples_ms)})
+    return summary
+
+
+class StageTimer:
+    """Collects per-stage durations in milliseconds."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def report(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items()}
+
+
+def run_stages(fixtures, repeat):
+    """Time each pipeline stage separately, frame by frame, with a fresh session per fixture."""
+    timer = StageTimer()
+    for _ in range(repeat):
+        for name, image_bytes in fixtures:
+            session_id = f"bench-{name}"
+            base, original_size = timer.time("decode", decode_reduced, image_bytes, max(YOLO_INPUT_WIDTH, FACE_INPUT_WIDTH))
+            frame = FramePyramid(base, original_size)
+            yolo_frame = timer.time("resize", lambda: frame.yolo)
+            face_rgb = timer.time("resize_face", lambda: frame.face_rgb)
+
+            results = timer.time("yolo", model.predict, [yolo_frame], classes=PROHIBITED_CLASS_IDS)
+            labels, person_count, detected_objects = timer.time(
+                "postprocess", postprocess_result, results[0], yolo_frame, CONFIDENCE_THRESHOLD)
+
+            state = ml_detections.get_session_state(session_id)
+            mesh_results = timer.time("face_mesh", _process_face_mesh, state, face_rgb)
+            faces = mesh_results.multi_face_landmarks or []
+            analysis = {"face_count": len(faces), "gaze": "center", "ratio": None}
+            if faces:
+                points = timer.time("landmarks", mesh_array, faces[0])
+                horizontal, vertical = timer.time("gaze", iris_ratios, points)
+                analysis.update({"gaze": gaze_direction(horizontal, vertical), "ratio": horizontal})
+                timer.time("head_pose", solve_head_poses, [mesh_pose_points(points, frame.face.shape)], [frame.face.shape])
+
+            detection = (labels, yolo_frame, person_count, detected_objects)
+            response = timer.time("verdict", ml_service.analyze_frame, frame, detection, analysis, None, False)
+            timer.time("json", json.dumps, response)
+            ml_detections.session_store.discard(session_id)
+    return timer.report()
+
+
+def run_end_to_end(fixtures, repeat):
+    """Latency of the whole /process-ml path (decode + process_frame + JSON), one frame at a time."""
+    samples = []
+    for _ in range(repeat):
+        for _, image_bytes in fixtures:
+            samples.append(_process_one(image_bytes))
+    return summarize(samples)
+
+
+def run_throughput(fixtures, repeat, concurrency_levels):
+    """Frames/second and latency with N frames in flight at once."""
+    report = {}
+    jobs = [image_bytes for _ in range(repeat) for _, image_bytes in fixtures]
+    for concurrency in concurrency_levels:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            samples = list(pool.map(_process_one, jobs))
+            elapsed = time.perf_counter() - start
+        report[str(concurrency)] = dict(summarize(samples), fps=round(len(jobs) / elapsed, 2))
+    return report
+
+
+def _process_one(image_bytes):
+    """One frame through the service path with a throwaway session (no frame-gate hits). Returns: ms"""
+    session_id = f"bench-{uuid.uuid4().hex}"
+    start = time.perf_counter()
+    frame, error = ml_service.decode_bytes(image_bytes)
+    if not error:
+        json.dumps(ml_service.process_frame(frame, session_id))
+    elapsed = (time.perf_counter() - start) * 1000.0
+    ml_detections.session_store.discard(session_id)
+    return elapsed
+
+
+def compare(report, baseline, tolerance):
+    """
+    Metric-by-metric comparison with a stored report. Latencies regress when they grow, fps when it drops.
+    Returns: list of {"metric", "baseline", "current", "change"} for every regression beyond `tolerance`
+    """
+    def flatten(node, prefix=""):
+        for key, value in node.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, dict):
+                yield from flatten(value, path)
+            elif key == "fps" or (key.startswith("p") and key.endswith("_ms")):
+                yield path, key, value
+
+    current = {path: (key, value) for path, key, value in flatten({k: report[k] for k in ("stages", "end_to_end", "throughput")})}
+    regressions = []
+    for path, key, old in flatten({k: baseline.get(k, {}) for k in ("stages", "end_to_end", "throughput")}):
+        if path not in current or not old:
+            continue
+        new = current[path][1]
+        change = (new - old) / old
+        if (key == "fps" and change < -tolerance) or (key != "fps" and change > tolerance):
+            regressions.append({"metric": path, "baseline": old, "current": new, "change": round(change, 4)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of extra JPEG snapshots to include")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Stored report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    fixtures = generate_fixtures(args.seed) + (load_fixtures(args.images) if args.images else [])
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    # Cached results would measure the frame gate, not the pipeline
+    ml_service.frame_gate.enabled = False
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "model": model.version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fixtures": len(fixtures),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "startup": ml_detections.startup_metrics,
+        "stages": run_stages(fixtures, args.repeat),
+        "end_to_end": run_end_to_end(fixtures, args.repeat),
+        "throughput": run_throughput(fixtures, args.repeat, concurrency_levels),
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+        status = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
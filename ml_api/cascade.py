@@ -0,0 +1,152 @@
+import os
+import time
+import threading
+from collections import Counter, deque
+
+import numpy as np
+
+# Tiered-cascade configuration (overridable through the environment)
+CASCADE_ENABLED = os.environ.get("ML_CASCADE", "0").lower() in ("1", "true", "yes")
+CASCADE_FAST_SIZE = os.environ.get("ML_CASCADE_FAST_SIZE", "n").lower()             # YOLOv8 size of the first tier
+CASCADE_MIN_SCORE = float(os.environ.get("ML_CASCADE_MIN_SCORE", "0.25"))           # fast-tier boxes below this are ignored
+CASCADE_CONFIDENT_SCORE = float(os.environ.get("ML_CASCADE_CONFIDENT_SCORE", "0.6"))  # ... and above it are trusted
+CASCADE_AUDIT_EVERY = int(os.environ.get("ML_CASCADE_AUDIT_EVERY", "20"))           # heavy pass every N frames per session
+
+# Number of recent frames per tier used for the p50/p99 estimate
+LATENCY_WINDOW = 512
+
+TIERS = ("fast", "heavy")
+
+
+class TierStats:
+    """Frame count and recent latency of one cascade tier."""
+
+    def __init__(self):
+        self.frames = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, frames, seconds):
+        self.frames += frames
+        # A batched pass is charged to every frame in it
+        self.latencies_ms.extend([seconds * 1000.0] * frames)
+
+    def stats(self, total):
+        p50, p99 = (np.percentile(self.latencies_ms, [50, 99]).tolist() if self.latencies_ms else (0.0, 0.0))
+        return {
+            "frames": self.frames,
+            "hit_rate": round(self.frames / total, 4) if total else 0.0,
+            "p50_ms": round(p50, 2),
+            "p99_ms": round(p99, 2),
+        }
+
+
+class Cascade:
+    """
+    Two-tier object detection: a small YOLO answers the common "one student, nothing in hand"
+    frame and the large model only runs when the first tier cannot vouch for the result.
+
+    A frame is escalated to the heavy tier when the face check does not see exactly one face,
+    the fast tier sees anything other than exactly one confident person, any of its boxes falls
+    between `min_score` and `confident_score`, or the session's periodic audit is due.
+
+    Args:
+        fast_fn (callable): (frames, rois, confidence_threshold) -> detectObjects-style outputs.
+        heavy_fn (callable): (frames, rois) -> detectObjects-style outputs from the reference model.
+        min_score (float): Fast-tier confidence floor; weaker boxes are treated as background.
+        confident_score (float): Fast-tier boxes at or above this are accepted without a second look.
+        audit_every (int): Run the heavy tier on every Nth frame of a session regardless (0 = never).
+    """
+
+    def __init__(self, fast_fn, heavy_fn, min_score=CASCADE_MIN_SCORE, confident_score=CASCADE_CONFIDENT_SCORE,
+                 audit_every=CASCADE_AUDIT_EVERY):
+        self.fast_fn = fast_fn
+        self.heavy_fn = heavy_fn
+        self.min_score = min_score
+        self.confident_score = confident_score
+        self.audit_every = audit_every
+
+        self._lock = threading.Lock()
+        self._tiers = {tier: TierStats() for tier in TIERS}
+        self._escalations = Counter()
+        self._anonymous_frames = 0
+
+    def _audit_due(self, state):
+        """Count the frame against its session and report whether the periodic heavy pass is due."""
+        if self.audit_every <= 0:
+            return False
+        if state.session_id is None:
+            with self._lock:
+                self._anonymous_frames += 1
+                return self._anonymous_frames % self.audit_every == 0
+        with state.lock:
+            state.cascade_frames += 1
+            return state.cascade_frames % self.audit_every == 0
+
+    def escalation_reason(self, detection, face_count, audit_due=False):
+        """Why a fast-tier result must be checked by the heavy tier, or None if it can be served as is."""
+        labels_this_frame, _, person_count, detected_objects = detection
+        if face_count != 1:
+            return "face_count"
+        if any(obj != "person" for obj in detected_objects):
+            return "object"
+        if person_count != 1:
+            return "person_count"
+        if any(score < self.confident_score for _, score, _ in labels_this_frame):
+            return "uncertain"
+        if audit_due:
+            return "audit"
+        return None
+
+    def detect(self, frames, rois, face_counts, states):
+        """
+        Object detection for a list of frames through the cascade.
+
+        Args:
+            frames (list[ndarray]): YOLO-level BGR frames.
+            rois (list): Normalized crop per frame (None = full frame), see next_roi.
+            face_counts (list[int]): Faces found by the face check that already ran on each frame.
+            states (list[SessionState]): Session of each frame, for the periodic audit.
+
+        Returns:
+            list: One (detection, tier) pair per frame, in order; detection is the usual
+            (labels_this_frame, processed_frame, person_count, detected_objects) tuple.
+        """
+        if not frames:
+            return []
+
+        start = time.perf_counter()
+        fast = self.fast_fn(frames, rois, self.min_score)
+        fast_seconds = time.perf_counter() - start
+
+        reasons = [self.escalation_reason(detection, face_count, self._audit_due(state))
+                   for detection, face_count, state in zip(fast, face_counts, states)]
+        escalated = [i for i, reason in enumerate(reasons) if reason is not None]
+
+        outputs = [(detection, "fast") for detection in fast]
+        heavy_seconds = 0.0
+        if escalated:
+            start = time.perf_counter()
+            heavy = self.heavy_fn([frames[i] for i in escalated], [rois[i] for i in escalated])
+            heavy_seconds = time.perf_counter() - start
+            for i, detection in zip(escalated, heavy):
+                outputs[i] = (detection, "heavy")
+
+        with self._lock:
+            self._tiers["fast"].record(len(frames) - len(escalated), fast_seconds)
+            # Escalated frames paid for both passes
+            self._tiers["heavy"].record(len(escalated), fast_seconds + heavy_seconds)
+            self._escalations.update(reason for reason in reasons if reason is not None)
+        return outputs
+
+    def stats(self):
+        """Share of frames resolved by each tier, their p50/p99 latency and why frames were escalated."""
+        with self._lock:
+            total = sum(tier.frames for tier in self._tiers.values())
+            return {
+                "frames": total,
+                "tiers": {name: tier.stats(total) for name, tier in self._tiers.items()},
+                "escalations": dict(self._escalations),
+                "min_score": self.min_score,
+                "confident_score": self.confident_score,
+                "audit_every": self.audit_every,
+            }
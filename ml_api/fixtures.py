@@ -0,0 +1,63 @@
+"""
+Deterministic test images shared by the benchmark and load-generation tools.
+
+Generated fixtures are seeded, so every run sees the same pixels; real snapshots can be added
+from a directory. Only OpenCV and NumPy are needed, no models.
+"""
+import glob
+import os
+
+import cv2
+import numpy as np
+
+# Generated fixture resolutions (width, height): webcam presets from low to full HD
+RESOLUTIONS = ((320, 240), (640, 480), (1280, 720), (1920, 1080))
+SCENES_PER_RESOLUTION = 2
+JPEG_QUALITY = 85
+
+
+def _noise_frame(rng, width, height):
+    """Smooth random texture (noise blurred at low resolution) - compresses like a real photo."""
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def _webcam_frame(rng, width, height):
+    """Webcam-style scene: lit background, a head and shoulders in the middle, sometimes a phone-like object."""
+    frame = _noise_frame(rng, width, height)
+    frame = cv2.addWeighted(frame, 0.3, np.full_like(frame, rng.integers(90, 200, 3, dtype=np.uint8)), 0.7, 0)
+    cx, cy, scale = width // 2, int(height * 0.45), height / 480.0
+    cv2.ellipse(frame, (cx, height), (int(200 * scale), int(120 * scale)), 0, 180, 360, (60, 60, 120), -1)
+    cv2.ellipse(frame, (cx, cy), (int(70 * scale), int(95 * scale)), 0, 0, 360, (150, 180, 220), -1)
+    for dx in (-28, 28):
+        eye = (cx + int(dx * scale), cy - int(20 * scale))
+        cv2.ellipse(frame, eye, (int(14 * scale), int(7 * scale)), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(frame, eye, int(5 * scale), (40, 30, 20), -1)
+    cv2.ellipse(frame, (cx, cy + int(45 * scale)), (int(25 * scale), int(8 * scale)), 0, 0, 180, (60, 60, 160), 2)
+    if rng.random() < 0.5:
+        x, y = cx + int(110 * scale), cy + int(60 * scale)
+        cv2.rectangle(frame, (x, y), (x + int(40 * scale), y + int(80 * scale)), (20, 20, 20), -1)
+    return frame
+
+
+def generate_fixtures(seed=0):
+    """Deterministic fixture set: [(name, JPEG bytes)]."""
+    rng = np.random.default_rng(seed)
+    fixtures = []
+    for width, height in RESOLUTIONS:
+        for index in range(SCENES_PER_RESOLUTION):
+            for kind, make in (("noise", _noise_frame), ("webcam", _webcam_frame)):
+                ok, buffer = cv2.imencode(".jpg", make(rng, width, height), [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                if ok:
+                    fixtures.append((f"{kind}_{width}x{height}_{index}.jpg", buffer.tobytes()))
+    return fixtures
+
+
+def load_fixtures(image_dir):
+    """JPEG snapshots from a directory (e.g. saved exam snapshots): [(name, bytes)]."""
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.jpeg")))
+    fixtures = []
+    for path in paths:
+        with open(path, "rb") as f:
+            fixtures.append((os.path.basename(path), f.read()))
+    return fixtures
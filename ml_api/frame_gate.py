@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+# Change-detection configuration (overridable through the environment)
+GATE_ENABLED = os.environ.get("ML_FRAME_GATE", "1").lower() in ("1", "true", "yes")
+GATE_CELL_THRESHOLD = float(os.environ.get("ML_GATE_CELL_THRESHOLD", "20"))     # abs diff of one cell, 0-255 scale
+GATE_CHANGED_FRACTION = float(os.environ.get("ML_GATE_CHANGED_FRACTION", "0.005"))  # changed cells that count as a new frame
+GATE_MAX_SKIPS = int(os.environ.get("ML_GATE_MAX_SKIPS", "5"))                  # forced full check every N frames
+GATE_MAX_AGE_SECONDS = float(os.environ.get("ML_GATE_MAX_AGE_SECONDS", "15"))   # ... or every T seconds
+
+# Size of the grayscale thumbnail frames are compared on; one cell covers ~20x20 px of a 640x480 frame
+SIGNATURE_SIZE = (32, 24)
+
+
+def frame_signature(frame):
+    """Tiny blurred grayscale thumbnail of a BGR frame, cheap enough to compute on every request."""
+    small = cv2.resize(frame, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+class FrameGate:
+    """
+    Skips inference for snapshots that look the same as the session's last analyzed frame.
+
+    Thumbnail cells whose absolute difference from the last analyzed thumbnail reaches
+    `cell_threshold` are "changed"; a frame is "unchanged" while fewer than `changed_fraction`
+    of its cells changed. Counting cells rather than averaging the whole thumbnail keeps a small
+    local change (a phone or a second face in a corner) from being averaged away. The cached
+    result is then reused, except that a full analysis is forced after `max_skips` reuses or
+    `max_age_seconds`. The gate's memory lives on the SessionState and must be used with
+    `state.lock` held; the hit counters are shared by all sessions and have their own lock.
+    """
+
+    def __init__(self, enabled=GATE_ENABLED, cell_threshold=GATE_CELL_THRESHOLD,
+                 changed_fraction=GATE_CHANGED_FRACTION, max_skips=GATE_MAX_SKIPS,
+                 max_age_seconds=GATE_MAX_AGE_SECONDS):
+        self.enabled = enabled
+        self.cell_threshold = cell_threshold
+        self.changed_fraction = changed_fraction
+        self.max_skips = max_skips
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def changed(self, signature, reference):
+        """Whether enough thumbnail cells differ from the reference to need a full analysis."""
+        changed_cells = np.count_nonzero(cv2.absdiff(signature, reference) >= self.cell_threshold)
+        return changed_cells >= max(1.0, self.changed_fraction * signature.size)
+
+    def lookup(self, state, frame):
+        """
+        Returns: (cached result or None, signature) - pass the signature to store() after a full analysis.
+        """
+        signature = frame_signature(frame)
+        last = state.last_analysis
+        if not self.enabled or last is None or last["signature"].shape != signature.shape:
+            self._count(hit=False)
+            return None, signature
+
+        due = last["skips"] >= self.max_skips or time.monotonic() - last["time"] >= self.max_age_seconds
+        if due or self.changed(signature, last["signature"]):
+            self._count(hit=False)
+            return None, signature
+
+        last["skips"] += 1
+        self._count(hit=True)
+        return last["result"], signature
+
+    def store(self, state, signature, result):
+        """Remember a fully analyzed frame as the session's reference."""
+        if self.enabled:
+            state.last_analysis = {"signature": signature, "result": result, "skips": 0, "time": time.monotonic()}
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"enabled": self.enabled, "hits": hits, "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0}
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,66 @@
+"""
+Production serving for the ML service: a pre-fork gunicorn pool.
+
+    cd ml_api && gunicorn -c gunicorn.conf.py
+
+`preload_app` imports ml_service (YOLO weights and the MediaPipe models) once in the master,
+so every forked worker shares the weight pages copy-on-write instead of loading its own copy.
+Worker count follows the core count unless ML_WORKERS is set.
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+wsgi_app = os.environ.get("ML_WSGI_APP", "ml_service:app")
+bind = os.environ.get("ML_BIND", "0.0.0.0:5001")
+
+# Load models in the master before forking
+preload_app = True
+
+# Intra-op threads per worker; workers x threads should not exceed the core count.
+# OpenMP reads its thread count once, when the preloaded app first loads it, so it has to be
+# in the environment before the app is imported; torch and OpenCV are also set per worker below
+THREADS_PER_WORKER = int(os.environ.get("ML_THREADS_PER_WORKER", "1"))
+os.environ["OMP_NUM_THREADS"] = str(THREADS_PER_WORKER)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from admission import ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE  # noqa: E402
+
+# One worker per core. Each gets a request thread for every admission slot, in flight or queued:
+# gthread queues requests beyond `threads` internally, out of reach of admission control, where
+# overload would again surface as a client timeout instead of a fast 503
+workers = int(os.environ.get("ML_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("ML_WORKER_THREADS", ADMISSION_MAX_INFLIGHT + ADMISSION_MAX_QUEUE))
+# Seen by the preloaded app, which warns when its admission limits exceed the thread count
+os.environ["ML_WORKER_THREADS"] = str(threads)
+
+# Inference can legitimately take a while on a cold CPU; drain in-flight frames on shutdown
+timeout = int(os.environ.get("ML_WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("ML_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far (models included) out of the GC's reach, so collections
+    # in the workers don't write to - and un-share - the preloaded pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    try:
+        import torch
+        torch.set_num_threads(THREADS_PER_WORKER)
+    except ImportError:
+        pass
+    import cv2
+    cv2.setNumThreads(THREADS_PER_WORKER)
+    server.log.info(f"Worker {worker.pid} ready with {THREADS_PER_WORKER} inference thread(s)")
+
+
+def worker_exit(server, worker):
+    # Release per-session detector state once in-flight requests have drained
+    module = sys.modules.get(wsgi_app.split(":")[0])
+    if module is not None and hasattr(module, "shutdown"):
+        module.shutdown()
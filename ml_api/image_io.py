@@ -0,0 +1,239 @@
+import io
+import os
+import cv2
+import numpy as np
+
+# Content types accepted as a raw image body (no JSON, no base64)
+RAW_IMAGE_TYPES = ("image/jpeg", "image/jpg", "image/png", "image/webp", "application/octet-stream")
+
+# Request fields that may accompany a binary upload (query string, form field or X- header)
+UPLOAD_FIELDS = {"sessionId": "X-Session-Id", "annotate": "X-Annotate", "deadlineMs": "X-Deadline-Ms"}
+
+# Pyramid level widths shared by the detectors
+YOLO_INPUT_WIDTH = int(os.environ.get("ML_YOLO_INPUT_WIDTH", "640"))
+FACE_INPUT_WIDTH = int(os.environ.get("ML_FACE_INPUT_WIDTH", "480"))
+
+# JPEG scale factors libjpeg can decode to directly (DCT scaling)
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+# JPEG start-of-frame markers that carry the image size
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Assumed decoded size of a frame whose header cannot be read (a 1080p BGR image)
+DEFAULT_DECODED_SHAPE = (1080, 1920)
+
+
+def decode_image_buffer(buffer, flags=cv2.IMREAD_COLOR):
+    """Decode encoded image bytes (bytes, bytearray or memoryview) without copying them first."""
+    nparr = np.frombuffer(buffer, np.uint8)
+    if nparr.size == 0:
+        return None
+    return cv2.imdecode(nparr, flags)
+
+
+def jpeg_size(buffer):
+    """(height, width) read from a JPEG header without decoding, or None if not a JPEG."""
+    data = memoryview(buffer)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return height, width
+        i += 2 + length
+    return None
+
+
+def png_size(buffer):
+    """(height, width) read from a PNG IHDR chunk without decoding, or None if not a PNG."""
+    data = memoryview(buffer)
+    if len(data) < 24 or bytes(data[:8]) != _PNG_SIGNATURE:
+        return None
+    return int.from_bytes(data[20:24], "big"), int.from_bytes(data[16:20], "big")
+
+
+def _reduced_scale(size, min_width):
+    """(imdecode flags, scale factor) of the smallest JPEG DCT scale still at least `min_width` wide."""
+    if size is not None:
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS.items():
+            if size[1] // factor >= min_width:
+                return reduced_flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+def decoded_shape(buffer, min_width):
+    """
+    (height, width) decode_reduced will produce for `buffer`, read from the header only.
+    Returns: None when the format has no size header this module understands
+    """
+    size = jpeg_size(buffer)
+    if size is not None:
+        _, factor = _reduced_scale(size, min_width)
+        # libjpeg rounds scaled dimensions up
+        return -(-size[0] // factor), -(-size[1] // factor)
+    return png_size(buffer)
+
+
+def decode_reduced(buffer, min_width):
+    """
+    Decode an image at the smallest JPEG DCT scale (1/2, 1/4, 1/8) that is still at least
+    `min_width` wide. Non-JPEG input and small images are decoded at full size.
+    Returns: (frame, original (height, width)) - frame is None if decoding failed
+    """
+    size = jpeg_size(buffer)
+    flags, _ = _reduced_scale(size, min_width)
+
+    frame = decode_image_buffer(buffer, flags)
+    if frame is None:
+        return None, size
+    return frame, size or frame.shape[:2]
+
+
+class FramePyramid:
+    """
+    One decoded snapshot at the sizes the detectors need, built once per frame.
+
+    `base` is the reduced-scale decode; `yolo` and `face` are cached downscales of it
+    (or `base` itself when it is already small enough), and `face_rgb` is the single
+    BGR->RGB conversion shared by every face stage.
+    """
+
+    def __init__(self, base, original_size=None):
+        self.base = base
+        self.original_size = original_size or base.shape[:2]
+        self._levels = {}
+        self._face_rgb = None
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """Decode straight to the smallest scale that still covers every pyramid level."""
+        frame, original_size = decode_reduced(buffer, max(YOLO_INPUT_WIDTH, FACE_INPUT_WIDTH))
+        if frame is None:
+            return None
+        return cls(frame, original_size)
+
+    @staticmethod
+    def estimate_nbytes(buffer):
+        """
+        Upper estimate of the memory a pyramid decoded from `buffer` holds (base decode,
+        YOLO and face levels, face RGB copy), from the image header alone.
+        """
+        shape = decoded_shape(buffer, max(YOLO_INPUT_WIDTH, FACE_INPUT_WIDTH))
+        height, width = shape if shape and min(shape) > 0 else DEFAULT_DECODED_SHAPE
+        total = height * width * 3
+        for level_width, copies in ((YOLO_INPUT_WIDTH, 1), (FACE_INPUT_WIDTH, 2)):
+            level_width = min(level_width, width)
+            # A level equal to the base shares its pixels; the face RGB copy never does
+            copies -= level_width == width
+            total += copies * int(round(height * level_width / width)) * level_width * 3
+        return total
+
+    def level(self, width):
+        """The frame resized to `width` (aspect ratio kept); never upscales."""
+        if self.base.shape[1] <= width:
+            return self.base
+        if width not in self._levels:
+            height = int(round(self.base.shape[0] * width / self.base.shape[1]))
+            self._levels[width] = cv2.resize(self.base, (width, height), interpolation=cv2.INTER_AREA)
+        return self._levels[width]
+
+    @property
+    def shape(self):
+        return self.base.shape
+
+    @property
+    def yolo(self):
+        return self.level(YOLO_INPUT_WIDTH)
+
+    @property
+    def face(self):
+        return self.level(FACE_INPUT_WIDTH)
+
+    @property
+    def face_rgb(self):
+        if self._face_rgb is None:
+            self._face_rgb = cv2.cvtColor(self.face, cv2.COLOR_BGR2RGB)
+        return self._face_rgb
+
+
+def is_binary_request(req):
+    """True for raw image bodies and multipart uploads; False for the JSON/base64 path."""
+    return req.mimetype in RAW_IMAGE_TYPES or req.mimetype == "multipart/form-data"
+
+
+def _read_body(req):
+    """Read a raw request body straight into one preallocated buffer."""
+    length = req.content_length
+    stream = req.stream
+    if not length or not hasattr(stream, "readinto"):
+        return req.get_data(cache=False)
+
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        n = stream.readinto(view[received:])
+        if not n:
+            break
+        received += n
+    return view[:received]
+
+
+def _read_file(file_storage):
+    """Bytes of an uploaded file; in-memory uploads are exposed without a copy."""
+    stream = file_storage.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getbuffer()
+    return stream.read()
+
+
+def _fields(req, source):
+    fields = {}
+    for name, header in UPLOAD_FIELDS.items():
+        value = source.get(name, req.headers.get(header))
+        if value is not None:
+            fields[name] = value
+    if "annotate" in fields:
+        fields["annotate"] = str(fields["annotate"]).lower() in ("1", "true", "yes")
+    return fields
+
+
+def read_binary_images(req, name="image"):
+    """
+    Pull encoded images out of a raw-body or multipart request.
+
+    Raw bodies (`Content-Type: image/jpeg`, ...) yield one image whose fields come from the
+    query string or X-Session-Id / X-Annotate headers. Multipart requests yield one image per
+    `name` file part, paired in order with the repeated `sessionId` form fields.
+
+    Returns:
+        list: (buffer, fields) tuples, where buffer is bytes-like and fields holds sessionId/annotate.
+    """
+    if req.mimetype == "multipart/form-data":
+        files = req.files.getlist(name)
+        session_ids = req.form.getlist("sessionId")
+        shared = _fields(req, req.form)
+        uploads = []
+        for i, file_storage in enumerate(files):
+            fields = dict(shared)
+            if i < len(session_ids):
+                fields["sessionId"] = session_ids[i]
+            uploads.append((_read_file(file_storage), fields))
+        return uploads
+
+    return [(_read_body(req), _fields(req, req.args))]
@@ -0,0 +1,141 @@
+import os
+import time
+import logging
+from ultralytics import YOLO
+
+# Inference backend and YOLOv8 size, chosen by configuration
+ML_BACKEND = os.environ.get("ML_BACKEND", "pytorch").lower()        # pytorch | onnx | openvino
+ML_MODEL_SIZE = os.environ.get("ML_MODEL_SIZE", "l").lower()          # n | s | m | l
+ML_PRECISION = os.environ.get("ML_PRECISION", "fp32").lower()         # fp32 | fp16 | int8
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_SIZES = ("n", "s", "m", "l")
+
+# Export format and the artifact Ultralytics writes next to the .pt weights for each backend
+BACKENDS = {
+    "pytorch": {"format": None, "suffix": ".pt"},
+    "onnx": {"format": "onnx", "suffix": ".onnx"},
+    "openvino": {"format": "openvino", "suffix": "_openvino_model"},
+}
+
+# Reduced precisions each backend supports. fp16 halves the weights, int8 roughly quarters them:
+#   pytorch fp16     half-precision inference on CUDA (refused without a GPU: Ultralytics would run fp32 on CPU)
+#   onnx int8        dynamic quantization of the exported model (ONNX Runtime, int8 weights, CPU)
+#   openvino fp16    weights compressed to fp16 at export, decompressed per layer on CPU
+PRECISIONS = {
+    "pytorch": ("fp32", "fp16"),
+    "onnx": ("fp32", "int8"),
+    "openvino": ("fp32", "fp16"),
+}
+
+
+def weights_path(size=ML_MODEL_SIZE):
+    """Path of the PyTorch weights for a model size; bare names are downloaded by Ultralytics."""
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Unknown model size '{size}', expected one of {MODEL_SIZES}")
+    local = os.path.join(MODEL_DIR, f"yolov8{size}.pt")
+    return local if os.path.exists(local) else f"yolov8{size}.pt"
+
+
+def check_precision(backend, precision):
+    if precision not in PRECISIONS.get(backend, ("fp32",)):
+        raise ValueError(f"Precision '{precision}' is not supported on the {backend} backend, "
+                         f"expected one of {PRECISIONS.get(backend, ('fp32',))}")
+    if backend == "pytorch" and precision == "fp16":
+        import torch
+        if not torch.cuda.is_available():
+            raise ValueError("Precision 'fp16' on the pytorch backend needs CUDA; without a GPU inference "
+                             "would silently run in fp32 (use openvino fp16 or onnx int8 on CPU)")
+
+
+def export_model(backend=ML_BACKEND, size=ML_MODEL_SIZE, force=False, precision=ML_PRECISION):
+    """
+    Export the .pt weights to `backend` at `precision` once and return the artifact path.
+    The export is cached on disk next to the weights and reused on later startups.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {tuple(BACKENDS)}")
+    check_precision(backend, precision)
+
+    source = weights_path(size)
+    spec = BACKENDS[backend]
+    if spec["format"] is None:
+        # PyTorch fp16 is applied at inference time, the weights file stays the same
+        return source
+
+    tag = "" if precision == "fp32" else f"-{precision}"
+    target = os.path.join(MODEL_DIR, f"yolov8{size}{tag}{spec['suffix']}")
+    if os.path.exists(target) and not force:
+        return target
+
+    if precision == "int8":
+        return quantize_onnx(export_model("onnx", size, force, "fp32"), target)
+
+    logging.info(f"Exporting {source} to {backend} {precision} (one-time)")
+    start = time.perf_counter()
+    # Dynamic axes keep batched inference and non-default imgsz working on the exported model
+    exported = YOLO(source).export(format=spec["format"], dynamic=True, half=precision == "fp16")
+    logging.info(f"Exported {exported} in {time.perf_counter() - start:.1f}s")
+
+    if os.path.abspath(str(exported)) != target and os.path.exists(str(exported)):
+        os.replace(str(exported), target)
+    return target
+
+
+def quantize_onnx(source, target):
+    """Dynamic int8 quantization of an exported ONNX model (weights int8, activations quantized per batch)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logging.info(f"Quantizing {source} to int8 (one-time)")
+    start = time.perf_counter()
+    tmp_path = f"{target}.tmp"
+    quantize_dynamic(source, tmp_path, weight_type=QuantType.QUInt8)
+    os.replace(tmp_path, target)
+    logging.info(f"Quantized {target} in {time.perf_counter() - start:.1f}s "
+                 f"({os.path.getsize(source) / 1e6:.0f} MB -> {os.path.getsize(target) / 1e6:.0f} MB)")
+    return target
+
+
+class InferenceBackend:
+    """
+    YOLO detector behind a backend-agnostic interface.
+
+    PyTorch, ONNX Runtime and OpenVINO models all load through Ultralytics' AutoBackend,
+    so `predict` and `names` behave the same whichever backend is configured.
+    """
+
+    def __init__(self, backend=ML_BACKEND, size=ML_MODEL_SIZE, precision=ML_PRECISION):
+        self.backend = backend
+        self.size = size
+        self.precision = precision
+        self.path = export_model(backend, size, precision=precision)
+
+        start = time.perf_counter()
+        self.model = YOLO(self.path, task="detect")
+        self.load_seconds = time.perf_counter() - start
+        logging.info(f"Loaded yolov8{size} ({backend} {precision}) from {self.path} in {self.load_seconds:.2f}s")
+
+    @property
+    def names(self):
+        return self.model.names
+
+    @property
+    def version(self):
+        """Identifies the weights and runtime that produced a result."""
+        suffix = "" if self.precision == "fp32" else f"-{self.precision}"
+        return f"yolov8{self.size}-{self.backend}{suffix}"
+
+    def predict(self, frames, **kwargs):
+        """Run one forward pass over a frame or a list of frames."""
+        kwargs.setdefault("verbose", False)
+        if self.backend == "pytorch" and self.precision == "fp16":
+            kwargs.setdefault("half", True)
+        return self.model(frames, **kwargs)
+
+    def __call__(self, frames, **kwargs):
+        return self.predict(frames, **kwargs)
+
+
+def load_model(backend=ML_BACKEND, size=ML_MODEL_SIZE, precision=ML_PRECISION):
+    """Build the configured inference backend."""
+    return InferenceBackend(backend, size, precision)
@@ -0,0 +1,192 @@
+import os
+from collections import Counter, deque
+
+import numpy as np
+
+# FaceMesh with refine_landmarks=True: 468 face landmarks plus 2 x 5 iris landmarks
+NUM_MESH_LANDMARKS = 478
+
+# 3D reference points for head pose (nose tip, chin, eye outer corners, mouth corners)
+HEAD_MODEL_POINTS_3D = np.array([
+    (0.0, 0.0, 0.0),             # Nose tip
+    (0.0, -330.0, -65.0),        # Chin
+    (-225.0, 170.0, -135.0),     # Left eye left corner
+    (225.0, 170.0, -135.0),      # Right eye right corner
+    (-150.0, -150.0, -125.0),    # Left Mouth corner
+    (150.0, -150.0, -125.0)      # Right mouth corner
+], dtype=np.float64)
+
+# Landmark indexes matching HEAD_MODEL_POINTS_3D, for FaceMesh and for dlib's 68-point model
+MESH_HEAD_POSE = np.array([1, 152, 33, 263, 61, 291])
+DLIB_HEAD_POSE = np.array([30, 8, 36, 45, 48, 54])
+
+# FaceMesh eye geometry, one row per eye (left, right)
+MESH_IRIS = np.array([[468, 469, 470, 471], [473, 474, 475, 476]])
+MESH_EYE_CORNERS = np.array([[33, 133], [362, 263]])   # (outer/left, inner/right) corner per eye
+MESH_EYE_LIDS = np.array([[159, 145], [386, 374]])     # (upper, lower) lid per eye
+
+# Model points relative to the nose tip and their pseudo-inverse, shared by every head-pose solve
+_MODEL_CENTERED = HEAD_MODEL_POINTS_3D - HEAD_MODEL_POINTS_3D[0]
+_MODEL_PINV = np.linalg.pinv(_MODEL_CENTERED)   # (3, 6)
+POSIT_ITERATIONS = 5
+
+# dlib 68-point eyes and nose tip
+DLIB_EYES = np.array([range(36, 42), range(42, 48)])
+DLIB_NOSE_TIP = 30
+
+# Gaze thresholds on the iris position inside the eye (0.5 = centered)
+GAZE_LEFT = 0.35
+GAZE_RIGHT = 0.65
+GAZE_UP = float(os.environ.get("ML_GAZE_UP", "0.25"))
+GAZE_DOWN = float(os.environ.get("ML_GAZE_DOWN", "0.75"))
+# Eyes opened less than this (lid gap / eye width) are blinking; their vertical ratio is meaningless
+MIN_EYE_OPENING = 0.12
+
+
+def mesh_array(face_landmarks):
+    """One FaceMesh face as a contiguous (478, 3) float32 array of normalized x, y, z ((468, 3) without iris refinement)."""
+    return np.array([(p.x, p.y, p.z) for p in face_landmarks.landmark], dtype=np.float32)
+
+
+def shape_array(shape):
+    """A dlib full_object_detection as a (68, 2) float64 array of pixel coordinates."""
+    return np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float64)
+
+
+def iris_ratios(points):
+    """
+    Horizontal and vertical iris position inside the eyes from a mesh_array, averaged over both eyes.
+    Returns: (horizontal ratio, vertical ratio or None while blinking) - 0.5 is centered
+    """
+    iris_centers = points[MESH_IRIS, :2].mean(axis=1)          # (2, 2)
+    corners = points[MESH_EYE_CORNERS, :2]                     # (2, 2 corners, 2)
+    lids = points[MESH_EYE_LIDS, :2]                           # (2, 2 lids, 2)
+
+    widths = np.abs(corners[:, 1, 0] - corners[:, 0, 0])
+    horizontal = float(np.mean((iris_centers[:, 0] - corners[:, 0, 0]) / widths))
+
+    openings = lids[:, 1, 1] - lids[:, 0, 1]
+    if np.any(openings < MIN_EYE_OPENING * widths):
+        return horizontal, None
+    vertical = float(np.mean((iris_centers[:, 1] - lids[:, 0, 1]) / openings))
+    return horizontal, vertical
+
+
+def gaze_direction(horizontal, vertical=None):
+    """Raw (unsmoothed) gaze label from iris ratios; horizontal looks win over vertical ones."""
+    if horizontal < GAZE_LEFT:
+        return "left"
+    if horizontal > GAZE_RIGHT:
+        return "right"
+    if vertical is not None:
+        if vertical < GAZE_UP:
+            return "up"
+        if vertical > GAZE_DOWN:
+            return "down"
+    return "center"
+
+
+def solve_head_poses(image_points, frame_shapes, iterations=POSIT_ITERATIONS):
+    """
+    Head pose for many faces in one vectorized pass (POSIT: scaled-orthographic pose refined
+    for perspective over a few fixed iterations, all faces at once).
+
+    Args:
+        image_points (ndarray): (N, 6, 2) pixels of the HEAD_MODEL_POINTS_3D landmarks, one row per face.
+        frame_shapes (list): Frame shape (height, width, ...) of each face.
+        iterations (int): Perspective refinement steps; 5 is within a fraction of a degree of solvePnP.
+
+    Returns:
+        ndarray: (N, 3) pitch, yaw, roll in degrees, NaN rows for degenerate faces.
+    """
+    image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, len(HEAD_MODEL_POINTS_3D), 2)
+    if not len(image_points):
+        return np.empty((0, 3))
+    sizes = np.array([shape[:2] for shape in frame_shapes], dtype=np.float64)  # (N, 2) height, width
+    height, width = sizes[:, :1], sizes[:, 1:]
+
+    # Normalized camera coordinates (focal length = frame width, principal point = center)
+    x = (image_points[..., 0] - width / 2) / width
+    y = (image_points[..., 1] - height / 2) / width
+
+    corrections = np.zeros_like(x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(max(1, iterations)):
+            xs, ys = x * (1 + corrections), y * (1 + corrections)
+            i = (xs - xs[:, :1]) @ _MODEL_PINV.T   # (N, 3) scaled first and second rotation rows
+            j = (ys - ys[:, :1]) @ _MODEL_PINV.T
+            scale_i, scale_j = np.linalg.norm(i, axis=1), np.linalg.norm(j, axis=1)
+            i, j = i / scale_i[:, None], j / scale_j[:, None]
+            k = np.cross(i, j)
+            k /= np.linalg.norm(k, axis=1)[:, None]
+            depth = 2.0 / (scale_i + scale_j)
+            corrections = (_MODEL_CENTERED @ k.T).T / depth[:, None]
+
+    valid = np.all(np.isfinite(k), axis=1) & np.all(np.isfinite(i), axis=1) & np.all(np.isfinite(j), axis=1)
+    poses = np.full((len(image_points), 3), np.nan)
+    if not np.any(valid):
+        return poses
+
+    # Nearest true rotation to the estimated rows
+    u, _, vt = np.linalg.svd(np.stack([i[valid], j[valid], k[valid]], axis=1))
+    rotations = u @ vt
+
+    # Same angles as cv2.decomposeProjectionMatrix, folded back around 0° like solvePnP results
+    pitch = np.arctan2(rotations[:, 2, 1], rotations[:, 2, 2])
+    yaw = np.arctan2(-rotations[:, 2, 0], np.hypot(rotations[:, 2, 1], rotations[:, 2, 2]))
+    roll = np.arctan2(rotations[:, 1, 0], rotations[:, 0, 0])
+    poses[valid] = (np.degrees(np.stack([pitch, yaw, roll], axis=1)) + 90.0) % 180.0 - 90.0
+    return poses
+
+
+def solve_head_pose(image_points, frame_shape):
+    """Head pose (pitch, yaw, roll) in degrees from the six HEAD_MODEL_POINTS_3D pixels of one face, or None."""
+    pose = solve_head_poses(image_points[None], [frame_shape])[0]
+    return tuple(pose.tolist()) if np.all(np.isfinite(pose)) else None
+
+
+def mesh_pose_points(points, frame_shape):
+    """Pixels of the head-pose landmarks in a mesh_array (normalized coordinates scaled to the frame)."""
+    height, width = frame_shape[:2]
+    return points[MESH_HEAD_POSE, :2] * (width, height)
+
+
+def mesh_head_pose(points, frame_shape):
+    """Head pose from a mesh_array."""
+    return solve_head_pose(mesh_pose_points(points, frame_shape), frame_shape)
+
+
+def dlib_gaze_direction(points, threshold=5.0):
+    """Gaze from a shape_array: horizontal offset of the eye centers from the nose tip, in pixels."""
+    eye_center_x = points[DLIB_EYES, 0].mean()
+    dx = eye_center_x - points[DLIB_NOSE_TIP, 0]
+    if abs(dx) < threshold:
+        return "center"
+    return "right" if dx > 0 else "left"
+
+
+class GazeVoter:
+    """
+    Majority vote over the last `window` gaze labels with O(1) updates: a deque holds the
+    window and a Counter its label counts, so nothing is rescanned when a label is added.
+    Ties go to the most recent label.
+    """
+
+    def __init__(self, window):
+        self.labels = deque(maxlen=window)
+        self.counts = Counter()
+
+    def vote(self, label):
+        """Add a label and return the window's majority label."""
+        if len(self.labels) == self.labels.maxlen:
+            oldest = self.labels[0]
+            self.counts[oldest] -= 1
+            if not self.counts[oldest]:
+                del self.counts[oldest]
+        self.labels.append(label)
+        self.counts[label] += 1
+        # At most a handful of distinct labels, so this is constant time
+        return max(self.counts, key=lambda candidate: (self.counts[candidate], candidate == label))
+
+    def __len__(self):
+        return len(self.labels)
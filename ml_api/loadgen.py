@@ -0,0 +1,482 @@
+"""
+Load generator for the ML service that stands in for the Node backend.
+
+Usage:
+    python loadgen.py [--url http://localhost:5001] [--sessions 10,50,100] [--duration 120]
+                      [--interval 7] [--payload binary|json|multipart] [--images <dir>]
+                      [--session-length 3600] [--static-scene] [--output report.json]
+
+Each simulated exam session gets a Mongo-style sessionId and starts at a random point of its first
+snapshot interval. After that it posts one snapshot every --interval seconds, with +/-10% timer
+jitter. The load is open loop like the frontend's setInterval: a slow answer does not delay the
+next snapshot. After --session-length seconds the session ends and a new one (with a new
+sessionId) takes its place, so per-session state is created and evicted as in a real exam window.
+Payloads are built the way the backend sends them:
+    binary     raw JPEG body, sessionId query parameter, X-Deadline-Ms (utils/pythonObjectDetection.js)
+    json       {"image": <base64>, "sessionId": ...} (routes/exam.js)
+    multipart  `image` file part plus a sessionId form field (server.js)
+
+Snapshots cycle through the fixtures (generated scenes plus any --images), so every one needs a
+full analysis. With --static-scene, each session keeps one scene, like a student sitting still,
+and the frame gate can answer. Every snapshot carries unique bytes (a JPEG comment with the
+session and sequence number), so the result cache never answers a repeat that a real webcam
+would not send.
+
+Each --sessions level runs for --duration seconds. For every level the report gives:
+    offered and achieved snapshots/s
+    latency percentiles of the answered snapshots
+    the share that failed (overloaded 503, other errors) or took longer than the backend's 20 s --timeout
+    CPU and memory of the server workers that answered a /metrics scrape (see --workers)
+The throughput ceiling is the highest achieved rate of any level that stayed within
+--max-failure-rate.
+
+Only the standard library is used for HTTP; no models are loaded.
+"""
+import argparse
+import base64
+import heapq
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from fixtures import generate_fixtures, load_fixtures
+
+# What the Node backend does (utils/pythonObjectDetection.js, ExamPage.js)
+BACKEND_TIMEOUT_S = 20.0       # axios timeout on /process-ml
+BACKEND_DEADLINE_MS = 15000    # X-Deadline-Ms: admission wait the backend accepts
+SNAPSHOT_INTERVAL_S = 7.0      # periodic capture interval of the exam page
+TIMER_JITTER = 0.1             # browser timers drift by a few percent; spreads synchronized sessions
+
+PAYLOADS = ("binary", "json", "multipart")
+OUTCOMES = ("ok", "overloaded", "timeout", "http_error", "connection_error")
+PERCENTILES = (50, 90, 95, 99)
+
+# Sender threads are capped; beyond this the generator itself becomes the bottleneck (see send lag)
+MAX_SENDERS = 2048
+
+_METRIC_LINE = re.compile(r'^(ml_process_cpu_seconds_total|ml_process_memory_bytes)\{([^}]*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def new_session_id():
+    """A 24-hex-digit id shaped like the Mongo ObjectId the backend hands out as sessionId."""
+    return os.urandom(12).hex()
+
+
+def tag_jpeg(image_bytes, text):
+    """The same JPEG with a comment segment after SOI, so its bytes (and content hash) are unique."""
+    if image_bytes[:2] != b"\xff\xd8":
+        return image_bytes
+    comment = text.encode("ascii")[:65000]
+    return b"\xff\xd8\xff\xfe" + (len(comment) + 2).to_bytes(2, "big") + comment + image_bytes[2:]
+
+
+def build_request(payload, image_bytes, session_id):
+    """(path, body, headers) of one snapshot, shaped like the backend route that sends `payload`."""
+    content_type = "image/png" if image_bytes[:4] == b"\x89PNG" else "image/jpeg"
+    if payload == "binary":
+        return (f"/process-ml?{urlencode({'sessionId': session_id})}", image_bytes,
+                {"Content-Type": content_type, "X-Deadline-Ms": str(BACKEND_DEADLINE_MS)})
+    if payload == "json":
+        body = json.dumps({"image": base64.b64encode(image_bytes).decode("ascii"), "sessionId": session_id})
+        return "/process-ml", body.encode("utf-8"), {"Content-Type": "application/json"}
+
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f'--{boundary}\r\nContent-Disposition: form-data; name="sessionId"\r\n\r\n{session_id}\r\n'.encode("utf-8"),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="frame.jpg"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'.encode("utf-8"),
+        image_bytes,
+        f"\r\n--{boundary}--\r\n".encode("utf-8"),
+    ])
+    return "/process-ml", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+class Client:
+    """
+    One keep-alive HTTP/1.1 connection per sender thread, like Node's default agent. With
+    keepalive=False every request opens a new connection (and so may reach another worker).
+    """
+
+    def __init__(self, url, timeout, keepalive=True):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.https else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = factory(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        One request on this thread's connection; a failed connection is dropped and reopened next time.
+        Returns: (status, body bytes) - raises socket.timeout, OSError or http.client.HTTPException
+        """
+        conn = self._connection()
+        headers = dict(headers or {})
+        if not self.keepalive:
+            headers["Connection"] = "close"
+        try:
+            conn.request(method, self.base_path + path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except Exception:
+            conn.close()
+            self._local.conn = None
+            raise
+        finally:
+            if not self.keepalive and self._local.conn is not None:
+                conn.close()
+                self._local.conn = None
+
+
+def send_snapshot(client, payload, image_bytes, session_id, timeout):
+    """
+    Post one snapshot and classify the answer the way the backend experiences it.
+    Returns: (outcome, latency in seconds, detail) - detail is the overload reason, status or error type
+    """
+    path, body, headers = build_request(payload, image_bytes, session_id)
+    start = time.perf_counter()
+    try:
+        status, data = client.request("POST", path, body, headers)
+    except socket.timeout:
+        return "timeout", time.perf_counter() - start, None
+    except (OSError, http.client.HTTPException) as e:
+        return "connection_error", time.perf_counter() - start, type(e).__name__
+    latency = time.perf_counter() - start
+
+    # The backend gives up at its timeout even if an answer arrives later
+    if latency > timeout:
+        return "timeout", latency, None
+    if status == 503:
+        try:
+            answer = json.loads(data)
+        except ValueError:
+            answer = {}
+        if answer.get("error") == "overloaded":
+            return "overloaded", latency, answer.get("reason")
+    if status != 200:
+        return "http_error", latency, str(status)
+    return "ok", latency, None
+
+
+class MockSession:
+    """One simulated exam: its sessionId, snapshot counter, scene and end time."""
+
+    def __init__(self, rng, fixture_count, start, length, static_scene):
+        self.session_id = new_session_id()
+        self.ends_at = start + length
+        self.snapshots = 0
+        self.scene = rng.randrange(fixture_count)
+        self.step = 0 if static_scene else 1
+
+    def next_fixture(self, fixture_count):
+        index = (self.scene + self.step * self.snapshots) % fixture_count
+        self.snapshots += 1
+        return index
+
+
+class WorkerSampler:
+    """
+    Scrapes /metrics in the background and keeps each server worker's CPU time and memory by the
+    pid it reports. Every scrape uses a new connection, so gunicorn hands it to whichever worker
+    accepts it next; which workers get sampled is up to the kernel, not guaranteed. The report
+    lists the pids actually seen and, given the expected worker count, how many were missed.
+    """
+
+    def __init__(self, client, interval, expected_workers=None):
+        self.client = client
+        self.interval = interval
+        self.expected_workers = expected_workers
+        self.workers = {}   # pid -> {"cpu": [(time, seconds), ...] first and last, "memory": {kind: max bytes}, "scrapes": n}
+        self.scrapes = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                status, data = self.client.request("GET", "/metrics")
+                if status == 200:
+                    self._record(time.monotonic(), data.decode("utf-8", "replace"))
+                    self.scrapes += 1
+                else:
+                    self.failures += 1
+            except (OSError, http.client.HTTPException):
+                self.failures += 1
+            self._stop.wait(self.interval)
+
+    def _record(self, now, text):
+        for line in text.splitlines():
+            match = _METRIC_LINE.match(line)
+            if not match:
+                continue
+            name, labels, value = match.group(1), dict(_LABEL.findall(match.group(2))), float(match.group(3))
+            worker = self.workers.setdefault(labels.get("pid", "?"), {"cpu": [], "memory": {}, "scrapes": 0})
+            if name == "ml_process_cpu_seconds_total":
+                worker["scrapes"] += 1
+                samples = worker["cpu"]
+                if len(samples) < 2:
+                    samples.append((now, value))
+                else:
+                    samples[1] = (now, value)
+            else:
+                kind = labels.get("kind", "rss")
+                worker["memory"][kind] = max(worker["memory"].get(kind, 0.0), value)
+
+    def report(self):
+        """
+        Per sampled worker: CPU utilization over the level (percent of one core, None with a single
+        scrape) and peak memory in MB. Totals only cover the sampled workers.
+        """
+        workers = {}
+        for pid, worker in sorted(self.workers.items()):
+            entry = {f"{kind}_mb": round(size / (1024 * 1024), 1) for kind, size in sorted(worker["memory"].items())}
+            entry["scrapes"] = worker["scrapes"]
+            entry["cpu_percent"] = None
+            if len(worker["cpu"]) == 2:
+                (t0, cpu0), (t1, cpu1) = worker["cpu"]
+                entry["cpu_percent"] = round(100.0 * (cpu1 - cpu0) / (t1 - t0), 1) if t1 > t0 else None
+            workers[pid] = entry
+        cpu = [entry["cpu_percent"] for entry in workers.values() if entry["cpu_percent"] is not None]
+        return {
+            "workers": workers,
+            "sampled_workers": len(workers),
+            "expected_workers": self.expected_workers,
+            # Workers no scrape reached; their CPU and memory are not in the totals
+            "unsampled_workers": (max(0, self.expected_workers - len(workers))
+                                  if self.expected_workers is not None else None),
+            "workers_without_cpu_rate": sorted(pid for pid, entry in workers.items() if entry["cpu_percent"] is None),
+            "sampled_cpu_percent": round(sum(cpu), 1) if cpu else None,
+            "sampled_pss_mb": round(sum(entry.get("pss_mb", 0.0) for entry in workers.values()), 1) or None,
+            "scrapes": self.scrapes,
+            "scrape_failures": self.failures,
+        }
+
+
+def latency_summary(samples_s):
+    """p50/p90/p95/p99/mean/max in milliseconds."""
+    if not samples_s:
+        return {"count": 0}
+    samples_ms = np.asarray(samples_s) * 1000.0
+    summary = {f"p{p}_ms": round(v, 1) for p, v in zip(PERCENTILES, np.percentile(samples_ms, PERCENTILES).tolist())}
+    summary.update({"mean_ms": round(float(samples_ms.mean()), 1), "max_ms": round(float(samples_ms.max()), 1),
+                    "count": int(samples_ms.size)})
+    return summary
+
+
+def run_level(args, fixtures, session_count, seed):
+    """Drive `session_count` concurrent sessions for args.duration seconds. Returns: the level's report"""
+    rng = random.Random(seed)
+    client = Client(args.url, args.timeout)
+    sampler = WorkerSampler(Client(args.url, args.timeout, keepalive=False), args.scrape_interval,
+                            args.workers).start()
+
+    lock = threading.Lock()
+    outcomes, details, latencies = Counter(), Counter(), []
+    answered_in_window = [0]
+    lags = []
+
+    start = time.monotonic()
+    window_end = start + args.duration
+
+    def send(session_id, image_bytes, due):
+        lag = time.monotonic() - due
+        outcome, latency, detail = send_snapshot(client, args.payload, image_bytes, session_id, args.timeout)
+        with lock:
+            outcomes[outcome] += 1
+            lags.append(lag)
+            if detail:
+                details[f"{outcome}:{detail}"] += 1
+            if outcome == "ok":
+                latencies.append(latency)
+                if time.monotonic() <= window_end:
+                    answered_in_window[0] += 1
+
+    # A session has at most timeout / interval snapshots in flight
+    senders = min(MAX_SENDERS, session_count * (math.ceil(args.timeout / args.interval) + 1))
+    executor = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="snapshot")
+
+    def jittered(interval):
+        return interval * rng.uniform(1.0 - TIMER_JITTER, 1.0 + TIMER_JITTER)
+
+    schedule = []  # heap of (due, sequence, session)
+    sequence = 0
+    for _ in range(session_count):
+        first = start + rng.uniform(0.0, args.interval)
+        heapq.heappush(schedule, (first, sequence, MockSession(rng, len(fixtures), start, args.session_length,
+                                                               args.static_scene)))
+        sequence += 1
+    sessions_started, sent = session_count, 0
+
+    while schedule and schedule[0][0] < window_end:
+        due, _, session = heapq.heappop(schedule)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        if due >= session.ends_at:
+            # The exam is over; a new student starts one and sends the first snapshot an interval later
+            session = MockSession(rng, len(fixtures), due, args.session_length, args.static_scene)
+            sessions_started += 1
+            due += jittered(args.interval)
+        else:
+            image_bytes = fixtures[session.next_fixture(len(fixtures))][1]
+            image_bytes = tag_jpeg(image_bytes, f"loadgen {session.session_id} {session.snapshots}")
+            executor.submit(send, session.session_id, image_bytes, due)
+            sent += 1
+            due += jittered(args.interval)
+        heapq.heappush(schedule, (due, sequence, session))
+        sequence += 1
+
+    # Snapshots still in flight finish (or time out) before the level is scored
+    executor.shutdown(wait=True)
+    sampler.stop()
+
+    failed = sent - outcomes["ok"]
+    return {
+        "sessions": session_count,
+        "sessions_started": sessions_started,
+        "sent": sent,
+        "offered_per_second": round(sent / args.duration, 2),
+        "achieved_per_second": round(answered_in_window[0] / args.duration, 2),
+        "outcomes": {outcome: outcomes[outcome] for outcome in OUTCOMES},
+        "details": dict(details),
+        "failure_rate": round(failed / sent, 4) if sent else 0.0,
+        "timeout_rate": round(outcomes["timeout"] / sent, 4) if sent else 0.0,
+        "latency": latency_summary(latencies),
+        # Time a snapshot waited for a free sender thread; large values mean the generator, not the server, lagged
+        "max_send_lag_ms": round(max(lags) * 1000.0, 1) if lags else 0.0,
+        "server": sampler.report(),
+    }
+
+
+def wait_ready(url, timeout, wait_s):
+    """Poll /ready until the service reports ready. Returns: True when it did within `wait_s`"""
+    client = Client(url, timeout)
+    deadline = time.monotonic() + wait_s
+    while time.monotonic() < deadline:
+        try:
+            status, _ = client.request("GET", "/ready")
+            if status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(1.0)
+    return False
+
+
+def throughput_ceiling(levels, max_failure_rate):
+    """The level with the highest achieved rate among those within the failure budget, or None."""
+    healthy = [level for level in levels if level["failure_rate"] <= max_failure_rate]
+    if not healthy:
+        return None
+    best = max(healthy, key=lambda level: level["achieved_per_second"])
+    return {"sessions": best["sessions"], "snapshots_per_second": best["achieved_per_second"],
+            "p99_ms": best["latency"].get("p99_ms"), "saturated": len(healthy) < len(levels)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5001", help="ML service base URL")
+    parser.add_argument("--sessions", default="10,50,100", help="Concurrent sessions per level, comma separated")
+    parser.add_argument("--duration", type=float, default=120.0, help="Seconds per level")
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL_S, help="Seconds between a session's snapshots")
+    parser.add_argument("--session-length", type=float, default=3600.0, help="Seconds before a session ends and is replaced")
+    parser.add_argument("--payload", choices=PAYLOADS, default="binary")
+    parser.add_argument("--images", help="Directory of extra JPEG snapshots to include")
+    parser.add_argument("--static-scene", action="store_true", help="Each session keeps sending the same scene")
+    parser.add_argument("--timeout", type=float, default=BACKEND_TIMEOUT_S, help="Client timeout in seconds (backend: 20)")
+    parser.add_argument("--max-failure-rate", type=float, default=0.01,
+                        help="Failure share a level may have and still count towards the ceiling")
+    parser.add_argument("--scrape-interval", type=float, default=0.5, help="Seconds between /metrics scrapes")
+    parser.add_argument("--workers", type=int, help="Server worker count (ML_WORKERS), to report unsampled workers")
+    parser.add_argument("--pause", type=float, default=10.0, help="Seconds of idle time between levels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    fixtures = generate_fixtures(args.seed) + (load_fixtures(args.images) if args.images else [])
+    levels = [int(level) for level in args.sessions.split(",") if level.strip()]
+
+    if not wait_ready(args.url, args.timeout, wait_s=300.0):
+        print(f"{args.url} did not report ready", file=sys.stderr)
+        return 1
+
+    results = []
+    for index, session_count in enumerate(levels):
+        if index:
+            # Let queues drain and idle sessions age a little, so levels do not bleed into each other
+            time.sleep(args.pause)
+        level = run_level(args, fixtures, session_count, args.seed + index)
+        results.append(level)
+        latency = level["latency"]
+        print(f"{session_count} sessions: {level['offered_per_second']}/s offered, "
+              f"{level['achieved_per_second']}/s answered, p50 {latency.get('p50_ms')} ms, "
+              f"p99 {latency.get('p99_ms')} ms, failures {level['failure_rate']:.2%} "
+              f"(timeouts {level['timeout_rate']:.2%}), server CPU {level['server']['sampled_cpu_percent']}% "
+              f"({level['server']['sampled_workers']} workers sampled)",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "url": args.url,
+            "payload": args.payload,
+            "interval_s": args.interval,
+            "duration_s": args.duration,
+            "session_length_s": args.session_length,
+            "static_scene": args.static_scene,
+            "timeout_s": args.timeout,
+            "fixtures": len(fixtures),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "client_cpu_count": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "levels": results,
+        "ceiling": throughput_ceiling(results, args.max_failure_rate),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Memory accounting and the memory-budget knobs shared by both ML servers.
+
+Worker density is bounded by RAM: every worker holds the detector weights plus whatever
+frames it is decoding. This module measures the first (resident memory added by each model
+load and its first inference) and caps the second (bytes of decoded frames in flight), so
+`ML_WORKERS` can be planned from real numbers:
+
+    workers x (private memory per worker + ML_FRAME_BUFFER_MB) + shared preloaded weights
+
+Detectors a deployment does not need are switched off with ML_SKIP_DETECTORS (comma list):
+    gaze            FaceMesh without iris refinement; gaze is always reported as center (ml_service)
+    face_tracking   sessions share one static FaceMesh instead of a tracking FaceMesh each (ml_service)
+    landmarks       no dlib 68-point shape predictor; face count only, no head pose or gaze (ml_server)
+
+Reduced-precision YOLO weights are selected with ML_PRECISION (see inference_backend).
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from admission import Overloaded
+
+# Memory-budget configuration (overridable through the environment)
+FRAME_BUFFER_MB = float(os.environ.get("ML_FRAME_BUFFER_MB", "256"))         # decoded frames in flight, 0 = no cap
+FRAME_BUFFER_WAIT_MS = float(os.environ.get("ML_FRAME_BUFFER_WAIT_MS", "2000"))  # longest wait for buffer room
+SKIP_DETECTORS = frozenset(name.strip().lower() for name in os.environ.get("ML_SKIP_DETECTORS", "").split(",")
+                           if name.strip())
+
+DETECTOR_NAMES = ("gaze", "face_tracking", "landmarks")
+
+MB = 1024 * 1024
+
+for _name in sorted(SKIP_DETECTORS - set(DETECTOR_NAMES)):
+    logging.warning(f"ML_SKIP_DETECTORS: unknown detector '{_name}', expected one of {DETECTOR_NAMES}")
+
+
+def skipped(name):
+    """True when detector `name` is switched off through ML_SKIP_DETECTORS."""
+    return name in SKIP_DETECTORS
+
+
+def process_memory():
+    """
+    Memory of this process in bytes: rss, plus pss / private / shared where the kernel reports them.
+    Pss splits pages shared with the other preforked workers between them, so summing the
+    workers' pss gives the pool's real footprint.
+    """
+    try:
+        fields = {}
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+        return {
+            "rss": fields["Rss"],
+            "pss": fields["Pss"],
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+            "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        }
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return {"rss": int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")}
+    except (OSError, IndexError, ValueError):
+        pass
+    import resource
+    # Peak rather than current resident size: the best this platform offers (kB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"rss": peak if os.uname().sysname == "Darwin" else peak * 1024}
+
+
+def resident_bytes():
+    return process_memory()["rss"]
+
+
+class ModelFootprint:
+    """
+    Resident memory attributed to each model: the process RSS growth while it loaded and ran
+    its first inference. Loads happen one after another at startup, so the deltas do not overlap.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        """Add the RSS growth of the enclosed block to model `name`."""
+        before = resident_bytes()
+        try:
+            yield
+        finally:
+            grown = max(0, resident_bytes() - before)
+            with self._lock:
+                self.models[name] = self.models.get(name, 0) + grown
+
+    def report(self):
+        """Per-model MB plus the process totals, for /capabilities and the startup log."""
+        with self._lock:
+            models = {name: round(size / MB, 1) for name, size in self.models.items()}
+        return {"models_mb": models,
+                "process_mb": {kind: round(size / MB, 1) for kind, size in process_memory().items()}}
+
+    def log(self):
+        report = self.report()
+        for name, size in sorted(report["models_mb"].items(), key=lambda item: -item[1]):
+            logging.info(f"Model memory: {name:<24} {size:8.1f} MB")
+        logging.info(f"Process memory: {report['process_mb']}")
+        return report
+
+
+class FrameBufferBudget:
+    """
+    Hard cap on the bytes of decoded frames alive at once in this worker.
+
+    Callers reserve a frame's estimated size (FramePyramid.estimate_nbytes) before decoding it
+    and release it once the response is built. A reservation waits up to `wait_ms` for room and
+    then raises Overloaded("frame_buffers"). A single reservation larger than the whole budget
+    is let through only when nothing else is in flight, so it cannot wait forever.
+    """
+
+    def __init__(self, max_mb=FRAME_BUFFER_MB, wait_ms=FRAME_BUFFER_WAIT_MS):
+        self.max_bytes = int(max(0.0, float(max_mb)) * MB)
+        self.wait_ms = float(wait_ms)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._peak = 0
+        self._rejected = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def acquire(self, nbytes, wait_ms=None):
+        if not self.enabled:
+            return
+        deadline = time.monotonic() + (self.wait_ms if wait_ms is None else wait_ms) / 1000.0
+        with self._cond:
+            while self._in_use and self._in_use + nbytes > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._rejected += 1
+                    raise Overloaded("frame_buffers")
+                self._cond.wait(remaining)
+            self._in_use += nbytes
+            self._peak = max(self._peak, self._in_use)
+
+    def release(self, nbytes):
+        if not self.enabled:
+            return
+        with self._cond:
+            self._in_use -= nbytes
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes, wait_ms=None):
+        """Hold `nbytes` of the budget for the enclosed decode and analysis."""
+        self.acquire(nbytes, wait_ms)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def stats(self):
+        with self._cond:
+            return {"in_use_bytes": self._in_use, "peak_bytes": self._peak, "max_bytes": self.max_bytes,
+                    "rejected": self._rejected}
+
+
+# Shared by everything loaded into this process
+footprint = ModelFootprint()
@@ -1,236 +1,470 @@
-import os  
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import mediapipe as mp
 import logging
-from collections import deque
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from session_state import SessionState, SessionStateStore
+from inference_backend import load_model
+from prohibited_classes import PROHIBITED_CLASSES, class_ids
+from landmarks import mesh_array, iris_ratios, gaze_direction, mesh_pose_points, solve_head_poses
+from telemetry import STAGE_SECONDS, log_frame
+from memory_budget import footprint, skipped
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Initialize the YOLO model  
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "yolov8l.pt")  
-model = YOLO(MODEL_PATH)  # Replace with your YOLO model file
+# Initialize the YOLO model on the configured backend (ML_BACKEND / ML_MODEL_SIZE / ML_PRECISION)
+with footprint.measure("yolo"):
+    model = load_model()
+
+# Only prohibited-registry classes survive NMS
+PROHIBITED_CLASS_IDS = class_ids(model.names)
+
+# Model load and first-inference timings, filled in by warm_up()
+startup_metrics = {"yolo_load_seconds": round(model.load_seconds, 3)}
 
 # Confidence threshold
 CONFIDENCE_THRESHOLD = 0.5  # Increased from 0.3 to reduce false positives
 
-# Initialize MediaPipe Face Detection and Face Mesh
-mp_face_detection = mp.solutions.face_detection
+# Region-of-interest mode: crop around the student found in the session's previous frame
+ROI_MODE = os.environ.get("ML_ROI_MODE", "0").lower() in ("1", "true", "yes")
+ROI_MARGIN = float(os.environ.get("ML_ROI_MARGIN", "0.5"))  # fraction of the person box added on each side
+ROI_REFRESH_FRAMES = int(os.environ.get("ML_ROI_REFRESH_FRAMES", "10"))  # full-frame pass every N frames
+
+# Initialize MediaPipe Face Mesh (its built-in face detector also gives the face count)
 mp_drawing = mp.solutions.drawing_utils
 mp_face_mesh = mp.solutions.face_mesh
 
-# Initialize face detection and face mesh models
-face_detection = mp_face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True, min_detection_confidence=0.5)
+# Faces tracked per frame; two is enough to tell "one face" from "multiple faces"
+MAX_NUM_FACES = 2
 
-# Gaze tracking history for stability
-GAZE_HISTORY = deque(maxlen=5)  # Stores last 5 predictions
+# Iris landmarks (the refinement model) are only needed for gaze; ML_SKIP_DETECTORS=gaze drops them
+GAZE_ENABLED = not skipped("gaze")
 
-def detectObject(frame, confidence_threshold=CONFIDENCE_THRESHOLD, resize_width=640):
-    """
-    Perform object detection on a single frame, focusing on 'cell phone', 'book', and 'person'.
+def _create_tracking_mesh():
+    """Tracking-mode FaceMesh; one is created per session."""
+    return mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=MAX_NUM_FACES, refine_landmarks=GAZE_ENABLED, min_detection_confidence=0.5)
 
-    Args:
-        frame (ndarray): Input image frame in BGR format.
-        confidence_threshold (float): Confidence threshold for object detection.
-        resize_width (int): Width to resize the frame for faster processing. Aspect ratio is maintained.
+# Frames without a sessionId have no history to track against, so they share a static-image FaceMesh
+with footprint.measure("face_mesh"):
+    static_face_mesh = mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=MAX_NUM_FACES, refine_landmarks=GAZE_ENABLED, min_detection_confidence=0.5)
+static_face_mesh_lock = threading.Lock()
 
-    Returns:
-        labels_this_frame (list): List of detected labels with their confidence scores.
-        processed_frame (ndarray): Frame with detection results (bounding boxes and labels).
-        person_count (int): Number of detected persons.
-        detected_objects (list): List of detected objects ("cell phone", "book", "person").
-    """
-    labels_this_frame = []
-    detected_objects = []  # Track objects of interest (cell phone, book, person)
-    person_count = 0
+# ML_SKIP_DETECTORS=face_tracking: every session uses the static FaceMesh instead of a tracking one of its own
+FACE_TRACKING_ENABLED = not skipped("face_tracking")
+
+# FaceMesh calls for batches spanning several sessions are spread over this pool
+FACE_THREADS = int(os.environ.get("ML_FACE_THREADS", "4"))
+face_executor = ThreadPoolExecutor(max_workers=FACE_THREADS, thread_name_prefix="face-mesh")
+
+# Per-session gaze history and tracking FaceMesh, bounded by LRU/TTL eviction
+session_store = SessionStateStore(mesh_factory=_create_tracking_mesh if FACE_TRACKING_ENABLED else None)
 
-    # Validate input frame
+def get_session_state(session_id):
+    """Return the detector state for a session, or a throwaway state for anonymous frames."""
+    if not session_id or session_id == "unknown":
+        return SessionState(None)
+    return session_store.get(str(session_id))
+
+def _process_face_mesh(state, rgb_frame):
+    """Run FaceMesh with the session's tracker, or the shared static one for anonymous frames."""
+    with state.lock:
+        if state.face_mesh is not None:
+            return state.face_mesh.process(rgb_frame)
+    with static_face_mesh_lock:
+        return static_face_mesh.process(rgb_frame)
+
+def _resize_for_detection(frame, resize_width):
+    """Validate a frame and shrink it to `resize_width` (aspect ratio kept) if it is wider."""
     if frame is None or not isinstance(frame, np.ndarray):
         raise ValueError("Invalid frame. Please provide a valid numpy array.")
 
-    # Resize the frame to improve processing speed
     height, width = frame.shape[:2]
     if width > resize_width:
         aspect_ratio = height / width
         frame = cv2.resize(frame, (resize_width, int(resize_width * aspect_ratio)))
+    return frame
+
+# One row per kept detection: bbox in original-frame pixels, score, model class id and
+# index into ClassTable.reported_names (-1 when the class is not in the registry)
+DETECTION_DTYPE = np.dtype([("bbox", np.float32, (4,)), ("score", np.float32), ("class_id", np.int32), ("reported", np.int16)])
+
+class ClassTable:
+    """Class-id lookup tables for one model's label map, built once instead of per box."""
+
+    def __init__(self, names, registry=PROHIBITED_CLASSES):
+        size = max(names) + 1 if names else 0
+        self.labels = np.full(size, "unknown", dtype=object)
+        self.reported_names = sorted(set(registry.values()))
+        self.reported = np.full(size, -1, dtype=np.int16)
+        for class_id, label in names.items():
+            self.labels[class_id] = label
+            reported = registry.get(label.lower())
+            if reported:
+                self.reported[class_id] = self.reported_names.index(reported)
+        self.person = self.reported_names.index("person") if "person" in self.reported_names else -1
+
+_class_tables = {}
+
+def class_table(names):
+    """Cached ClassTable for a label map (model.names is the same object on every call)."""
+    table = _class_tables.get(id(names))
+    if table is None:
+        table = _class_tables[id(names)] = ClassTable(names)
+    return table
+
+def postprocess_detections(boxes_data, frame_shape, confidence_threshold, table, scale=1.0, offset=(0, 0)):
+    """
+    Vectorized box filtering: confidence and area masks as array operations and a class-id
+    lookup table instead of per-box label comparisons.
+
+    Args:
+        boxes_data (ndarray): (N, 6+) array of x1, y1, x2, y2, score, class_id in detection-frame pixels.
+        frame_shape (tuple): Shape of the detection frame (for the 1%-of-area threshold).
+        confidence_threshold (float): Minimum score.
+        table (ClassTable): Lookups for the model that produced the boxes.
+        scale (float): Factor mapping detection-frame pixels onto the original frame.
+        offset (tuple): ROI crop origin inside the detection frame.
+
+    Returns:
+        ndarray: Structured array of DETECTION_DTYPE, one row per kept box.
+    """
+    if boxes_data is None or boxes_data.ndim != 2 or boxes_data.shape[0] == 0 or boxes_data.shape[1] < 6:
+        return np.empty(0, dtype=DETECTION_DTYPE)
+
+    boxes = boxes_data[:, :4]
+    scores = boxes_data[:, 4]
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    min_area_threshold = 0.01 * frame_shape[0] * frame_shape[1]  # 1% of frame area
+    keep = (scores > confidence_threshold) & (area > min_area_threshold)
+
+    class_ids = boxes_data[keep, 5].astype(np.int64)
+    known = (class_ids >= 0) & (class_ids < len(table.reported))
+
+    detections = np.empty(len(class_ids), dtype=DETECTION_DTYPE)
+    detections["bbox"] = (boxes[keep] + np.array([offset[0], offset[1], offset[0], offset[1]])) * scale
+    detections["score"] = scores[keep]
+    detections["class_id"] = np.where(known, class_ids, -1)
+    detections["reported"] = np.where(known, table.reported[np.where(known, class_ids, 0)], -1)
+    return detections
+
+def postprocess_result(result, frame, confidence_threshold, scale=1.0, names=None, offset=(0, 0)):
+    """
+    Turn one YOLO result into (labels_this_frame, person_count, detected_objects).
+    Box coordinates are shifted by `offset` (ROI crop origin in `frame`) and multiplied by
+    `scale` to map them back onto the original frame.
+    `names` is the class-id -> label map (defaults to the loaded model's).
+    """
+    table = class_table(model.names if names is None else names)
+
+    # SAFE box processing - check for None/empty boxes
+    if result.boxes is None or result.boxes.data is None:
+        return [], 0, []
+
+    detections = postprocess_detections(result.boxes.data.cpu().numpy(), frame.shape, confidence_threshold, table, scale, offset)
+
+    # Person count is a single reduction over the lookup results
+    person_count = int(np.count_nonzero(detections["reported"] == table.person)) if table.person >= 0 else 0
+
+    # Only the few surviving boxes are turned back into Python objects
+    class_ids = detections["class_id"]
+    labels = np.where(class_ids >= 0, table.labels[np.maximum(class_ids, 0)], "unknown") if len(table.labels) else ["unknown"] * len(class_ids)
+    labels_this_frame = [(label, score, tuple(bbox)) for label, score, bbox in
+                         zip(labels, detections["score"].tolist(), detections["bbox"].tolist())]
+    detected_objects = [table.reported_names[r] for r in detections["reported"].tolist() if r >= 0]
+    return labels_this_frame, person_count, detected_objects
+
+def annotate_objects(frame, labels_this_frame):
+    """Return a copy of the frame with detection boxes and labels drawn on it."""
+    annotated_frame = frame.copy()
+    for label, score, (x1, y1, x2, y2) in labels_this_frame:
+        # Draw bounding box in blue - SAFE coordinates
+        try:
+            cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (255, 0, 0), 2)
+            # Draw label and confidence value in red
+            cv2.putText(annotated_frame, f"{label} {score:.2f}", (int(x1), int(y1) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        except (ValueError, OverflowError):
+            # Skip drawing if coordinates are invalid
+            pass
+    return annotated_frame
+
+def _crop_roi(frame, roi):
+    """Crop a frame to a normalized (x1, y1, x2, y2) ROI. Returns: (crop, (x offset, y offset))"""
+    if roi is None:
+        return frame, (0, 0)
+    height, width = frame.shape[:2]
+    x1, y1 = int(roi[0] * width), int(roi[1] * height)
+    x2, y2 = int(np.ceil(roi[2] * width)), int(np.ceil(roi[3] * height))
+    if x2 - x1 < 32 or y2 - y1 < 32:  # Degenerate ROI - fall back to the full frame
+        return frame, (0, 0)
+    return frame[y1:y2, x1:x2], (x1, y1)
+
+def next_roi(session_id):
+    """ROI to run the session's next frame on, or None when ROI mode is off or a full-frame pass is due."""
+    if not ROI_MODE:
+        return None
+    state = get_session_state(session_id)
+    with state.lock:
+        if state.roi is None or state.roi_frames >= ROI_REFRESH_FRAMES:
+            state.roi_frames = 0
+            return None
+        state.roi_frames += 1
+        return state.roi
+
+def update_roi(session_id, labels_this_frame, frame_shape):
+    """Remember the area around the single detected student for the session's next frame."""
+    if not ROI_MODE:
+        return
+    persons = [bbox for label, _, bbox in labels_this_frame if PROHIBITED_CLASSES.get(label.lower()) == "person"]
+    state = get_session_state(session_id)
+    with state.lock:
+        # No student or several people: stay on full frames so nobody is cropped out
+        if len(persons) != 1:
+            state.roi = None
+            return
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = persons[0]
+        mx, my = (x2 - x1) * ROI_MARGIN, (y2 - y1) * ROI_MARGIN
+        state.roi = (max(0.0, (x1 - mx) / width), max(0.0, (y1 - my) / height),
+                     min(1.0, (x2 + mx) / width), min(1.0, (y2 + my) / height))
+
+def detectObjects(frames, confidence_threshold=CONFIDENCE_THRESHOLD, resize_width=640, annotate=False, rois=None, detector=None):
+    """
+    Batched variant of detectObject: runs one YOLO forward pass over a list of frames.
+
+    Args:
+        frames (list[ndarray]): Input image frames in BGR format.
+        confidence_threshold (float): Confidence threshold for object detection.
+        resize_width (int): Width to resize each frame for faster processing. Aspect ratio is maintained.
+        annotate (bool): Draw boxes onto a copy of each frame. Off by default; use annotate_objects
+            later for the few frames that need it.
+        rois (list): Optional normalized (x1, y1, x2, y2) crop per frame (None = full frame), see next_roi.
+        detector (InferenceBackend): Model to run instead of the configured one (e.g. the cascade's fast tier).
+
+    Returns:
+        list: One (labels_this_frame, processed_frame, person_count, detected_objects) tuple per
+        input frame, in the same order.
+    """
+    if not frames:
+        return []
+
+    detector = model if detector is None else detector
+    classes = PROHIBITED_CLASS_IDS if detector is model else class_ids(detector.names)
+
+    resized = [_resize_for_detection(frame, resize_width) for frame in frames]
+    crops = [_crop_roi(small, roi) for small, roi in zip(resized, rois or [None] * len(frames))]
 
     try:
-        # Perform object detection
-        results = model(frame)
-
-        for result in results:
-            # SAFE box processing - check for None/empty boxes
-            if result.boxes is None or result.boxes.data is None:
-                continue
-
-            boxes_data = result.boxes.data.cpu().numpy()
-            if boxes_data is None or len(boxes_data) == 0:
-                continue
-
-            for box in boxes_data:
-                try:
-                    # SAFE unpacking - handle different box formats
-                    if len(box) < 6:
-                        continue  # Skip malformed boxes
-
-                    x1, y1, x2, y2, score, class_id = box[:6]
-
-                    # Calculate bounding box area to filter small objects
-                    box_area = (x2 - x1) * (y2 - y1)
-                    min_area_threshold = 0.01 * frame.shape[0] * frame.shape[1]  # 1% of frame area
-
-                    if score > confidence_threshold and box_area > min_area_threshold:  # Apply confidence and size thresholds
-                        # SAFE class ID handling - prevent IndexError
-                        try:
-                            class_id_int = int(class_id)
-                            if class_id_int not in model.names:
-                                label = "unknown"
-                            else:
-                                label = model.names[class_id_int]
-                        except (ValueError, KeyError, IndexError):
-                            label = "unknown"
-
-                        labels_this_frame.append((label, float(score)))
-
-                        # Check for specific objects (cell phone, book, person, laptop, remote, keyboard, mouse)
-                        if label.lower() == "person":
-                            person_count += 1
-                            detected_objects.append("person")
-                        elif label.lower() in ["cell phone", "cellphone", "mobile phone", "smartphone"]:
-                            detected_objects.append("cell phone")
-                        elif label.lower() == "book":
-                            detected_objects.append("book")
-                        elif label.lower() == "laptop":
-                            detected_objects.append("laptop")
-                        elif label.lower() == "remote":
-                            detected_objects.append("remote")
-                        elif label.lower() == "keyboard":
-                            detected_objects.append("keyboard")
-                        elif label.lower() == "mouse":
-                            detected_objects.append("mouse")
-
-                        # Draw bounding box in blue - SAFE coordinates
-                        try:
-                            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (255, 0, 0), 2)
-                            # Draw label and confidence value in red
-                            cv2.putText(frame, f"{label} {score:.2f}", (int(x1), int(y1) - 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                        except (ValueError, OverflowError):
-                            # Skip drawing if coordinates are invalid
-                            pass
-
-                except (ValueError, IndexError, TypeError) as e:
-                    # Skip malformed boxes
-                    logging.warning(f"Skipping malformed box: {e}")
-                    continue
-
-        logging.info(f"Detected objects: {labels_this_frame}")
-        logging.info(f"Detected objects list: {detected_objects}")
-        logging.info(f"Person count: {person_count}")
+        # Perform object detection on the whole batch at once; non-registry classes are dropped in NMS
+        results = detector([crop for crop, _ in crops], classes=classes)
+
+        outputs = []
+        for frame, small, (_, offset), result in zip(frames, resized, crops, results):
+            scale = frame.shape[1] / small.shape[1]
+            labels_this_frame, person_count, detected_objects = postprocess_result(result, small, confidence_threshold, scale, detector.names, offset)
+            processed_frame = annotate_objects(frame, labels_this_frame) if annotate else frame
+            outputs.append((labels_this_frame, processed_frame, person_count, detected_objects))
+            log_frame("Detected objects: %s, persons: %d", detected_objects, person_count)
 
     except Exception as e:
         logging.error(f"Error during object detection: {e}")
         raise e
 
-    # Return the required values
-    return labels_this_frame, frame, person_count, detected_objects
+    return outputs
 
-def detectFace(frame):
+def detectObject(frame, confidence_threshold=CONFIDENCE_THRESHOLD, resize_width=640, annotate=False):
     """
-    Detects faces, landmarks, and alerts on suspicious activities (e.g., multiple faces or suspicious gaze).
-    Returns: faceCount, annotated frame
+    Perform object detection on a single frame, focusing on 'cell phone', 'book', and 'person'.
+
+    Args:
+        frame (ndarray): Input image frame in BGR format.
+        confidence_threshold (float): Confidence threshold for object detection.
+        resize_width (int): Width to resize the frame for faster processing. Aspect ratio is maintained.
+        annotate (bool): Draw boxes and labels onto a copy of the frame.
+
+    Returns:
+        labels_this_frame (list): List of (label, confidence, bbox) tuples; bbox is (x1, y1, x2, y2) in frame pixels.
+        processed_frame (ndarray): Annotated copy when `annotate` is set, otherwise the input frame untouched.
+        person_count (int): Number of detected persons.
+        detected_objects (list): List of detected objects ("cell phone", "book", "person").
     """
-    # Convert the frame to RGB as required by MediaPipe
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    faceCount = 0
+    return detectObjects([frame], confidence_threshold, resize_width, annotate)[0]
 
-    # Detect faces in the frame
-    detection_results = face_detection.process(rgb_frame)
-    annotated_frame = frame.copy()
+def _mesh_group(jobs):
+    """FaceMesh for the frames of one session, in submission order (its tracker is stateful)."""
+    return [_process_face_mesh(state, rgb_frame) for state, rgb_frame in jobs]
 
-    if detection_results.detections:
-        faceCount = len(detection_results.detections)
+def analyze_faces(frames, session_ids, update_gaze=True, rgb_frames=None):
+    """
+    Batched face analysis for frames from many sessions.
 
-        # Draw bounding boxes and landmarks
-        for detection in detection_results.detections:
-            mp_drawing.draw_detection(annotated_frame, detection)
+    FaceMesh runs on the face thread pool (MediaPipe releases the GIL), one task per session so
+    each tracker still sees its frames in order. Landmarks are converted to arrays once and the
+    head pose of every face in the batch is solved in one vectorized pass.
 
-    # Alert for multiple faces
-    if faceCount > 1:
-        cv2.putText(annotated_frame, 'Alert: Multiple Faces Detected!', (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    Args:
+        frames (list[ndarray]): Input image frames in BGR format.
+        session_ids (list[str]): Session of each frame (None for anonymous frames).
+        update_gaze (bool): Push each frame's gaze into its session's smoothing window.
+        rgb_frames (list[ndarray]): RGB versions of `frames` if the caller already has them.
 
-    # Detect facial landmarks using Face Mesh
-    mesh_results = face_mesh.process(rgb_frame)
-    if mesh_results.multi_face_landmarks:
-        for face_landmarks in mesh_results.multi_face_landmarks:
-            # Draw the facial landmarks on the frame
-            mp_drawing.draw_landmarks(
-                image=annotated_frame,
-                landmark_list=face_landmarks,
-                connections=mp_face_mesh.FACEMESH_TESSELATION,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=1, circle_radius=1)
-            )
-
-    logging.info(f"Face count: {faceCount}")
-    return faceCount, annotated_frame
-
-def stable_gaze_label(new_label):
-    """Return stable gaze direction using temporal smoothing."""
-    GAZE_HISTORY.append(new_label)
-    # Return the most frequent label from last N frames
-    return max(set(GAZE_HISTORY), key=GAZE_HISTORY.count)
-
-def gaze_tracking(frame):
-    """Highly stable gaze tracking using iris landmarks + smoothing."""
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = face_mesh.process(frame_rgb)
-
-    if not results.multi_face_landmarks:
-        return {"gaze": stable_gaze_label("center")}
-
-    landmarks = results.multi_face_landmarks[0].landmark
-
-    # IRIS LANDMARK indexes for better accuracy
-    LEFT_IRIS = [468, 469, 470, 471]
-    RIGHT_IRIS = [473, 474, 475, 476]
-
-    # Eye corner indexes (stable)
-    LEFT_EYE_LEFT = 33
-    LEFT_EYE_RIGHT = 133
-    RIGHT_EYE_LEFT = 362
-    RIGHT_EYE_RIGHT = 263
-
-    # Calculate IRIS center
-    left_iris_center = np.mean([(landmarks[i].x, landmarks[i].y) for i in LEFT_IRIS], axis=0)
-    right_iris_center = np.mean([(landmarks[i].x, landmarks[i].y) for i in RIGHT_IRIS], axis=0)
-
-    # Eye width (to normalize gaze movement)
-    left_eye_width = abs(landmarks[LEFT_EYE_RIGHT].x - landmarks[LEFT_EYE_LEFT].x)
-    right_eye_width = abs(landmarks[RIGHT_EYE_RIGHT].x - landmarks[RIGHT_EYE_LEFT].x)
-
-    # Compute relative iris offset inside each eye
-    left_ratio = (left_iris_center[0] - landmarks[LEFT_EYE_LEFT].x) / left_eye_width
-    right_ratio = (right_iris_center[0] - landmarks[RIGHT_EYE_LEFT].x) / right_eye_width
-
-    # Average both eyes
-    iris_ratio = (left_ratio + right_ratio) / 2
-
-    # Gaze decision with adaptive thresholds
-    # 0.5 = center of eye
-    # <0.35 → left, >0.65 → right
-    if iris_ratio < 0.35:
-        raw_gaze = "left"
-    elif iris_ratio > 0.65:
-        raw_gaze = "right"
+    Returns:
+        list[dict]: One analyze_face dict per frame, in order.
+    """
+    states = [get_session_state(session_id) for session_id in session_ids]
+    if rgb_frames is None:
+        # Convert the frames to RGB as required by MediaPipe (once for every face stage)
+        rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+
+    groups = {}
+    for i, state in enumerate(states):
+        groups.setdefault(id(state), []).append(i)
+
+    mesh_start = time.perf_counter()
+    mesh_results = [None] * len(frames)
+    if len(groups) == 1:
+        indexes = next(iter(groups.values()))
+        for i, result in zip(indexes, _mesh_group([(states[i], rgb_frames[i]) for i in indexes])):
+            mesh_results[i] = result
     else:
-        raw_gaze = "center"
+        futures = [(indexes, face_executor.submit(_mesh_group, [(states[i], rgb_frames[i]) for i in indexes]))
+                   for indexes in groups.values()]
+        for indexes, future in futures:
+            for i, result in zip(indexes, future.result()):
+                mesh_results[i] = result
+    STAGE_SECONDS.observe(time.perf_counter() - mesh_start, "face")
+
+    gaze_start = time.perf_counter()
+    analyses = []
+    for frame, results in zip(frames, mesh_results):
+        faces = results.multi_face_landmarks or []
+        analysis = {
+            "face_count": len(faces),
+            "landmarks": faces[0] if faces else None,
+            "points": None,
+            "mesh_results": results,
+            "ratio": None,
+            "vertical_ratio": None,
+            "head_pose": None,
+            "gaze": "center",
+        }
+        if faces:
+            # One conversion to a landmark array; gaze and head pose are index lookups into it
+            points = mesh_array(faces[0])
+            analysis["points"] = points
+        if faces and GAZE_ENABLED:
+            horizontal, vertical = iris_ratios(points)
+            analysis["ratio"] = round(horizontal, 3)
+            analysis["vertical_ratio"] = round(vertical, 3) if vertical is not None else None
+            # 0.5 = center of eye; <0.35 → left, >0.65 → right, then up/down from the vertical ratio
+            analysis["gaze"] = gaze_direction(horizontal, vertical)
+        analyses.append(analysis)
+
+    # Head pose for every face of the batch at once
+    pose_start = time.perf_counter()
+    with_face = [i for i, analysis in enumerate(analyses) if analysis["points"] is not None]
+    if with_face:
+        poses = solve_head_poses([mesh_pose_points(analyses[i]["points"], frames[i].shape) for i in with_face],
+                                 [frames[i].shape for i in with_face])
+        for i, pose in zip(with_face, poses):
+            analyses[i]["head_pose"] = tuple(pose.tolist()) if np.all(np.isfinite(pose)) else None
+    pose_end = time.perf_counter()
+    STAGE_SECONDS.observe(pose_end - pose_start, "head_pose")
+
+    if update_gaze:
+        # STABILIZE - in frame order, so a session's window sees its frames in sequence
+        for analysis, state in zip(analyses, states):
+            with state.lock:
+                analysis["gaze"] = stable_gaze_label(analysis["gaze"], state.gaze_history)
+    # Gaze covers the iris ratios and the smoothing vote, not the head-pose solve in between
+    STAGE_SECONDS.observe(time.perf_counter() - gaze_start - (pose_end - pose_start), "gaze")
+
+    for analysis in analyses:
+        log_frame("Face count: %d, gaze: %s (iris_ratio: %s)", analysis["face_count"], analysis["gaze"], analysis["ratio"])
+    return analyses
+
+def analyze_face(frame, session_id=None, update_gaze=True, rgb_frame=None):
+    """
+    Single-pass face analysis: one color conversion and one FaceMesh inference per frame.
+
+    Args:
+        frame (ndarray): Input image frame in BGR format.
+        session_id (str): Session whose FaceMesh tracker and gaze history are used.
+        update_gaze (bool): Push this frame's gaze into the session's smoothing window.
+        rgb_frame (ndarray): RGB version of `frame` if the caller already has one (e.g. FramePyramid.face_rgb).
 
-    # STABILIZE
-    gaze_final = stable_gaze_label(raw_gaze)
+    Returns:
+        dict: face_count, landmarks (first face or None), points ((478, 3) array of the first face or None),
+        mesh_results, ratio and vertical_ratio (iris ratios or None), head_pose ((pitch, yaw, roll) or None)
+        and gaze (smoothed direction).
+    """
+    return analyze_faces([frame], [session_id], update_gaze, None if rgb_frame is None else [rgb_frame])[0]
+
+def annotate_face(frame, analysis, copy=True):
+    """Return the frame (a copy unless `copy` is False) with the face mesh and a multiple-face alert drawn on it."""
+    annotated_frame = frame.copy() if copy else frame
 
-    logging.info(f"Gaze direction: {gaze_final} (iris_ratio: {iris_ratio:.3f})")
-    return {"gaze": gaze_final, "ratio": round(float(iris_ratio), 3)}
+    # Alert for multiple faces
+    if analysis["face_count"] > 1:
+        cv2.putText(annotated_frame, 'Alert: Multiple Faces Detected!', (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    for face_landmarks in analysis["mesh_results"].multi_face_landmarks or []:
+        # Draw the facial landmarks on the frame
+        mp_drawing.draw_landmarks(
+            image=annotated_frame,
+            landmark_list=face_landmarks,
+            connections=mp_face_mesh.FACEMESH_TESSELATION,
+            landmark_drawing_spec=None,
+            connection_drawing_spec=mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=1, circle_radius=1)
+        )
+    return annotated_frame
+
+def detectFace(frame, session_id=None, annotate=False):
+    """
+    Detects faces, landmarks, and alerts on suspicious activities (e.g., multiple faces or suspicious gaze).
+    Prefer analyze_face when gaze is also needed; it shares the same FaceMesh pass.
+    Returns: faceCount, annotated frame (the input frame untouched unless `annotate` is set)
+    """
+    analysis = analyze_face(frame, session_id, update_gaze=False)
+    return analysis["face_count"], annotate_face(frame, analysis) if annotate else frame
+
+def stable_gaze_label(new_label, history):
+    """Return stable gaze direction using temporal smoothing over a session's gaze history (a GazeVoter)."""
+    # Most frequent label from the last N frames
+    return history.vote(new_label)
+
+def gaze_tracking(frame, session_id=None):
+    """Highly stable gaze tracking using iris landmarks + per-session smoothing."""
+    analysis = analyze_face(frame, session_id)
+    if analysis["ratio"] is None:
+        return {"gaze": analysis["gaze"]}
+    return {"gaze": analysis["gaze"], "ratio": analysis["ratio"]}
+
+def warm_up():
+    """Run YOLO and FaceMesh once on a synthetic frame so the first real request is not a cold start."""
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+    # First-inference allocations (activation buffers, runtime arenas) count towards each model's footprint
+    start = time.perf_counter()
+    with footprint.measure("yolo"):
+        detectObjects([frame])
+    startup_metrics["yolo_first_inference_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    with footprint.measure("face_mesh"):
+        analyze_face(frame, update_gaze=False)
+    startup_metrics["face_first_inference_seconds"] = round(time.perf_counter() - start, 3)
+
+    if FACE_TRACKING_ENABLED:
+        # What every additional active session costs: its own tracking FaceMesh
+        with footprint.measure("face_mesh_per_session"):
+            mesh = _create_tracking_mesh()
+            mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        mesh.close()
+
+    logging.info(f"Warm-up complete: {startup_metrics}")
+    return startup_metrics
@@ -1,235 +1,472 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import base64
-import io
-from PIL import Image
-import math
+import logging
 import os
+import threading
+import time
+from batching import MicroBatcher, BATCH_MAX_SIZE
+from image_io import decode_reduced, decoded_shape, is_binary_request, read_binary_images, DEFAULT_DECODED_SHAPE
+from inference_backend import load_model
+from prohibited_classes import class_ids
+from landmarks import DLIB_HEAD_POSE, shape_array, solve_head_poses, dlib_gaze_direction
+from session_state import SessionStateStore
+from admission import Overloaded
+from memory_budget import FrameBufferBudget, footprint, process_memory, skipped
+from violation_rules import RuleEngine
+from concurrent.futures import ThreadPoolExecutor
+import telemetry
+from telemetry import STAGE_SECONDS, REQUEST_SECONDS, FRAMES, Gauge, count_violations, log_frame
 
 app = Flask(__name__)
 
-# Load YOLO model
-current_dir = os.path.dirname(os.path.abspath(__file__))  # Get directory of current script
-weights_path = os.path.join(current_dir, "yolov8l.pt")
-model = YOLO(weights_path)  # Using the yolov8l.pt model
+# Sampled per-frame details (ML_FRAME_LOG_SAMPLE) go through logging, written by a background thread
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+telemetry.configure_async_logging()
+
+# Load YOLO model on the configured backend (ML_BACKEND=pytorch|onnx|openvino, ML_MODEL_SIZE=n|s|m|l, ML_PRECISION)
+with footprint.measure("yolo"):
+    model = load_model()
+
+# Only prohibited-registry classes are kept; the rest are dropped inside NMS
+PROHIBITED_CLASS_IDS = class_ids(model.names)
+
+# Detections -> canonical violation codes, from the rule table shared with ml_service (ML_VIOLATION_RULES)
+rules = RuleEngine.load()
+
+# Per-session outcomes of persistent rules (LRU/TTL bounded like ml_service's sessions)
+session_store = SessionStateStore()
+
+def run_yolo_batch(frames):
+    # One forward pass for every frame in the batch
+    return list(model(frames, imgsz=320, conf=0.25, iou=0.45, classes=PROHIBITED_CLASS_IDS))
+
+# Concurrent /process-ml requests share YOLO forward passes through the micro-batcher
+yolo_batcher = MicroBatcher(run_yolo_batch, name="yolo-batcher")
 
 detector = None
 predictor = None
-predictor_path = "backend/ml/shape_predictor_68_face_landmarks.dat"
-
-model_points_3D = np.array([
-    (0.0, 0.0, 0.0),             # Nose tip
-    (0.0, -330.0, -65.0),        # Chin
-    (-225.0, 170.0, -135.0),     # Left eye left corner
-    (225.0, 170.0, -135.0),      # Right eye right corner
-    (-150.0, -150.0, -125.0),    # Left Mouth corner
-    (150.0, -150.0, -125.0)      # Right mouth corner
-], dtype=np.float64)
-
-def get_2d_image_points(shape):
-    image_points = np.array([
-        (shape.part(30).x, shape.part(30).y),     # Nose tip
-        (shape.part(8).x, shape.part(8).y),       # Chin
-        (shape.part(36).x, shape.part(36).y),     # Left eye left corner
-        (shape.part(45).x, shape.part(45).y),     # Right eye right corner
-        (shape.part(48).x, shape.part(48).y),     # Left Mouth corner
-        (shape.part(54).x, shape.part(54).y)      # Right mouth corner
-    ], dtype=np.float64)
-    return image_points
-
-def calculate_head_pose(shape, size):
-    image_points = get_2d_image_points(shape)
-    focal_length = size[1]
-    center = (size[1] / 2, size[0] / 2)
-    camera_matrix = np.array(
-        [[focal_length, 0, center[0]],
-         [0, focal_length, center[1]],
-         [0, 0, 1]], dtype="double"
-    )
-    dist_coeffs = np.zeros((4, 1))
-    success, rotation_vector, translation_vector = cv2.solvePnP(model_points_3D, image_points, camera_matrix, dist_coeffs)
-    if not success:
+
+# dlib's detector and shape predictor must not be called from several threads at once. Each
+# thread gets its own frontal face detector (cheap to create, and the slow step); the shape
+# predictor holds ~100 MB of regression trees, so the one instance is shared under a lock
+# (fitting 68 points takes about a millisecond)
+detector_factory = None
+_thread_dlib = threading.local()
+predictor_lock = threading.Lock()
+
+# Smallest width binary uploads are decoded at (YOLO runs at imgsz=320, dlib needs a usable face size)
+DECODE_MIN_WIDTH = 640
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+predictor_path = os.environ.get(
+    "ML_SHAPE_PREDICTOR",
+    os.path.join(repo_root, "backend", "ml", "shape_predictor_68_face_landmarks.dat"))
+
+# Hard cap on decoded frames held at once in this worker (ML_FRAME_BUFFER_MB)
+frame_buffers = FrameBufferBudget()
+
+# Filled in once at startup by load_models()/warm_up()
+capabilities = {}
+startup_metrics = {"yolo_load_seconds": round(model.load_seconds, 3)}
+
+def get_2d_image_points(points):
+    """The six HEAD_MODEL_POINTS_3D landmarks out of a dlib shape_array."""
+    return points[DLIB_HEAD_POSE]
+
+def get_gaze_direction(points):
+    return dlib_gaze_direction(points)
+
+# dlib landmark extraction for batched requests is spread over this pool
+FACE_THREADS = int(os.environ.get("ML_FACE_THREADS", "4"))
+face_executor = ThreadPoolExecutor(max_workers=FACE_THREADS, thread_name_prefix="dlib-face")
+
+def thread_detector():
+    """This thread's dlib frontal face detector, created on its first use."""
+    face_detector = getattr(_thread_dlib, "detector", None)
+    if face_detector is None:
+        face_detector = _thread_dlib.detector = detector_factory()
+    return face_detector
+
+def face_points(img_array):
+    """dlib landmarks of the first face as a (68, 2) shape_array, or None when no face is found."""
+    gray = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
+    faces = thread_detector()(gray, 0)
+    if len(faces) == 0:
         return None
-    rotation_matrix, _ = cv2.Rodrigues(rotation_vector)
-    proj_matrix = np.hstack((rotation_matrix, translation_vector))
-    _, _, _, _, _, _, eulerAngles = cv2.decomposeProjectionMatrix(proj_matrix)
-    pitch, yaw, roll = [angle[0] for angle in eulerAngles]
-    return pitch, yaw, roll
-
-def get_gaze_direction(shape):
-    left_eye_points = [shape.part(i) for i in range(36, 42)]
-    right_eye_points = [shape.part(i) for i in range(42, 48)]
-
-    def eye_center(eye_points):
-        x = sum([pt.x for pt in eye_points]) / len(eye_points)
-        y = sum([pt.y for pt in eye_points]) / len(eye_points)
-        return (x, y)
-
-    left_center = eye_center(left_eye_points)
-    right_center = eye_center(right_eye_points)
-    avg_x = (left_center[0] + right_center[0]) / 2
-    avg_y = (left_center[1] + right_center[1]) / 2
-
-    nose_point = (shape.part(30).x, shape.part(30).y)
-    dx = avg_x - nose_point[0]
-
-    if abs(dx) < 5:
-        return "center"
-    elif dx > 5:
-        return "right"
-    else:
-        return "left"
+    with predictor_lock:
+        shape = predictor(gray, faces[0])
+    # One pass over the 68 dlib parts; pose and gaze index into the array
+    return shape_array(shape)
+
+def face_stage(images):
+    """
+    Landmarks for many frames on the face pool, then one vectorized head-pose solve for all faces.
+    Returns: one (points or None, (pitch, yaw, roll) or None) pair per frame
+    """
+    if not capabilities.get("head_pose"):
+        return [(None, None)] * len(images)
+    with STAGE_SECONDS.time("face"):
+        points = list(face_executor.map(face_points, images)) if len(images) > 1 else [face_points(images[0])]
+
+    poses = [None] * len(images)
+    with_face = [i for i, face in enumerate(points) if face is not None]
+    if with_face:
+        with STAGE_SECONDS.time("head_pose"):
+            angles = solve_head_poses([get_2d_image_points(points[i]) for i in with_face], [images[i].shape for i in with_face])
+        for i, pose in zip(with_face, angles):
+            poses[i] = tuple(pose.tolist()) if np.all(np.isfinite(pose)) else None
+    return list(zip(points, poses))
+
+def empty_result():
+    return {
+        "violations": [],
+        "detected_objects": [],
+        "person_count": 0,
+        "face_count": 0,
+        "gaze": "center"
+    }
+
+def load_models():
+    """Load and validate the optional dlib detectors once and record which detectors are available."""
+    global detector
+    global detector_factory
+    global predictor
+    start = time.perf_counter()
 
-@app.route("/process-ml", methods=["POST"])
-def process_ml():
-    import sys
     try:
         import dlib
-        dlib_available = True
     except ModuleNotFoundError:
-        dlib_available = False
-        print("Warning: dlib module not available. Face pose and gaze detection will be skipped.")
+        dlib = None
+        logging.warning("dlib module not available. Face pose and gaze detection will be skipped.")
 
-    global detector
-    global predictor
-    predictor_path = "backend/ml/shape_predictor_68_face_landmarks.dat"
-    if dlib_available and detector is None and predictor is None:
-        detector = dlib.get_frontal_face_detector()
-        try:
-            predictor = dlib.shape_predictor(predictor_path)
-        except RuntimeError as e:
-            print(f"Error loading shape predictor: {e}")
-            predictor = None
+    if dlib is not None:
+        with footprint.measure("dlib_face_detector"):
+            detector = _thread_dlib.detector = dlib.get_frontal_face_detector()
+        detector_factory = dlib.get_frontal_face_detector
+        if skipped("landmarks"):
+            logging.info("Shape predictor skipped (ML_SKIP_DETECTORS=landmarks). Face pose and gaze detection will be skipped.")
+        elif not os.path.isfile(predictor_path):
+            logging.warning(f"Shape predictor not found at {predictor_path}. Face pose and gaze detection will be skipped.")
+        else:
+            try:
+                with footprint.measure("dlib_shape_predictor"):
+                    predictor = dlib.shape_predictor(predictor_path)
+            except RuntimeError as e:
+                logging.error(f"Error loading shape predictor: {e}")
+                predictor = None
+
+    startup_metrics["dlib_load_seconds"] = round(time.perf_counter() - start, 3)
+    capabilities.update({
+        "object_detection": True,
+        "model": model.version,
+        "dlib": dlib is not None,
+        "shape_predictor": predictor is not None,
+        "head_pose": detector is not None and predictor is not None,
+        "gaze": detector is not None and predictor is not None,
+        "violation_rules": rules.describe(),
+    })
+
+def warm_up():
+    """Run every available detector once on a synthetic frame so the first real request is not a cold start."""
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    with footprint.measure("yolo"):
+        results = run_yolo_batch([frame])
+    startup_metrics["yolo_first_inference_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    analyze_image(frame, results)
+    startup_metrics["face_first_inference_seconds"] = round(time.perf_counter() - start, 3)
+
+def decode_base64(base64_image):
+    if base64_image.startswith('data:image'):
+        base64_image = base64_image.split(',')[1]
 
     try:
-        print("Received ML processing request")
-        data = request.get_json()
-        if not data or 'image' not in data:
-            print("Missing image")
-            return jsonify({"error": "Missing image"}), 400
-
-        base64_image = data['image']
-        session_id = data.get('sessionId', 'unknown')
-        print(f"Session ID: {session_id}, Image length: {len(base64_image)}")
-
-        if base64_image.startswith('data:image'):
-            base64_image = base64_image.split(',')[1]
-            print("Stripped data URL prefix")
-
-        try:
-            image_data = base64.b64decode(base64_image)
-            print(f"Decoded image data length: {len(image_data)}")
-            image = Image.open(io.BytesIO(image_data))
-            img_array = np.array(image)
-            print(f"Image array shape: {img_array.shape}")
-
-            if img_array.shape[2] == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-                print("Converted to BGR")
-        except Exception as e:
-            print(f"Error decoding image: {e}")
-            return jsonify({
-                "violations": [],
-                "detected_objects": [],
-                "person_count": 0,
-                "face_count": 0,
-                "gaze": "center"
-            })
-
-        print("Running YOLO detection")
-        try:
-            results = model(img_array, imgsz=320, conf=0.25, iou=0.45)
-            print("YOLO detection completed")
-        except Exception as e:
-            print(f"YOLO detection failed: {e}")
-            return jsonify({
-                "violations": [],
-                "detected_objects": [],
-                "person_count": 0,
-                "face_count": 0,
-                "gaze": "center"
-            })
-
-        violations = []
-        detected_objects = []
-        person_count = 0
-        face_count = 0
-        gaze = "center"
-        head_pose_angles = None
-
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    cls = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    class_name = model.names[cls]
-
-                    detected_objects.append({
-                        "class": class_name,
-                        "confidence": conf,
-                        "bbox": box.xyxy[0].tolist()
-                    })
-
-                    if cls == 0:  # person
-                        person_count += 1
-                        face_count += 1
-
-                    cheating_objects = ['cell phone', 'book', 'laptop', 'tablet', 'bottle']
-                    if any(obj in class_name.lower() for obj in cheating_objects):
-                        violations.append(f"ml_object_detected")
-
-        if face_count == 0:
-            violations.append("ml_no_face_detected")
-        elif face_count > 1:
-            violations.append("ml_multiple_faces_detected")
-
-        if dlib_available and detector is not None and predictor is not None:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
-            faces = detector(gray, 0)
-            if len(faces) > 0:
-                shape = predictor(gray, faces[0])
-                head_pose_angles = calculate_head_pose(shape, gray.shape)
-                if head_pose_angles:
-                    pitch, yaw, roll = head_pose_angles
-                    print(f"Head pose angles - Pitch: {pitch:.2f}, Yaw: {yaw:.2f}, Roll: {roll:.2f}")
-                    if abs(pitch) > 15 or abs(yaw) > 15:
-                        violations.append("ml_head_pose_away")
-
-                gaze = get_gaze_direction(shape)
-                print(f"Gaze direction: {gaze}")
-                if gaze != "center":
-                    violations.append("ml_gaze_away")
-            else:
-                print("No face detected by dlib for pose/gaze")
-                gaze = "center"
+        with STAGE_SECONDS.time("base64"):
+            return base64.b64decode(base64_image)
+    except Exception as e:
+        logging.error(f"Error decoding image: {e}")
+        return None
+
+def frame_nbytes(image_bytes):
+    # Estimated decoded size from the image header: the BGR frame plus the grayscale copy dlib works on
+    shape = decoded_shape(image_bytes, DECODE_MIN_WIDTH)
+    height, width = shape if shape and min(shape) > 0 else DEFAULT_DECODED_SHAPE
+    return height * width * 4
+
+def decode_bytes(image_bytes):
+    # Decodes straight to BGR, at reduced DCT scale for large JPEGs
+    try:
+        with STAGE_SECONDS.time("decode"):
+            img_array, _ = decode_reduced(image_bytes, DECODE_MIN_WIDTH)
+    except Exception as e:
+        logging.error(f"Error decoding image: {e}")
+        return None
+    return img_array
+
+def overloaded_response(error):
+    # The decoded-frame budget stayed full; the caller should back off and retry
+    response = jsonify({"error": "overloaded", "reason": error.reason})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+def serialize(payload):
+    """jsonify a response body, timed as the serialize stage."""
+    with STAGE_SECONDS.time("serialize"):
+        return jsonify(payload)
+
+def count_results(results):
+    """Frame and violation counters for analyzed frames."""
+    for result in results:
+        FRAMES.inc("analyzed")
+        count_violations(result["violations"])
+
+def analyze_image(img_array, results, face=None, session_id=None):
+    """
+    `face` is this frame's face_stage entry when the caller already ran it for a whole batch;
+    `session_id` keys the persistence window of the violation rules.
+    """
+    detected_objects = []
+    person_count = 0
+    face_count = 0
+    gaze = "center"
+    head_pose_angles = None
+
+    for result in results:
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            continue
+
+        # Whole-array reads instead of per-box tensor indexing
+        data = boxes.data.cpu().numpy()
+        classes = data[:, 5].astype(np.int64)
+
+        detected_objects.extend({
+            "class": model.names[cls],
+            "confidence": conf,
+            "bbox": bbox
+        } for cls, conf, bbox in zip(classes.tolist(), data[:, 4].tolist(), data[:, :4].tolist()))
+
+        persons = int(np.count_nonzero(classes == 0))  # person
+        person_count += persons
+        face_count += persons
+
+    if capabilities.get("head_pose"):
+        points, head_pose_angles = face if face is not None else face_stage([img_array])[0]
+        if points is not None:
+            with STAGE_SECONDS.time("gaze"):
+                gaze = get_gaze_direction(points)
         else:
-            if not dlib_available:
-                print("Warning: dlib module not available, skipping face pose and gaze detection.")
-            elif detector is None or predictor is None:
-                print("Warning: dlib detector or predictor not properly initialized.")
             gaze = "center"
+    else:
+        # Unavailable detectors were reported once at startup (see /capabilities)
+        gaze = "center"
+
+    observation = {
+        "face_count": face_count,
+        "person_count": person_count,
+        "gaze": gaze,
+        "head_pose": head_pose_angles,
+        "objects": [(obj["class"], obj["confidence"]) for obj in detected_objects],
+    }
+    if session_id:
+        state = session_store.get(session_id)
+        with state.lock:
+            violations = rules.evaluate(observation, state.rule_history)
+    else:
+        violations = rules.evaluate(observation)
+
+    log_frame("Frame: persons=%d faces=%d gaze=%s head_pose=%s violations=%s",
+              person_count, face_count, gaze, head_pose_angles, violations)
+    return {
+        "violations": violations,
+        "detected_objects": detected_objects,
+        "person_count": person_count,
+        "face_count": face_count,
+        "gaze": gaze
+    }
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = g.get("request_start")
+    if start is not None and request.endpoint != "metrics":
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or "unmatched")
+    return response
+
+@app.route("/process-ml", methods=["POST"])
+def process_ml():
+    try:
+        if is_binary_request(request):
+            # Raw JPEG body or multipart upload: decode the bytes directly, no base64/PIL round trip
+            uploads = read_binary_images(request)
+            if not uploads:
+                logging.error("Missing image")
+                return jsonify({"error": "Missing image"}), 400
+            image_bytes, fields = uploads[0]
+            session_id = fields.get('sessionId')
+        else:
+            data = request.get_json()
+            if not data or 'image' not in data:
+                logging.error("Missing image")
+                return jsonify({"error": "Missing image"}), 400
+
+            session_id = data.get('sessionId')
+            image_bytes = decode_base64(data['image'])
+        log_frame("Session %s: frame received", session_id)
+
+        if image_bytes is None:
+            return jsonify(empty_result())
+
+        with frame_buffers.reserve(frame_nbytes(image_bytes)):
+            # JPEGs are decoded at reduced DCT scale when the source is much larger than needed
+            img_array = decode_bytes(image_bytes)
+            if img_array is None:
+                return jsonify(empty_result())
+
+            try:
+                # Shares a batched forward pass with other in-flight requests
+                with STAGE_SECONDS.time("detection"):
+                    results = [yolo_batcher.run(img_array)]
+            except Exception as e:
+                logging.error(f"YOLO detection failed: {e}")
+                return jsonify(empty_result())
 
-        return jsonify({
-            "violations": violations,
-            "detected_objects": detected_objects,
-            "person_count": person_count,
-            "face_count": face_count,
-            "gaze": gaze
-        })
+            result = analyze_image(img_array, results, session_id=session_id)
+        count_results([result])
+        return serialize(result)
+
+    except Overloaded as e:
+        return overloaded_response(e)
 
     except Exception as e:
-        print(f"ML processing error: {e}")
-        return jsonify({
-            "violations": [],
-            "detected_objects": [],
-            "person_count": 0,
-            "face_count": 0,
-            "gaze": "center"
-        })
+        logging.error(f"ML processing error: {e}")
+        return jsonify(empty_result())
+
+@app.route("/process-ml/batch", methods=["POST"])
+def process_ml_batch():
+    try:
+        if is_binary_request(request):
+            uploads = read_binary_images(request)
+            encoded = [image_bytes for image_bytes, _ in uploads]
+            session_ids = [fields.get('sessionId') for _, fields in uploads]
+            invalid = set()
+        else:
+            data = request.get_json()
+            items = data.get('frames') if isinstance(data, dict) else None
+            items = [item if isinstance(item, dict) else {} for item in (items if isinstance(items, list) else [])]
+            # A frame without a base64 string image gets its own error instead of failing the whole batch
+            invalid = {i for i, item in enumerate(items) if not isinstance(item.get('image'), str) or not item['image']}
+            encoded = [None if i in invalid else decode_base64(item['image']) for i, item in enumerate(items)]
+            session_ids = [item.get('sessionId') for item in items]
+
+        if not encoded:
+            logging.error("Missing frames")
+            return jsonify({"error": "Missing frames"}), 400
+
+        results = [{"error": "Missing image"} if i in invalid else empty_result() for i in range(len(encoded))]
+        # (index, image bytes) for frames that arrived intact
+        received = [(i, image_bytes) for i, image_bytes in enumerate(encoded) if image_bytes is not None]
+
+        # One forward pass per chunk of BATCH_MAX_SIZE frames; only one chunk is decoded at a time
+        for start in range(0, len(received), BATCH_MAX_SIZE):
+            chunk = received[start:start + BATCH_MAX_SIZE]
+            try:
+                with frame_buffers.reserve(sum(frame_nbytes(image_bytes) for _, image_bytes in chunk)):
+                    analyze_chunk(chunk, session_ids, results)
+            except Overloaded as e:
+                for i, _ in chunk:
+                    results[i] = {"error": "overloaded", "reason": e.reason}
+
+        return serialize({"results": results})
+
+    except Exception as e:
+        logging.error(f"ML batch processing error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def analyze_chunk(chunk, session_ids, results):
+    # Decode one chunk of batch frames and analyze the ones that decoded cleanly in one forward pass
+    decoded = [(i, img_array) for i, img_array in ((i, decode_bytes(image_bytes)) for i, image_bytes in chunk)
+               if img_array is not None]
+    if not decoded:
+        return
+    try:
+        with STAGE_SECONDS.time("detection"):
+            yolo_results = run_yolo_batch([img_array for _, img_array in decoded])
+    except Exception as e:
+        logging.error(f"YOLO batch detection failed: {e}")
+        return
+    faces = face_stage([img_array for _, img_array in decoded])
+    for (i, img_array), yolo_result, face in zip(decoded, yolo_results, faces):
+        results[i] = analyze_image(img_array, [yolo_result], face, session_ids[i])
+        count_results([results[i]])
+
+@app.route("/process-ml/batch-stats", methods=["GET"])
+def batch_stats():
+    return jsonify(yolo_batcher.stats())
+
+Gauge("ml_model_info", "Loaded detection model (value is always 1)",
+      lambda: {(model.version, model.backend): 1}, ["model", "backend"])
+Gauge("ml_face_detector_available", "1 when dlib head pose and gaze are running",
+      lambda: int(bool(capabilities.get("head_pose"))))
+Gauge("ml_batcher_pending", "Frames waiting in the micro-batcher", lambda: yolo_batcher.stats()["pending"])
+Gauge("ml_frame_buffer_bytes", "Estimated bytes of decoded frames in flight",
+      lambda: frame_buffers.stats()["in_use_bytes"])
+Gauge("ml_frame_buffer_rejected_total", "Frames refused because the decoded-frame budget was full",
+      lambda: frame_buffers.stats()["rejected"], metric_type="counter")
+Gauge("ml_model_resident_bytes", "Resident memory added by loading and warming up each model",
+      lambda: {(name,): size for name, size in footprint.models.items()}, ["model"])
+Gauge("ml_process_memory_bytes", "Memory of this worker process (pss splits pages shared with other workers)",
+      lambda: {(kind,): size for kind, size in process_memory().items()}, ["kind"])
+Gauge("ml_process_cpu_seconds_total", "CPU time used by this worker process", time.process_time,
+      metric_type="counter")
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text exposition of stage latencies, violation counts and model/queue gauges (this worker)
+    return Response(telemetry.render(), content_type=telemetry.CONTENT_TYPE)
+
+@app.route("/health", methods=["GET"])
+def health():
+    return jsonify({"status": "ok"})
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Readiness: models are loaded and warmed up, and the worker is not shutting down
+    if not ready_event.is_set():
+        return jsonify({"status": "unavailable"}), 503
+    return jsonify({"status": "ready"})
+
+@app.route("/capabilities", methods=["GET"])
+def get_capabilities():
+    # Which detectors are actually running, plus model load and first-inference timings
+    return jsonify({"capabilities": capabilities, "startup": startup_metrics,
+                    "memory": dict(footprint.report(), frame_buffers=frame_buffers.stats())})
+
+def shutdown():
+    # Called by gunicorn's worker_exit: stop reporting ready and release per-session detector state
+    ready_event.clear()
+    session_store.clear()
+    logging.info("ML server shut down")
+
+# Load and warm up every model before the first request arrives, then report ready
+ready_event = threading.Event()
+load_models()
+warm_up()
+logging.info(f"Capabilities: {capabilities}")
+logging.info(f"Startup metrics: {startup_metrics}")
+logging.info(f"Memory: {footprint.report()}")
+ready_event.set()
 
 if __name__ == "__main__":
-    print("🚀 Starting Python ML Server on port 5001...")
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    logging.info("Starting Python ML Server on port 5001")
+    # The debug reloader re-imports this module in a child process and loads the weights twice;
+    # keep it opt-in. Use `ML_WSGI_APP=ml_server:app gunicorn -c gunicorn.conf.py` in production.
+    debug = os.environ.get("ML_DEBUG", "0") == "1"
+    app.run(host="0.0.0.0", port=5001, debug=debug, use_reloader=False)
@@ -1,157 +1,497 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 import base64
+import os
+import threading
+import time
+from collections import Counter
 import cv2
 import numpy as np
-from ml_detections import detectObject, detectFace, gaze_tracking
+from ml_detections import (detectObjects, analyze_faces, annotate_objects, annotate_face, next_roi, update_roi,
+                           session_store, get_session_state, model, startup_metrics, warm_up, ROI_MODE,
+                           CONFIDENCE_THRESHOLD, GAZE_ENABLED, FACE_TRACKING_ENABLED)
+from frame_gate import FrameGate
+from cascade import Cascade, CASCADE_ENABLED, CASCADE_FAST_SIZE, CASCADE_MIN_SCORE, CASCADE_CONFIDENT_SCORE
+from inference_backend import load_model
+from batching import MicroBatcher, BATCH_MAX_SIZE
+from admission import AdmissionController, Overloaded, PRIORITY_NORMAL, PRIORITY_FLAGGED, FLAGGED_WINDOW_SECONDS
+from image_io import FramePyramid, is_binary_request, read_binary_images, YOLO_INPUT_WIDTH, FACE_INPUT_WIDTH
+from landmarks import GAZE_LEFT, GAZE_RIGHT, GAZE_UP, GAZE_DOWN, MIN_EYE_OPENING
+from prohibited_classes import PROHIBITED_CLASSES
+from result_cache import ResultCache, fingerprint, file_signature
+from tracker import SessionTracker, TRACKING_ENABLED, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_MIN_HITS, TRACK_DETECT_EVERY
+from violation_rules import RuleEngine
+from memory_budget import FrameBufferBudget, footprint, process_memory
+import telemetry
+from telemetry import STAGE_SECONDS, REQUEST_SECONDS, FRAMES, Gauge, count_violations, log_frame
 import logging
 
 app = Flask(__name__)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Log records are written by a background thread, never on the request path
+telemetry.configure_async_logging()
 
-@app.route('/process-ml', methods=['POST'])
-def process_ml():
+def detect_batch(items):
+    """Micro-batcher entry point: items are (frame, roi) pairs."""
+    return detectObjects([frame for frame, _ in items], rois=[roi for _, roi in items])
+
+# Single-frame requests are grouped into one YOLO forward pass by the micro-batcher
+object_batcher = MicroBatcher(detect_batch, name="yolo-batcher")
+
+def heavy_detect(frames, rois):
+    """Reference-model detection; a lone frame goes through the micro-batcher to share a forward pass."""
+    if len(frames) == 1:
+        return [object_batcher.run((frames[0], rois[0]))]
+    return detectObjects(frames, rois=rois)
+
+# Optional tiered cascade (ML_CASCADE=1): a small YOLO first, the configured model only when needed
+fast_model = None
+if CASCADE_ENABLED:
+    with footprint.measure("yolo_fast"):
+        fast_model = load_model(size=CASCADE_FAST_SIZE)
+
+def fast_detect_batch(items):
+    """Micro-batcher entry point for the cascade's fast tier: items are (frame, roi) pairs."""
+    return detectObjects([frame for frame, _ in items], CASCADE_MIN_SCORE, rois=[roi for _, roi in items],
+                         detector=fast_model)
+
+fast_batcher = MicroBatcher(fast_detect_batch, name="yolo-fast-batcher") if CASCADE_ENABLED else None
+
+def fast_detect(frames, rois, confidence_threshold):
+    """Fast-tier detection; a lone frame goes through the fast micro-batcher."""
+    if len(frames) == 1:
+        return [fast_batcher.run((frames[0], rois[0]))]
+    return detectObjects(frames, confidence_threshold, rois=rois, detector=fast_model)
+
+cascade = Cascade(fast_detect, heavy_detect) if CASCADE_ENABLED else None
+
+# Detections -> canonical violation codes, from the configured rule table (ML_VIOLATION_RULES)
+rules = RuleEngine.load()
+
+# Identical image bytes resent for a session (retries, overlapping backend routes) are answered from
+# this cache; the key covers everything else a result depends on, so changing any of it invalidates
+result_cache = ResultCache(fingerprint(
+    (model.version, file_signature(model.path)),
+    (fast_model.version, file_signature(fast_model.path)) if fast_model is not None else None,
+    (CASCADE_ENABLED, CASCADE_MIN_SCORE, CASCADE_CONFIDENT_SCORE),
+    rules.fingerprint, CONFIDENCE_THRESHOLD, sorted(PROHIBITED_CLASSES.items()),
+    (GAZE_ENABLED, GAZE_LEFT, GAZE_RIGHT, GAZE_UP, GAZE_DOWN, MIN_EYE_OPENING),
+    (YOLO_INPUT_WIDTH, FACE_INPUT_WIDTH, ROI_MODE),
+    (TRACKING_ENABLED, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_MIN_HITS, TRACK_DETECT_EVERY),
+))
+
+# Object violations are raised once per tracked object (ML_TRACKING), not once per frame
+once_per_track_codes = rules.object_codes() if TRACKING_ENABLED else set()
+
+def cache_lookup(image_bytes, session_id, annotate):
+    """
+    Stored response for these exact image bytes in this session.
+    Returns: (response or None, key) - key is None when the cache does not apply
+    """
+    if annotate or not result_cache.enabled:
+        return None, None
+    key = result_cache.key(image_bytes, session_id)
+    cached = result_cache.get(key)
+    if cached is None:
+        return None, key
+    FRAMES.inc("result_cache")
+    # Same bytes, same tracked objects: their violation was raised by the original analysis
+    cached['violations'] = [v for v in cached['violations'] if v not in once_per_track_codes]
+    count_violations(cached['violations'])
+    cached['cached'] = True
+    return cached, key
+
+def cache_store(key, response):
+    if key is not None:
+        result_cache.put(key, response)
+
+# Reuses the last result for snapshots that have not changed since a session's last analysis
+frame_gate = FrameGate()
+
+def session_tracker(session_id):
+    """The session's object tracker, or None when tracking is off or the frame has no session."""
+    if not TRACKING_ENABLED or not session_id:
+        return None
+    state = get_session_state(session_id)
+    with state.lock:
+        if state.tracker is None:
+            state.tracker = SessionTracker()
+        return state.tracker
+
+def gate_lookup(frame, session_id, annotate):
+    """
+    Cached response if this session's frame is unchanged since its last full analysis.
+    Returns: (response or None, signature) - signature is None when the gate does not apply
+    """
+    if annotate or not session_id:
+        return None, None
+    state = get_session_state(session_id)
+    with state.lock:
+        cached, signature = frame_gate.lookup(state, frame.yolo)
+    if cached is None:
+        return None, signature
+    # An unchanged frame shows the same tracked objects, which have already raised their violation
+    violations = [v for v in cached['violations'] if v not in once_per_track_codes]
+    FRAMES.inc("cached")
+    count_violations(violations)
+    return dict(cached, violations=violations, cached=True), signature
+
+def gate_store(session_id, signature, response):
+    """Make a fully analyzed response the session's new reference frame."""
+    if signature is None:
+        return
+    state = get_session_state(session_id)
+    with state.lock:
+        frame_gate.store(state, signature, response)
+
+# Bounded queue in front of decoding and inference; overload is answered with a fast 503
+admission = AdmissionController()
+# Under gunicorn (gunicorn.conf.py) the worker's request threads must exceed ML_MAX_INFLIGHT
+admission.check_threads(os.environ.get("ML_WORKER_THREADS"))
+
+# Hard cap on decoded frames held at once in this worker (ML_FRAME_BUFFER_MB)
+frame_buffers = FrameBufferBudget()
+
+def request_priority(session_ids):
+    """Requests for sessions that produced violations recently are admitted first."""
+    now = time.monotonic()
+    for session_id in session_ids:
+        if not session_id:
+            continue
+        last_flagged = get_session_state(session_id).last_flagged
+        if last_flagged is not None and now - last_flagged < FLAGGED_WINDOW_SECONDS:
+            return PRIORITY_FLAGGED
+    return PRIORITY_NORMAL
+
+def mark_flagged(session_id):
+    """Remember that a session just produced violations, for request_priority."""
+    if session_id:
+        get_session_state(session_id).last_flagged = time.monotonic()
+
+def request_deadline(fields):
+    """Longest time (ms) the caller is willing to wait for a slot: deadlineMs field or X-Deadline-Ms header."""
+    value = fields.get('deadlineMs', request.headers.get('X-Deadline-Ms'))
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            logging.error('No image provided in request')
-            return jsonify({'error': 'No image provided'}), 400
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
 
-        # Decode base64 image
-        image_data = data['image']
-        logging.info(f'Received image data length: {len(image_data)}')
+def overloaded_response(error):
+    """503 for a request that was shed by admission control; the client should back off and retry."""
+    logging.warning(f'Request shed by admission control: {error.reason}')
+    response = jsonify({'error': 'overloaded', 'reason': error.reason})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
+def serialize(payload):
+    """jsonify a response body, timed as the serialize stage."""
+    with STAGE_SECONDS.time("serialize"):
+        return jsonify(payload)
 
-        # Remove any whitespace or newlines
-        image_data = image_data.strip()
-        logging.info(f'Cleaned image data length: {len(image_data)}')
+def decode_image(image_data):
+    """
+    Decode a base64 (optionally data-URL prefixed) image into a FramePyramid.
+    Returns: (pyramid, error) - exactly one of them is None
+    """
+    image_bytes, error = decode_base64(image_data)
+    if error:
+        return None, error
+    return decode_bytes(image_bytes)
 
-        try:
+def decode_base64(image_data):
+    """
+    Encoded image bytes of a base64 (optionally data-URL prefixed) image.
+    Returns: (bytes, error) - exactly one of them is None
+    """
+    if not isinstance(image_data, str) or not image_data:
+        logging.error(f'Invalid image field: {type(image_data).__name__}')
+        return None, 'Image must be a non-empty base64 string'
+
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',')[1]
+
+    # Remove any whitespace or newlines
+    image_data = image_data.strip()
+
+    try:
+        with STAGE_SECONDS.time("base64"):
             image_bytes = base64.b64decode(image_data)
-            logging.info(f'Decoded bytes length: {len(image_bytes)}')
-        except Exception as e:
-            logging.error(f'Base64 decode error: {e}')
-            return jsonify({'error': f'Base64 decode failed: {str(e)}'}), 400
+    except Exception as e:
+        logging.error(f'Base64 decode error: {e}')
+        return None, f'Base64 decode failed: {str(e)}'
 
-        try:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            logging.info(f'Frame shape: {frame.shape if frame is not None else "None"}')
-        except Exception as e:
-            logging.error(f'Image decode error: {e}')
-            return jsonify({'error': f'Image decode failed: {str(e)}'}), 400
-
-        if frame is None:
-            logging.error('Decoded frame is None')
-            return jsonify({'error': 'Invalid image data - frame is None'}), 400
-
-        # Perform object detection with error handling
-        try:
-            labels_this_frame, processed_frame, person_count, detected_objects = detectObject(frame)
-        except Exception as e:
-            logging.error(f'Object detection error: {e}')
-            # Return safe defaults instead of crashing
-            labels_this_frame = []
-            processed_frame = frame
-            person_count = 0
-            detected_objects = []
-
-        # Perform facial detection with error handling
-        try:
-            face_count, face_annotated_frame = detectFace(frame)
-        except Exception as e:
-            logging.error(f'Face detection error: {e}')
-            # Return safe defaults
-            face_count = 0
-            face_annotated_frame = frame
-
-        # Perform gaze tracking with error handling
-        try:
-            gaze_result = gaze_tracking(frame)
-        except Exception as e:
-            logging.error(f'Gaze tracking error: {e}')
-            # Return safe defaults
-            gaze_result = {'gaze': 'center'}
-
-        # Prepare violations list - CONDITIONAL CHEATING DETECTION
-        violations = []
-
-        logging.info(f"Face count: {face_count}")
-        logging.info(f"Gaze result: {gaze_result}")
-        logging.info(f"Person count: {person_count}")
-        logging.info(f"Detected objects: {detected_objects}")
-
-        # FACE VIOLATIONS - only when face detection is reliable
-        if face_count == 0:
-            violations.append('no_face_detected')
-        elif face_count > 1:
-            violations.append('multiple_faces_detected')
-
-        # GAZE VIOLATIONS - only check if face is detected
-        if face_count == 1:
-            gaze_direction = gaze_result.get('gaze', 'center')
-            if gaze_direction in ['left', 'right', 'up', 'down']:
-                violations.append('gaze_away')
-
-        # OBJECT VIOLATIONS - comprehensive list
-        if person_count >= 2:
-            violations.append('ml_multiple_persons')
-
-        # Check each detected object against comprehensive list - SAFE iteration
-        for obj in detected_objects:
-            if not obj:  # Skip None or empty objects
-                continue
+    return image_bytes, None
+
+def decode_bytes(image_bytes):
+    """
+    Decode encoded image bytes (raw upload or base64-decoded) into a FramePyramid. JPEGs are
+    decoded directly at reduced scale; the YOLO and face levels are derived from that once.
+    Returns: (pyramid, error) - exactly one of them is None
+    """
+    try:
+        with STAGE_SECONDS.time("decode"):
+            frame = FramePyramid.from_bytes(image_bytes)
+    except Exception as e:
+        logging.error(f'Image decode error: {e}')
+        return None, f'Image decode failed: {str(e)}'
 
-            obj_lower = str(obj).lower()  # Safe string conversion
-
-            if any(prohibited in obj_lower for prohibited in ['cell', 'phone', 'mobile', 'smartphone']):
-                violations.append('ml_cell phone')
-            elif 'book' in obj_lower:
-                violations.append('ml_book')
-            elif any(device in obj_lower for device in ['laptop', 'computer', 'notebook']):
-                violations.append('ml_laptop')
-            elif 'remote' in obj_lower:
-                violations.append('ml_remote')
-            elif 'keyboard' in obj_lower:
-                violations.append('ml_keyboard')
-            elif 'mouse' in obj_lower:
-                violations.append('ml_mouse')
-            elif 'bottle' in obj_lower:
-                violations.append('ml_bottle')
-            elif any(screen in obj_lower for screen in ['tv', 'monitor', 'screen']):
-                violations.append('ml_screen')
-            elif any(writing in obj_lower for writing in ['pen', 'pencil']):
-                violations.append('ml_writing_tool')
-            elif any(doc in obj_lower for doc in ['paper', 'clipboard']):
-                violations.append('ml_paper')
-            elif any(bag in obj_lower for bag in ['bag', 'backpack']):
-                violations.append('ml_bag')
-            elif any(audio in obj_lower for audio in ['headphone', 'earbud']):
-                violations.append('ml_headphones')
-            elif 'watch' in obj_lower:
-                violations.append('ml_watch')
-            elif any(glass in obj_lower for glass in ['glasses', 'sunglasses']):
-                violations.append('ml_glasses')
+    if frame is None:
+        logging.error('Decoded frame is None')
+        return None, 'Invalid image data - frame is None'
+
+    return frame, None
+
+def empty_detection(frame):
+    """Safe detectObject-shaped defaults used when object detection fails."""
+    return [], frame, 0, []
+
+def carried_detection(frame, labels_this_frame):
+    """detectObject-shaped output from a tracker's predicted boxes, for frames that skip the detector."""
+    person_count = sum(1 for label, _, _ in labels_this_frame if label == 'person')
+    detected_objects = [PROHIBITED_CLASSES[label] for label, _, _ in labels_this_frame if label in PROHIBITED_CLASSES]
+    return labels_this_frame, frame, person_count, detected_objects
+
+def encode_annotated(frame, labels_this_frame, face_analysis):
+    """Draw detections and the face mesh onto one copy of the YOLO-level frame and return it as base64 JPEG."""
+    annotated = annotate_objects(frame.yolo, labels_this_frame)
+    if face_analysis is not None:
+        annotated = annotate_face(annotated, face_analysis, copy=False)
+    ok, buffer = cv2.imencode('.jpg', annotated)
+    return base64.b64encode(buffer).decode('ascii') if ok else None
+
+def run_face_analyses(frames, session_ids):
+    """
+    Face count, gaze and head pose of decoded FramePyramids, one FaceMesh pass each, batched
+    across sessions. Face tracking and gaze smoothing use the state that belongs to each sessionId.
+    Returns: one analyze_face dict per frame, or None entries if face analysis failed
+    """
+    try:
+        return analyze_faces([frame.face for frame in frames], session_ids,
+                             rgb_frames=[frame.face_rgb for frame in frames])
+    except Exception as e:
+        logging.error(f'Face analysis error: {e}')
+        return [None] * len(frames)
+
+def analyze_frames(frames, session_ids, annotates):
+    """
+    Full analysis of decoded FramePyramids: face check first, then object detection (through
+    the cascade when it is enabled), combined into one /process-ml response per frame.
+    With tracking, frames between a session's detector frames reuse its tracks' predicted boxes.
+    """
+    rois = [next_roi(session_id) for session_id in session_ids]
+    face_analyses = run_face_analyses(frames, session_ids)
+    yolo_frames = [frame.yolo for frame in frames]
+
+    # Which frames run the detector; a session can appear more than once in a batch
+    trackers = [session_tracker(session_id) for session_id in session_ids]
+    offsets = Counter()
+    needs_detection = []
+    for tracker in trackers:
+        if tracker is None:
+            needs_detection.append(True)
+            continue
+        needs_detection.append(tracker.should_detect(offsets[id(tracker)]))
+        offsets[id(tracker)] += 1
+    detect = [i for i, needed in enumerate(needs_detection) if needed]
+
+    detections = [None] * len(frames)
+    tiers = [None] * len(frames)
+    detection_failed = False
+    detection_start = time.perf_counter()
+    try:
+        if cascade is None:
+            outputs = [(detection, None) for detection in heavy_detect([yolo_frames[i] for i in detect],
+                                                                       [rois[i] for i in detect])]
+        else:
+            face_counts = [face_analyses[i]['face_count'] if face_analyses[i] else 0 for i in detect]
+            outputs = cascade.detect([yolo_frames[i] for i in detect], [rois[i] for i in detect], face_counts,
+                                     [get_session_state(session_ids[i]) for i in detect])
+        for i, (detection, tier) in zip(detect, outputs):
+            detections[i], tiers[i] = detection, tier
+    except Exception as e:
+        logging.error(f'Object detection error: {e}')
+        # Return safe defaults instead of crashing
+        detection_failed = True
+        for i in detect:
+            detections[i] = empty_detection(yolo_frames[i])
+    STAGE_SECONDS.observe(time.perf_counter() - detection_start, "detection")
+
+    # Advance the trackers in frame order
+    now = time.monotonic()
+    for i, tracker in enumerate(trackers):
+        if tracker is None:
+            continue
+        with get_session_state(session_ids[i]).lock:
+            if not needs_detection[i]:
+                detections[i], tiers[i] = carried_detection(yolo_frames[i], tracker.carry(now)), 'tracked'
+            elif detection_failed:
+                # Tracks were not seen on this frame, so they must not stay visible and confirmed
+                tracker.miss(now)
             else:
-                # Any other detected object is suspicious
-                violations.append('ml_suspicious_object')
+                tracker.update(detections[i][0], now)
+
+    responses = []
+    for frame, detection, face_analysis, session_id, annotate, tier in zip(frames, detections, face_analyses,
+                                                                          session_ids, annotates, tiers):
+        response = analyze_frame(frame, detection, face_analysis, session_id, annotate)
+        if tier is not None:
+            response['tier'] = tier
+        if response['violations']:
+            mark_flagged(session_id)
+            count_violations(response['violations'])
+        FRAMES.inc("analyzed")
+        responses.append(response)
+    return responses
+
+def analyze_frame(frame, detection, face_analysis, session_id=None, annotate=False):
+    """
+    Combine the face analysis of a decoded FramePyramid with its object detection output.
+    With `annotate`, frames that produced violations also get an `annotated_image` (base64 JPEG).
+    Returns: the /process-ml response dict
+    """
+    labels_this_frame, processed_frame, person_count, detected_objects = detection
+    update_roi(session_id, labels_this_frame, frame.yolo.shape)
+
+    if face_analysis is not None:
+        face_count = face_analysis['face_count']
+        gaze_result = {'gaze': face_analysis['gaze'], 'ratio': face_analysis['ratio']}
+        head_pose = face_analysis.get('head_pose')
+    else:
+        # Face analysis failed - safe defaults
+        face_count = 0
+        gaze_result = {'gaze': 'center'}
+        head_pose = None
+
+    observation = {
+        'face_count': face_count,
+        'person_count': person_count,
+        'gaze': gaze_result.get('gaze', 'center'),
+        'head_pose': head_pose,
+        'objects': [(label, score) for label, score, _ in labels_this_frame],
+    }
+    tracks = None
+    if session_id:
+        state = get_session_state(session_id)
+        with state.lock:
+            tracker = state.tracker if TRACKING_ENABLED else None
+            if tracker is not None:
+                # Only tracked objects that have not raised a violation yet can raise one
+                observation['objects'] = tracker.pending()
+            violations = rules.evaluate(observation, state.rule_history)
+            if tracker is not None:
+                reported = tracker.mark_reported(rules.object_labels(violations))
+                tracks = tracker.describe(reported)
+                if not reported:
+                    # A rule window still full of an already reported object must not raise it again
+                    violations = [v for v in violations if v not in once_per_track_codes]
+    else:
+        violations = rules.evaluate(observation)
+
+    log_frame("Session %s: faces=%d gaze=%s persons=%d objects=%s violations=%s", session_id, face_count,
+              gaze_result.get('gaze', 'center'), person_count, detected_objects, violations)
+
+    response = {
+        'violations': violations,
+        'detected_objects': detected_objects,
+        'person_count': person_count,
+        'face_count': face_count,
+        'gaze': gaze_result.get('gaze', 'center')
+    }
+    if tracks is not None:
+        response['tracks'] = tracks
+
+    # Drawing is only paid for frames that have something to show, and only when asked for
+    if annotate and violations:
+        response['annotated_image'] = encode_annotated(frame, labels_this_frame, face_analysis)
+
+    return response
+
+def process_bytes(image_bytes, session_id=None, annotate=False):
+    """
+    Analyze one encoded image: result cache first, then decode and process_frame.
+    Returns: (response, error) - exactly one of them is None
+    """
+    cached, key = cache_lookup(image_bytes, session_id, annotate)
+    if cached is not None:
+        return cached, None
+    with frame_buffers.reserve(FramePyramid.estimate_nbytes(image_bytes)):
+        frame, error = decode_bytes(image_bytes)
+        if error:
+            return None, error
+        response = process_frame(frame, session_id, annotate)
+    cache_store(key, response)
+    return response, None
+
+def process_frame(frame, session_id=None, annotate=False):
+    """
+    Analyze one decoded FramePyramid the way /process-ml does, frame gate included.
+    Returns: the /process-ml response dict
+    """
+    # Unchanged snapshot: skip inference and reuse the session's last result
+    cached, signature = gate_lookup(frame, session_id, annotate)
+    if cached is not None:
+        return cached
+
+    # Object detection goes through the micro-batcher and shares a forward pass with concurrent requests
+    response = analyze_frames([frame], [session_id], [annotate])[0]
+    gate_store(session_id, signature, response)
+    return response
 
-        # HEAD POSE VIOLATION - only if face is detected and other violations exist
-        if face_count == 1 and len([v for v in violations if v not in ['gaze_away', 'no_face_detected', 'multiple_faces_detected']]) > 0:
-            violations.append('head_pose_away')
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
 
-        logging.info(f"COMPREHENSIVE violations list: {violations}")
+@app.after_request
+def observe_request(response):
+    """Request latency per endpoint, including admission wait and serialization."""
+    start = g.get('request_start')
+    if start is not None and request.endpoint != 'metrics':
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unmatched')
+    return response
 
-        return jsonify({
-            'violations': violations,
-            'detected_objects': detected_objects,
-            'person_count': person_count,
-            'face_count': face_count,
-            'gaze': gaze_result.get('gaze', 'center')
-        })
+@app.route('/process-ml', methods=['POST'])
+def process_ml():
+    """
+    Analyze one frame. Accepts JSON {"image": <base64>, "sessionId": ...}, a raw image body
+    (Content-Type: image/jpeg, sessionId in the query string or X-Session-Id header), or a
+    multipart upload with an `image` file part and a `sessionId` form field.
+    """
+    try:
+        if is_binary_request(request):
+            # Raw bytes go straight to cv2.imdecode - no base64 or JSON round trip
+            uploads = read_binary_images(request)
+            if not uploads:
+                logging.error('No image provided in request')
+                return jsonify({'error': 'No image provided'}), 400
+            image_bytes, data = uploads[0]
+        else:
+            data = request.get_json()
+            if not data or 'image' not in data:
+                logging.error('No image provided in request')
+                return jsonify({'error': 'No image provided'}), 400
+            image_bytes, error = decode_base64(data['image'])
+            if error:
+                return jsonify({'error': error}), 400
+
+        # A resent frame is answered from the result cache without waiting for a slot
+        session_id, annotate = data.get('sessionId'), bool(data.get('annotate'))
+        cached, key = cache_lookup(image_bytes, session_id, annotate)
+        if cached is not None:
+            return serialize(cached)
+
+        # Decoding and inference only start once the request is admitted and its frame fits the buffer budget
+        with admission.admit(request_priority([session_id]), request_deadline(data)), \
+                frame_buffers.reserve(FramePyramid.estimate_nbytes(image_bytes)):
+            frame, error = decode_bytes(image_bytes)
+            if error:
+                return jsonify({'error': error}), 400
+            response = process_frame(frame, session_id, annotate)
+            cache_store(key, response)
+            return serialize(response)
+
+    except Overloaded as e:
+        return overloaded_response(e)
 
     except Exception as e:
         logging.error(f"Unexpected error in ML processing: {e}")
@@ -159,5 +499,222 @@ def process_ml():
         logging.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+@app.route('/process-ml/batch', methods=['POST'])
+def process_ml_batch():
+    """
+    Analyze N frames in one request: {"frames": [{"image": <base64>, "sessionId": ..., "annotate": false}, ...]},
+    or a multipart upload with repeated `image` file parts and matching repeated `sessionId` fields.
+    Returns {"results": [...]} with one /process-ml style response (or {"error": ...}) per frame, in order.
+    """
+    try:
+        data = {}
+        uploads = []  # (fields, image bytes, base64 image) per submitted frame
+        if is_binary_request(request):
+            for image_bytes, fields in read_binary_images(request):
+                uploads.append((fields, image_bytes, None))
+        else:
+            data = request.get_json()
+            data = data if isinstance(data, dict) else {}
+            frames = data.get('frames')
+            for item in frames if isinstance(frames, list) else []:
+                if not isinstance(item, dict) or 'image' not in item:
+                    uploads.append(({}, None, None))
+                else:
+                    # Validated per frame in decode_base64, so one bad item only fails itself
+                    uploads.append((item, None, item['image']))
+
+        if not uploads:
+            logging.error('No frames provided in batch request')
+            return jsonify({'error': 'No frames provided'}), 400
+
+        # The whole batch takes one admission slot
+        deadline = request_deadline(uploads[0][0] if not data else data)
+        with admission.admit(request_priority([fields.get('sessionId') for fields, _, _ in uploads]), deadline):
+            return serialize({'results': analyze_uploads(uploads, data)})
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        logging.error(f"Unexpected error in batch ML processing: {e}")
+        import traceback
+        logging.error(f"Traceback: {traceback.format_exc()}")
+        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
+
+def analyze_uploads(uploads, data):
+    """
+    Decode and analyze the frames of one batch request, BATCH_MAX_SIZE uploads at a time, so at most
+    one chunk of decoded frames is held (and reserved against the frame-buffer budget) at once.
+    Returns: one response dict per upload, in order
+    """
+    results = [None] * len(uploads)
+    for start in range(0, len(uploads), BATCH_MAX_SIZE):
+        pending = []  # (index, image bytes, item, annotate, cache key) for frames the result cache cannot answer
+        for i in range(start, min(start + BATCH_MAX_SIZE, len(uploads))):
+            item, image_bytes, image_b64 = uploads[i]
+            error = None if image_bytes is not None or image_b64 is not None else 'No image provided'
+            if image_bytes is None and image_b64 is not None:
+                image_bytes, error = decode_base64(image_b64)
+            if error:
+                results[i] = {'error': error}
+                continue
+
+            annotate = bool(item.get('annotate', data.get('annotate')))
+            results[i], key = cache_lookup(image_bytes, item.get('sessionId'), annotate)
+            if results[i] is None:
+                pending.append((i, image_bytes, item, annotate, key))
+
+        if not pending:
+            continue
+        try:
+            with frame_buffers.reserve(sum(FramePyramid.estimate_nbytes(image_bytes) for _, image_bytes, _, _, _ in pending)):
+                analyze_chunk(pending, results)
+        except Overloaded as e:
+            # Earlier chunks keep their results; the client retries the frames marked overloaded
+            for i, _, _, _, _ in pending:
+                results[i] = {'error': 'overloaded', 'reason': e.reason}
+
+    return results
+
+def analyze_chunk(pending, results):
+    """Decode one chunk of batch uploads, answer unchanged frames from the gate, and analyze the rest in one pass."""
+    decoded = []  # (index, frame, item, annotate, gate signature, cache key) for frames that still need inference
+    for i, image_bytes, item, annotate, key in pending:
+        frame, error = decode_bytes(image_bytes)
+        if error:
+            results[i] = {'error': error}
+            continue
+        cached, signature = gate_lookup(frame, item.get('sessionId'), annotate)
+        if cached is not None:
+            results[i] = cached
+            cache_store(key, cached)
+        else:
+            decoded.append((i, frame, item, annotate, signature, key))
+
+    if not decoded:
+        return
+    responses = analyze_frames([frame for _, frame, _, _, _, _ in decoded],
+                               [item.get('sessionId') for _, _, item, _, _, _ in decoded],
+                               [annotate for _, _, _, annotate, _, _ in decoded])
+    for (i, _, item, _, signature, key), response in zip(decoded, responses):
+        results[i] = response
+        gate_store(item.get('sessionId'), signature, response)
+        cache_store(key, response)
+
+@app.route('/process-ml/batch-stats', methods=['GET'])
+def batch_stats():
+    """Micro-batcher counters and recent p50/p99 latency."""
+    return jsonify(object_batcher.stats())
+
+@app.route('/process-ml/queue-stats', methods=['GET'])
+def queue_stats():
+    """Admission queue depth, in-flight requests, wait p50/p99 and shed counts."""
+    return jsonify(admission.stats())
+
+@app.route('/process-ml/gate-stats', methods=['GET'])
+def gate_stats():
+    """How many snapshots were answered from the unchanged-frame cache."""
+    return jsonify(frame_gate.stats())
+
+@app.route('/process-ml/cache-stats', methods=['GET'])
+def cache_stats():
+    """Result-cache hit rate per tier and its configuration fingerprint."""
+    return jsonify(result_cache.stats())
+
+@app.route('/process-ml/cascade-stats', methods=['GET'])
+def cascade_stats():
+    """Per-tier hit rate and latency of the detection cascade."""
+    if cascade is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cascade.stats(), enabled=True, fast_model=fast_model.version))
+
+# Scrape-time gauges: nothing is recorded on the request path for these
+Gauge("ml_model_info", "Loaded detection models (value is always 1)",
+      lambda: {(model.version, model.backend, 'heavy'): 1,
+               **({(fast_model.version, fast_model.backend, 'fast'): 1} if fast_model is not None else {})},
+      ["model", "backend", "tier"])
+Gauge("ml_inflight_requests", "Requests currently admitted", lambda: admission.stats()['inflight'])
+Gauge("ml_queued_requests", "Requests waiting for an admission slot", lambda: admission.stats()['queued'])
+Gauge("ml_shed_requests_total", "Requests rejected by admission control",
+      lambda: {(reason,): count for reason, count in admission.stats()['shed'].items()}, ["reason"],
+      metric_type="counter")
+Gauge("ml_batcher_pending", "Frames waiting in a micro-batcher",
+      lambda: {(batcher.name,): batcher.stats()['pending'] for batcher in (object_batcher, fast_batcher) if batcher},
+      ["batcher"])
+Gauge("ml_result_cache_entries", "Responses held in the in-memory result cache",
+      lambda: result_cache.stats()['entries'])
+Gauge("ml_sessions", "Sessions with detector state in this worker", lambda: len(session_store))
+Gauge("ml_frame_buffer_bytes", "Estimated bytes of decoded frames in flight",
+      lambda: frame_buffers.stats()['in_use_bytes'])
+Gauge("ml_frame_buffer_rejected_total", "Frames refused because the decoded-frame budget was full",
+      lambda: frame_buffers.stats()['rejected'], metric_type="counter")
+Gauge("ml_model_resident_bytes", "Resident memory added by loading and warming up each model",
+      lambda: {(name,): size for name, size in footprint.models.items()}, ["model"])
+Gauge("ml_process_memory_bytes", "Memory of this worker process (pss splits pages shared with other workers)",
+      lambda: {(kind,): size for kind, size in process_memory().items()}, ["kind"])
+Gauge("ml_process_cpu_seconds_total", "CPU time used by this worker process", time.process_time,
+      metric_type="counter")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage latencies, violation counts, model and queue gauges (this worker)."""
+    return Response(telemetry.render(), content_type=telemetry.CONTENT_TYPE)
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: models are loaded and the worker is not shutting down."""
+    if not ready_event.is_set():
+        return jsonify({'status': 'unavailable'}), 503
+    return jsonify({'status': 'ready'})
+
+@app.route('/capabilities', methods=['GET'])
+def capabilities():
+    """Which detectors this process runs, plus model load and first-inference timings."""
+    return jsonify({
+        'capabilities': {
+            'object_detection': True,
+            'model': model.version,
+            'face_mesh': True,
+            'face_tracking': FACE_TRACKING_ENABLED,
+            'gaze': GAZE_ENABLED,
+            'head_pose': True,
+            'roi_mode': ROI_MODE,
+            'cascade': CASCADE_ENABLED,
+            'violation_rules': rules.describe(),
+            'fast_model': fast_model.version if fast_model is not None else None,
+        },
+        'startup': startup_metrics,
+        'memory': dict(footprint.report(), frame_buffers=frame_buffers.stats()),
+    })
+
+def shutdown():
+    """Stop reporting ready and release per-session detector state."""
+    ready_event.clear()
+    session_store.clear()
+    logging.info('ML service shut down')
+
+def warm_up_cascade():
+    """First inference of the cascade's fast model, so it is not paid by the first request."""
+    if fast_model is None:
+        return
+    startup_metrics["fast_yolo_load_seconds"] = round(fast_model.load_seconds, 3)
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    with footprint.measure("yolo_fast"):
+        detectObjects([frame], detector=fast_model)
+    startup_metrics["fast_yolo_first_inference_seconds"] = round(time.perf_counter() - start, 3)
+
+# Models are loaded at import time (ml_detections); warm them up before reporting ready
+ready_event = threading.Event()
+warm_up()
+warm_up_cascade()
+footprint.log()
+ready_event.set()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    # Development server; use `gunicorn -c gunicorn.conf.py` for the pre-fork worker pool
+    app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
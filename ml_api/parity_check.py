@@ -0,0 +1,91 @@
+"""
+Confirm that a faster inference backend reports the same violations as the PyTorch reference.
+
+Usage:
+    python parity_check.py <image_dir> --backend onnx [--size l] [--reference pytorch] [--min-agreement 1.0]
+
+Every image is run through both backends with the same preprocessing and post-processing
+as detectObject. The per-image detected-object lists and person counts are compared and a
+JSON report is printed; the exit code is 1 when agreement is below --min-agreement.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import cv2
+
+from inference_backend import BACKENDS, ML_MODEL_SIZE, InferenceBackend
+from ml_detections import CONFIDENCE_THRESHOLD, postprocess_result, _resize_for_detection
+from prohibited_classes import class_ids
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def load_images(image_dir, resize_width=640):
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(image_dir, pattern)))
+    images = []
+    for path in paths:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is not None:
+            images.append((os.path.basename(path), _resize_for_detection(frame, resize_width)))
+    return images
+
+
+def run_backend(backend, images):
+    """Return ({name: (sorted detected_objects, person_count)}, mean latency in ms)."""
+    outputs = {}
+    elapsed = 0.0
+    classes = class_ids(backend.names)
+    for name, frame in images:
+        start = time.perf_counter()
+        result = backend.predict(frame, classes=classes)[0]
+        elapsed += time.perf_counter() - start
+        _, person_count, detected_objects = postprocess_result(result, frame, CONFIDENCE_THRESHOLD, names=backend.names)
+        outputs[name] = (sorted(detected_objects), person_count)
+    return outputs, (elapsed / len(images) * 1000.0) if images else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_dir")
+    parser.add_argument("--backend", required=True, choices=sorted(BACKENDS))
+    parser.add_argument("--reference", default="pytorch", choices=sorted(BACKENDS))
+    parser.add_argument("--size", default=ML_MODEL_SIZE)
+    parser.add_argument("--min-agreement", type=float, default=1.0)
+    args = parser.parse_args()
+
+    images = load_images(args.image_dir)
+    if not images:
+        print(f"No images found in {args.image_dir}", file=sys.stderr)
+        return 2
+
+    reference, reference_ms = run_backend(InferenceBackend(args.reference, args.size), images)
+    candidate, candidate_ms = run_backend(InferenceBackend(args.backend, args.size), images)
+
+    mismatches = []
+    for name, _ in images:
+        if reference[name] != candidate[name]:
+            mismatches.append({
+                "image": name,
+                args.reference: {"objects": dict(Counter(reference[name][0])), "person_count": reference[name][1]},
+                args.backend: {"objects": dict(Counter(candidate[name][0])), "person_count": candidate[name][1]},
+            })
+
+    agreement = 1.0 - len(mismatches) / len(images)
+    print(json.dumps({
+        "images": len(images),
+        "size": args.size,
+        "reference": {"backend": args.reference, "mean_latency_ms": round(reference_ms, 2)},
+        "candidate": {"backend": args.backend, "mean_latency_ms": round(candidate_ms, 2)},
+        "agreement": round(agreement, 4),
+        "mismatches": mismatches,
+    }, indent=2))
+    return 0 if agreement >= args.min_agreement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
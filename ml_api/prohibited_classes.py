@@ -0,0 +1,32 @@
+import os
+
+# COCO label -> name reported in detected_objects. Only these classes are kept by inference;
+# everything else is dropped inside NMS instead of being filtered in Python afterwards.
+DEFAULT_PROHIBITED_CLASSES = {
+    "person": "person",
+    "cell phone": "cell phone",
+    "book": "book",
+    "laptop": "laptop",
+    "remote": "remote",
+    "keyboard": "keyboard",
+    "mouse": "mouse",
+    "bottle": "bottle",
+}
+
+
+def _load_registry():
+    """Registry from ML_PROHIBITED_CLASSES (comma-separated COCO labels), or the defaults."""
+    configured = os.environ.get("ML_PROHIBITED_CLASSES")
+    if not configured:
+        return dict(DEFAULT_PROHIBITED_CLASSES)
+    labels = [label.strip().lower() for label in configured.split(",") if label.strip()]
+    return {label: DEFAULT_PROHIBITED_CLASSES.get(label, label) for label in labels}
+
+
+PROHIBITED_CLASSES = _load_registry()
+
+
+def class_ids(names, registry=None):
+    """Model class ids for the registry labels, for passing to YOLO as `classes=`."""
+    registry = PROHIBITED_CLASSES if registry is None else registry
+    return sorted(class_id for class_id, label in names.items() if label.lower() in registry)
@@ -0,0 +1,350 @@
+"""
+Offline bulk re-analysis of stored exam snapshots.
+
+Usage:
+    python reanalyze.py --images <dir> --output <dir> [--workers N] [--batch-size 16]
+    python reanalyze.py --manifest snapshots.jsonl --output <dir> [--rules new_rules.json]
+                        [--model-size l] [--backend onnx] [--precision int8] [--format parquet]
+
+Inputs are either a directory laid out as <dir>/<sessionId>/<snapshot>.jpg, or a manifest with
+one snapshot per line: a JSON object {"path": ..., "sessionId": ..., "timestamp": ...} or just a
+path (the parent directory is then the session). A session's frames are analyzed in order
+(timestamp, then name), through the same detectObjects / analyze_faces / object tracking /
+violation-rule path as /process-ml, so gaze smoothing, rule persistence and once-per-object
+violations behave as they did live. Offline, the detector runs on every frame
+(ML_TRACK_DETECT_EVERY is not applied).
+
+Sessions are spread over a process pool (every core busy, each worker with its own models). Inside
+a worker, snapshots are read and decoded ahead of inference on a thread pool and analyzed in
+batches. Each finished session is written atomically as one columnar file (NPZ, or Parquet when
+pyarrow is installed) under --output; re-running the same command skips sessions whose file
+exists, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+
+import numpy as np
+
+from tracker import SessionTracker, TRACKING_ENABLED
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+FORMATS = ("npz", "parquet")
+SUMMARY_FILE = "summary.json"
+
+# Set in each worker process by _init_worker
+_worker = {}
+
+
+def discover_images(image_dir):
+    """Snapshots under <dir>/<sessionId>/ as {"path", "sessionId"} records."""
+    records = []
+    for root, _, files in os.walk(image_dir):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                session = os.path.relpath(root, image_dir)
+                records.append({"path": path, "sessionId": "default" if session == "." else session})
+    return records
+
+
+def read_manifest(manifest_path):
+    """Manifest lines as {"path", "sessionId", "timestamp"} records; relative paths are relative to the manifest."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    records = []
+    with open(manifest_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            record = json.loads(line) if line.startswith("{") else {"path": line}
+            path = os.path.join(base, record["path"])
+            records.append({
+                "path": path,
+                "sessionId": str(record.get("sessionId") or os.path.basename(os.path.dirname(path)) or "default"),
+                "timestamp": record.get("timestamp"),
+            })
+    return records
+
+
+def group_sessions(records):
+    """{sessionId: [paths in analysis order]}, largest sessions first so the pool finishes evenly."""
+    sessions = {}
+    for record in records:
+        sessions.setdefault(record["sessionId"], []).append(record)
+    ordered = {}
+    for session_id, items in sorted(sessions.items(), key=lambda item: -len(item[1])):
+        items.sort(key=lambda record: (str(record.get("timestamp") or ""), record["path"]))
+        ordered[session_id] = [record["path"] for record in items]
+    return ordered
+
+
+def session_file(output_dir, session_id, fmt):
+    """Output file of one session: a filesystem-safe name plus a short hash of the real sessionId."""
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", session_id)[:64]
+    digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(output_dir, f"{safe}-{digest}.{fmt}")
+
+
+def _init_worker(options):
+    """Load the models once per worker process, with the thread budget and model chosen on the command line."""
+    threads = str(options["threads"])
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = threads
+    if options.get("model_size"):
+        os.environ["ML_MODEL_SIZE"] = options["model_size"]
+    if options.get("backend"):
+        os.environ["ML_BACKEND"] = options["backend"]
+    if options.get("precision"):
+        os.environ["ML_PRECISION"] = options["precision"]
+    os.environ["ML_FACE_THREADS"] = threads
+    # Re-analysis always looks at the whole frame
+    os.environ["ML_ROI_MODE"] = "0"
+
+    import ml_detections
+    from violation_rules import RuleEngine, VIOLATION_CODES
+    rules = RuleEngine.load(options["rules"]) if options.get("rules") else RuleEngine.load()
+    codes = sorted(set(VIOLATION_CODES) | {rule.code for rule in rules.rules})
+    _worker.update(ml_detections=ml_detections, rules=rules, codes=codes, options=options,
+                   decoder=ThreadPoolExecutor(max_workers=options["decode_threads"], thread_name_prefix="decode"))
+
+
+def _load(path):
+    """Read and decode one snapshot. Returns: (FramePyramid or None, error or "")"""
+    from image_io import FramePyramid
+    try:
+        with open(path, "rb") as f:
+            frame = FramePyramid.from_bytes(f.read())
+    except OSError as e:
+        return None, f"read failed: {e}"
+    except Exception as e:
+        return None, f"decode failed: {e}"
+    return (frame, "") if frame is not None else (None, "decode failed")
+
+
+def _prefetch(paths, depth):
+    """Decoded frames in order, with up to `depth` snapshots read and decoded ahead on the decode pool."""
+    decoder = _worker["decoder"]
+    pending = deque()
+    for path in paths:
+        pending.append(decoder.submit(_load, path))
+        if len(pending) > depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _analyze_batch(frames, session_id, rules, history, confidence, tracker=None):
+    """
+    detectObjects + analyze_faces + rule evaluation for consecutive frames of one session.
+    With a tracker, objects go through it in frame order as in /process-ml, so a tracked object
+    raises its violation once rather than on every frame it stays in view.
+    """
+    ml = _worker["ml_detections"]
+    detections = ml.detectObjects([frame.yolo for frame in frames], confidence)
+    analyses = ml.analyze_faces([frame.face for frame in frames], [session_id] * len(frames),
+                                rgb_frames=[frame.face_rgb for frame in frames])
+    rows = []
+    for (labels, _, person_count, detected_objects), analysis in zip(detections, analyses):
+        observation = {
+            "face_count": analysis["face_count"],
+            "person_count": person_count,
+            "gaze": analysis["gaze"],
+            "head_pose": analysis["head_pose"],
+            "objects": [(label, score) for label, score, _ in labels],
+        }
+        objects = observation["objects"]
+        if tracker is not None:
+            # Frame index as the track clock: durations are not part of the output
+            tracker.update(labels, float(tracker.frames))
+            observation["objects"] = tracker.pending()
+        violations = rules.evaluate(observation, history)
+        if tracker is not None and not tracker.mark_reported(rules.object_labels(violations)):
+            # A rule window still full of an already reported object must not raise it again
+            violations = [v for v in violations if v not in rules.object_codes()]
+        rows.append({
+            "face_count": analysis["face_count"],
+            "person_count": person_count,
+            "gaze": analysis["gaze"],
+            "gaze_ratio": analysis["ratio"],
+            "head_pose": analysis["head_pose"],
+            "objects": json.dumps([[label, round(score, 3)] for label, score in objects]),
+            "violations": violations,
+        })
+    return rows
+
+
+def analyze_session(session_id, paths, path):
+    """
+    Analyze one session's snapshots in order and write its columnar file to `path`.
+    Runs in a worker process. Returns: per-session summary dict
+    """
+    ml, rules, codes, options = _worker["ml_detections"], _worker["rules"], _worker["codes"], _worker["options"]
+    batch_size = options["batch_size"]
+    start = time.perf_counter()
+    history = {}
+    tracker = SessionTracker(detect_every=1) if TRACKING_ENABLED else None
+    rows, batch = [], []  # batch: (row index, frame) waiting for inference
+
+    def flush():
+        for (index, _), result in zip(batch, _analyze_batch([frame for _, frame in batch], session_id, rules,
+                                                            history, options["confidence"], tracker)):
+            rows[index].update(result)
+        batch.clear()
+
+    try:
+        for (frame, error), image_path in zip(_prefetch(paths, batch_size * 2), paths):
+            rows.append({"path": image_path, "error": error})
+            if frame is not None:
+                batch.append((len(rows) - 1, frame))
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+    finally:
+        # Per-session detector state is not needed once the session is written
+        ml.session_store.discard(session_id)
+
+    columns = _columns(session_id, rows, codes)
+    _write(columns, path, options["format"])
+    return {
+        "sessionId": session_id,
+        "frames": len(rows),
+        "errors": int(np.count_nonzero(columns["error"] != "")),
+        "violations": {code: int(np.count_nonzero(columns[code])) for code in codes},
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def _columns(session_id, rows, codes):
+    """Rows -> column arrays. Frames that failed to decode keep their path and error with empty results."""
+    count = len(rows)
+    head_pose = np.full((count, 3), np.nan, dtype=np.float32)
+    for i, row in enumerate(rows):
+        if row.get("head_pose") is not None:
+            head_pose[i] = row["head_pose"]
+    columns = {
+        "session_id": np.array([session_id] * count, dtype=str),
+        "frame_index": np.arange(count, dtype=np.int32),
+        "path": np.array([row["path"] for row in rows], dtype=str),
+        "error": np.array([row["error"] for row in rows], dtype=str),
+        "face_count": np.array([row.get("face_count", -1) for row in rows], dtype=np.int16),
+        "person_count": np.array([row.get("person_count", -1) for row in rows], dtype=np.int16),
+        "gaze": np.array([row.get("gaze", "") for row in rows], dtype=str),
+        "gaze_ratio": np.array([np.nan if row.get("gaze_ratio") is None else row["gaze_ratio"] for row in rows],
+                               dtype=np.float32),
+        "pitch": head_pose[:, 0],
+        "yaw": head_pose[:, 1],
+        "roll": head_pose[:, 2],
+        "objects": np.array([row.get("objects", "[]") for row in rows], dtype=str),
+    }
+    for code in codes:
+        columns[code] = np.array([code in row.get("violations", ()) for row in rows], dtype=bool)
+    return columns
+
+
+def _write(columns, path, fmt):
+    """Write a session file atomically, so a partial file is never mistaken for a finished session."""
+    tmp_path = f"{path}.tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(columns), tmp_path, compression="zstd")
+    else:
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **columns)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Directory of <sessionId>/<snapshot>.jpg files")
+    source.add_argument("--manifest", help="JSON-lines or plain-path manifest of snapshots")
+    parser.add_argument("--output", required=True, help="Directory for the per-session result files")
+    parser.add_argument("--format", choices=FORMATS, default="npz")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: one per 4 cores)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--decode-threads", type=int, default=2, help="Decode threads per worker")
+    parser.add_argument("--confidence", type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument("--rules", help="Violation rule table (default: ML_VIOLATION_RULES / violation_rules.json)")
+    parser.add_argument("--model-size", help="YOLO size to re-score with (n, s, m, l)")
+    parser.add_argument("--backend", help="Inference backend (pytorch, onnx, openvino)")
+    parser.add_argument("--precision", help="YOLO weight precision (fp32, fp16, int8; see inference_backend)")
+    parser.add_argument("--restart", action="store_true", help="Re-analyze sessions that already have a result file")
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ModuleNotFoundError:
+            print("--format parquet needs pyarrow (pip install pyarrow); use --format npz otherwise")
+            return 2
+
+    records = discover_images(args.images) if args.images else read_manifest(args.manifest)
+    sessions = group_sessions(records)
+    os.makedirs(args.output, exist_ok=True)
+
+    todo = {session_id: paths for session_id, paths in sessions.items()
+            if args.restart or not os.path.exists(session_file(args.output, session_id, args.format))}
+    print(f"{len(records)} snapshots in {len(sessions)} sessions, {len(sessions) - len(todo)} already done")
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or max(1, cpus // 4)
+    options = {
+        "threads": max(1, cpus // workers),
+        "batch_size": max(1, args.batch_size),
+        "decode_threads": max(1, args.decode_threads),
+        "confidence": args.confidence,
+        "rules": args.rules,
+        "model_size": args.model_size,
+        "backend": args.backend,
+        "precision": args.precision,
+        "format": args.format,
+    }
+
+    summary_path = os.path.join(args.output, SUMMARY_FILE)
+    summary = {}
+    if os.path.exists(summary_path) and not args.restart:
+        with open(summary_path) as f:
+            summary = json.load(f).get("sessions", {})
+
+    start = time.perf_counter()
+    failed = 0
+    # Spawned workers: each imports the models itself instead of inheriting a forked copy
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(options,)) as pool:
+        futures = {pool.submit(analyze_session, session_id, paths, session_file(args.output, session_id, args.format)):
+                   session_id for session_id, paths in todo.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            session_id = futures[future]
+            try:
+                summary[session_id] = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Session {session_id} failed: {e}")
+                continue
+            print(f"[{done}/{len(futures)}] {session_id}: {summary[session_id]['frames']} frames "
+                  f"in {summary[session_id]['seconds']}s")
+
+    elapsed = time.perf_counter() - start
+    totals = Counter()
+    for result in summary.values():
+        totals.update(result["violations"])
+    frames = sum(len(todo[session_id]) for session_id in todo)
+    with open(summary_path, "w") as f:
+        json.dump({"sessions": summary, "violations": dict(totals), "format": args.format}, f, indent=2)
+    print(f"Analyzed {frames} snapshots in {elapsed:.1f}s ({frames / elapsed if elapsed else 0:.1f}/s) "
+          f"with {workers} workers; {failed} sessions failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
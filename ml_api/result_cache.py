@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Result-cache configuration (overridable through the environment)
+RESULT_CACHE_SIZE = int(os.environ.get("ML_RESULT_CACHE_SIZE", "4096"))          # in-memory entries, 0 disables
+RESULT_CACHE_PATH = os.environ.get("ML_RESULT_CACHE_PATH", "")                     # SQLite file, empty = memory only
+RESULT_CACHE_DISK_MAX = int(os.environ.get("ML_RESULT_CACHE_DISK_MAX", "200000"))  # rows kept on disk
+
+# The on-disk tier is trimmed back to RESULT_CACHE_DISK_MAX every this many writes
+PRUNE_EVERY = 1000
+
+
+def image_digest(image_bytes):
+    """Fast 128-bit content hash of the encoded image bytes."""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def fingerprint(*parts):
+    """Short hash of everything a result depends on besides the image (models, rules, thresholds)."""
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def file_signature(path):
+    """(size, mtime) of a weights file or model directory, so replaced weights change the fingerprint."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, int(stat.st_mtime)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of /process-ml responses.
+
+    Keys are the hash of the raw image bytes, scoped by session (a result depends on the
+    session's gaze and rule history), and prefixed with the configuration `fingerprint`. When
+    the model, rule table or thresholds change, the fingerprint changes and old entries simply
+    stop matching. Workers of both configurations share the disk tier during a rolling restart,
+    so old rows are not purged on open; they age out through the size limit like any other row.
+
+    The memory tier is a bounded LRU. The optional disk tier is a SQLite file shared by the
+    worker processes and kept across restarts; disk hits are promoted into memory.
+    """
+
+    def __init__(self, config_fingerprint, max_entries=RESULT_CACHE_SIZE, path=RESULT_CACHE_PATH,
+                 disk_max=RESULT_CACHE_DISK_MAX):
+        self.fingerprint = config_fingerprint
+        self.max_entries = max(0, int(max_entries))
+        self.path = path or None
+        self.disk_max = max(1, int(disk_max))
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self.path is not None
+
+    def key(self, image_bytes, scope=None):
+        """Cache key of an encoded image within `scope` (the sessionId)."""
+        return f"{self.fingerprint}:{scope or ''}:{image_digest(image_bytes)}"
+
+    def get(self, key):
+        """Stored response for `key` (a fresh dict the caller may modify), or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits["memory"] += 1
+                return dict(value)
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._hits["disk"] += 1
+        self._remember(key, value)
+        return dict(value)
+
+    def put(self, key, response):
+        """Store a fully analyzed response (error responses are not cached)."""
+        if "error" in response:
+            return
+        self._remember(key, response)
+        self._disk_put(key, response)
+
+    def stats(self):
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            hits = dict(self._hits)
+            stats = {"entries": len(self._entries), "max_entries": self.max_entries, "misses": self._misses}
+        lookups = hits["memory"] + hits["disk"] + stats["misses"]
+        stats.update({
+            "hits": hits,
+            "hit_rate": round((hits["memory"] + hits["disk"]) / lookups, 4) if lookups else 0.0,
+            "fingerprint": self.fingerprint,
+            "disk": self.path,
+        })
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, response):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _connection(self):
+        """This process's SQLite connection, opened on first use (connections must not cross a fork). Caller holds _db_lock."""
+        if self._db is not None and self._db_pid == os.getpid():
+            return self._db
+        db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS results "
+                   "(key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+        db.commit()
+        self._db, self._db_pid = db, os.getpid()
+        return db
+
+    def _disk_get(self, key):
+        if self.path is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._connection().execute("SELECT response FROM results WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Result cache read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _disk_put(self, key, response):
+        if self.path is None:
+            return
+        try:
+            encoded = json.dumps(response, separators=(",", ":"))
+            with self._db_lock:
+                db = self._connection()
+                db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                           (key, self.fingerprint, encoded, time.time()))
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY created DESC "
+                               "LIMIT -1 OFFSET ?)", (self.disk_max,))
+                db.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.warning(f"Result cache write failed: {e}")
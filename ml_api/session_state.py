@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from landmarks import GazeVoter
+
+# Session store bounds (overridable through the environment)
+SESSION_MAX = int(os.environ.get("ML_SESSION_MAX", "512"))
+SESSION_TTL_SECONDS = float(os.environ.get("ML_SESSION_TTL_SECONDS", "1800"))  # 30 minutes idle
+
+# Number of gaze predictions used for temporal smoothing
+GAZE_WINDOW = 5
+
+
+class SessionState:
+    """
+    Detector state owned by one exam session: its gaze smoothing window and its own
+    tracking-mode FaceMesh, so landmarks tracked for one student never leak into another.
+
+    `lock` must be held while the state is used; requests for the same session are
+    serialized, requests for different sessions can run in parallel.
+    """
+
+    def __init__(self, session_id, mesh_factory=None):
+        self.session_id = session_id
+        self.gaze_history = GazeVoter(GAZE_WINDOW)
+        self.lock = threading.RLock()
+        self.last_seen = time.monotonic()
+        self.roi = None          # normalized (x1, y1, x2, y2) around the student, for ROI-mode inference
+        self.roi_frames = 0      # frames analyzed on the ROI since the last full-frame pass
+        self.last_analysis = None  # FrameGate reference: signature, result, skips, time
+        self.cascade_frames = 0  # frames seen by the detection cascade, for its periodic heavy-tier audit
+        self.last_flagged = None   # monotonic time of the session's last violation, for admission priority
+        self.rule_history = {}     # recent outcomes of persistent violation rules (RuleEngine.evaluate)
+        self.tracker = None        # SessionTracker of detected objects, created on the first tracked frame
+        self._mesh_factory = mesh_factory
+        self._face_mesh = None
+
+    @property
+    def face_mesh(self):
+        """Tracking-mode FaceMesh for this session, created on first use."""
+        if self._face_mesh is None and self._mesh_factory is not None:
+            self._face_mesh = self._mesh_factory()
+        return self._face_mesh
+
+    def close(self):
+        """Release native resources held by this session."""
+        if self._face_mesh is not None:
+            try:
+                self._face_mesh.close()
+            except Exception as e:
+                logging.warning(f"Error closing face mesh for session {self.session_id}: {e}")
+            self._face_mesh = None
+
+
+class SessionStateStore:
+    """
+    Thread-safe LRU/TTL map of sessionId -> SessionState.
+
+    Entries idle for longer than `ttl_seconds` are dropped, and the least recently used
+    entry is dropped whenever the store grows beyond `max_sessions`.
+    """
+
+    def __init__(self, mesh_factory=None, max_sessions=SESSION_MAX, ttl_seconds=SESSION_TTL_SECONDS):
+        self.mesh_factory = mesh_factory
+        self.max_sessions = max(1, int(max_sessions))
+        self.ttl_seconds = float(ttl_seconds)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return the state for `session_id`, creating it if needed and refreshing its LRU position."""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState(session_id, self.mesh_factory)
+                self._sessions[session_id] = state
+            else:
+                self._sessions.move_to_end(session_id)
+            state.last_seen = now
+            evicted = self._evict(now)
+
+        for old in evicted:
+            self._close(old)
+        return state
+
+    def discard(self, session_id):
+        """Drop a session explicitly (e.g. when its exam is submitted)."""
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+        if state is not None:
+            self._close(state)
+
+    def clear(self):
+        """Drop every session (used on shutdown)."""
+        with self._lock:
+            states = list(self._sessions.values())
+            self._sessions.clear()
+        for state in states:
+            self._close(state)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict(self, now):
+        """Pop expired and over-capacity entries. Caller holds self._lock."""
+        evicted = []
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            expired = now - oldest.last_seen > self.ttl_seconds
+            if not expired and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            evicted.append(oldest)
+        return evicted
+
+    @staticmethod
+    def _close(state):
+        # Wait for any in-flight request on this session before releasing its mesh
+        with state.lock:
+            state.close()
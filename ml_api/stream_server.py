@@ -0,0 +1,237 @@
+"""
+Streaming ingestion for continuous proctoring: one long-lived WebSocket per exam node.
+
+    cd ml_api && python stream_server.py
+
+Frames are sent as binary messages: a 4-byte big-endian header length, a JSON header
+{"sessionId": ..., "frameId": ..., "annotate": false} and the encoded image bytes.
+A text message {"image": <base64>, "sessionId": ..., "frameId": ...} is accepted as well,
+and {"type": "stats"} returns the server counters.
+
+Results are sent back as JSON text messages as soon as each frame finishes, carrying the
+frame's frameId and sessionId next to the usual /process-ml fields. Under overload frames
+are dropped instead of queued, and the client gets {"frameId", "sessionId", "dropped": true, "reason"}:
+
+- superseded: a newer frame of the same session arrived before this one started; only the
+  latest pending frame per session is kept,
+- overloaded: too many sessions are already waiting for an inference slot,
+- stale: the frame waited longer than ML_STREAM_MAX_AGE_MS before its turn came.
+"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import websockets
+
+from admission import Overloaded
+from ml_service import decode_base64, process_bytes, ready_event
+
+# Streaming configuration (overridable through the environment)
+STREAM_HOST = os.environ.get("ML_STREAM_HOST", "0.0.0.0")
+STREAM_PORT = int(os.environ.get("ML_STREAM_PORT", "5002"))
+STREAM_WORKERS = int(os.environ.get("ML_STREAM_WORKERS", "8"))          # frames analyzed concurrently
+STREAM_MAX_QUEUED = int(os.environ.get("ML_STREAM_MAX_QUEUED", "64"))   # sessions waiting for a slot before dropping
+STREAM_MAX_AGE_MS = float(os.environ.get("ML_STREAM_MAX_AGE_MS", "5000"))
+STREAM_MAX_MESSAGE_BYTES = int(os.environ.get("ML_STREAM_MAX_MESSAGE_BYTES", str(8 * 1024 * 1024)))
+
+# Number of recent frames used for the p50/p99 estimate
+LATENCY_WINDOW = 512
+
+HEADER_LENGTH = struct.Struct(">I")
+
+
+def parse_message(message):
+    """
+    Split one client message into its header and encoded image.
+    Returns: (header dict, image bytes or None, base64 image or None)
+    """
+    if isinstance(message, bytes):
+        if len(message) < HEADER_LENGTH.size:
+            raise ValueError("Binary frame is shorter than its header length prefix")
+        (length,) = HEADER_LENGTH.unpack_from(message)
+        end = HEADER_LENGTH.size + length
+        header = json.loads(message[HEADER_LENGTH.size:end]) if length else {}
+        return header, message[end:], None
+    header = json.loads(message)
+    return header, None, header.pop("image", None)
+
+
+class StreamStats:
+    """Frame counters and recent end-to-end latency across all connections."""
+
+    def __init__(self):
+        self.connections = 0
+        self.received = 0
+        self.processed = 0
+        self.dropped = Counter()
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self, queued):
+        p50, p99 = (np.percentile(self.latencies_ms, [50, 99]).tolist() if self.latencies_ms else (0.0, 0.0))
+        return {
+            "connections": self.connections,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": dict(self.dropped),
+            "queued_sessions": queued,
+            "p50_ms": round(p50, 2),
+            "p99_ms": round(p99, 2),
+        }
+
+
+class SessionLane:
+    """
+    Per-session slot: at most one frame being analyzed and one waiting behind it.
+    A connection only keeps lanes with work: a lane is dropped once its last frame is done.
+    """
+
+    def __init__(self):
+        self.pending = None   # (header, image bytes, base64 image, received time)
+        self.running = False
+
+
+class StreamServer:
+    """
+    Accepts frames from many connections and analyzes them on a thread pool.
+
+    Every session gets a lane, so frames of one session are answered in order and a burst
+    from one student cannot occupy more than one inference slot. Inference slots are
+    bounded by `workers`; when more than `max_queued` lanes are waiting for one, new
+    frames are dropped right away so latency stays flat instead of growing with the backlog.
+    """
+
+    def __init__(self, workers=STREAM_WORKERS, max_queued=STREAM_MAX_QUEUED, max_age_ms=STREAM_MAX_AGE_MS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-stream")
+        self.slots = asyncio.Semaphore(workers)
+        self.max_queued = max_queued
+        self.max_age = max_age_ms / 1000.0
+        self.queued = 0
+        self.stats = StreamStats()
+
+    async def handle(self, websocket):
+        """One client connection: read frames, schedule them per session, stream results back."""
+        self.stats.connections += 1
+        lanes = {}  # sessionId -> SessionLane, only while the lane has a frame running or pending
+        tasks = set()  # strong references, so running lanes are not garbage-collected
+        send_lock = asyncio.Lock()
+
+        async def send(payload):
+            # websockets applies backpressure here: a slow reader blocks its own lanes, not the server
+            async with send_lock:
+                await websocket.send(json.dumps(payload))
+
+        try:
+            async for message in websocket:
+                try:
+                    header, image_bytes, image_b64 = parse_message(message)
+                except (ValueError, UnicodeDecodeError) as e:
+                    await send({"error": f"Malformed message: {e}"})
+                    continue
+
+                if header.get("type") == "stats":
+                    await send({"type": "stats", **self.stats.snapshot(self.queued)})
+                    continue
+                if image_bytes is None and image_b64 is None:
+                    await send({"frameId": header.get("frameId"), "error": "No image provided"})
+                    continue
+
+                self.stats.received += 1
+                session_id = header.get("sessionId")
+                lane = lanes.get(session_id)
+                if lane is None:
+                    if self.queued >= self.max_queued:
+                        await send(self._dropped(header, "overloaded"))
+                        continue
+                    lane = lanes[session_id] = SessionLane()
+
+                # Latest frame wins: a frame still pending never started, tell the client it was skipped
+                superseded, lane.pending = lane.pending, (header, image_bytes, image_b64, time.monotonic())
+                if not lane.running:
+                    lane.running = True
+                    self.queued += 1
+                    task = asyncio.create_task(self._drain(lanes, session_id, lane, send))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if superseded is not None:
+                    await send(self._dropped(superseded[0], "superseded"))
+        finally:
+            self.stats.connections -= 1
+            # Frames that have not started are abandoned; in-flight ones finish and release their slot
+            for lane in lanes.values():
+                lane.pending = None
+
+    async def _drain(self, lanes, session_id, lane, send):
+        """Analyze a lane's frames one after the other until it has nothing pending, then drop the lane."""
+        try:
+            while True:
+                await self._run_next(lane, send)
+                if lane.pending is None:
+                    break
+                self.queued += 1
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            lane.running = False
+            if lanes.get(session_id) is lane:
+                del lanes[session_id]
+
+    async def _run_next(self, lane, send):
+        """Wait for an inference slot (the lane is counted as queued until then) and analyze its pending frame."""
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            if lane.pending is None:  # Connection closed while waiting
+                return
+            header, image_bytes, image_b64, received = lane.pending
+            lane.pending = None
+            if time.monotonic() - received > self.max_age:
+                await send(self._dropped(header, "stale"))
+                return
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, analyze, header, image_bytes, image_b64)
+        finally:
+            self.slots.release()
+
+        self.stats.processed += 1
+        self.stats.latencies_ms.append((time.monotonic() - received) * 1000.0)
+        await send({"frameId": header.get("frameId"), "sessionId": header.get("sessionId"), **result})
+
+    def _dropped(self, header, reason):
+        self.stats.dropped[reason] += 1
+        return {"frameId": header.get("frameId"), "sessionId": header.get("sessionId"), "dropped": True, "reason": reason}
+
+
+def analyze(header, image_bytes, image_b64):
+    """Decode and analyze one streamed frame (runs on the thread pool). Returns: the /process-ml response dict"""
+    try:
+        if image_bytes is None:
+            image_bytes, error = decode_base64(image_b64)
+            if error:
+                return {"error": error}
+        response, error = process_bytes(image_bytes, header.get("sessionId"), bool(header.get("annotate")))
+        return {"error": error} if error else response
+    except Overloaded as e:
+        # The worker's decoded-frame budget is full; the client may resend a newer frame
+        return {"error": "overloaded", "reason": e.reason}
+    except Exception as e:
+        logging.error(f"Stream frame error: {e}")
+        return {"error": f"Unexpected error: {str(e)}"}
+
+
+async def main():
+    server = StreamServer()
+    async with websockets.serve(server.handle, STREAM_HOST, STREAM_PORT, max_size=STREAM_MAX_MESSAGE_BYTES):
+        logging.info(f"ML stream server listening on ws://{STREAM_HOST}:{STREAM_PORT} (ready: {ready_event.is_set()})")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,241 @@
+"""
+Low-overhead instrumentation shared by the ML servers.
+
+Metrics are kept in process and rendered in the Prometheus text format by `render()`
+(served at /metrics). Recording is a lock plus a few integer updates, with no string
+formatting on the request path. Under gunicorn every worker keeps its own series; the
+`pid` label tells them apart.
+
+Per-frame detail logs are sampled (ML_FRAME_LOG_SAMPLE, fraction of frames, off by default)
+and all log records are written by a background thread, so the request path never waits on I/O.
+"""
+import bisect
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# Fraction of frames whose per-frame details are logged (0 = none, 1 = every frame)
+FRAME_LOG_SAMPLE = float(os.environ.get("ML_FRAME_LOG_SAMPLE", "0"))
+
+# Latency buckets in seconds, from a cached answer to a cold large-model pass
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PID = str(os.getpid())
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        """Yield (suffix, label values, extra label pairs, value) for rendering."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.labelnames + ("pid",), values + (PID,), extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [("", key, (), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    Point-in-time value read from a callback at scrape time, so nothing is recorded on the hot path.
+    `fn` returns a number, or {label values tuple: number} for labelled gauges.
+    """
+    type = "gauge"
+
+    def __init__(self, name, documentation, fn, labelnames=(), registry=None, metric_type="gauge"):
+        super().__init__(name, documentation, labelnames, registry)
+        self.fn = fn
+        self.type = metric_type
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            logging.warning(f"Metric {self.name} callback failed: {e}")
+            return []
+        if isinstance(value, dict):
+            return [("", tuple(str(v) for v in key), (), val) for key, val in value.items()]
+        return [("", (), (), value)]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram per label set."""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of the `with` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        samples = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", key, (), series[-1]))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Metrics shared by both servers
+STAGE_SECONDS = Histogram("ml_stage_seconds", "Time spent per pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("ml_request_seconds", "End-to-end request handling time", ["endpoint"])
+FRAMES = Counter("ml_frames_total", "Frames answered, by how they were answered", ["result"])
+VIOLATIONS = Counter("ml_violations_total", "Violations reported, by type", ["type"])
+
+
+def render():
+    """All registered metrics in the Prometheus text format."""
+    return REGISTRY.render()
+
+
+def count_violations(violations):
+    for violation in violations:
+        VIOLATIONS.inc(violation)
+
+
+def frame_sampled():
+    """Whether the current frame's details should be logged (ML_FRAME_LOG_SAMPLE)."""
+    return FRAME_LOG_SAMPLE > 0 and (FRAME_LOG_SAMPLE >= 1 or random.random() < FRAME_LOG_SAMPLE)
+
+
+frame_logger = logging.getLogger("ml.frames")
+
+
+def log_frame(message, *args):
+    """Log per-frame details for a sample of frames; arguments are only formatted by the log thread."""
+    if frame_sampled():
+        frame_logger.info(message, *args)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # Hand the record over as is: message formatting happens on the listener thread
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+_listener_handlers = ()
+
+
+def _start_listener(log_queue, handlers):
+    global _listener
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def configure_async_logging():
+    """Move the root logger's handlers behind a queue drained by a background thread (idempotent)."""
+    global _listener_handlers
+    root = logging.getLogger()
+    if any(isinstance(handler, _DeferredQueueHandler) for handler in root.handlers):
+        return
+    log_queue = queue.SimpleQueue()
+    _listener_handlers = tuple(root.handlers)
+    for handler in _listener_handlers:
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    _start_listener(log_queue, _listener_handlers)
+
+    # Threads do not survive fork: pre-forked workers start their own listener on the same queue
+    def restart_in_child():
+        global PID
+        PID = str(os.getpid())
+        _start_listener(log_queue, _listener_handlers)
+    os.register_at_fork(after_in_child=restart_in_child)
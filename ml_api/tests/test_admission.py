@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, Overloaded, PRIORITY_FLAGGED, PRIORITY_NORMAL
+
+
+def queued_waiter(controller, priority=PRIORITY_NORMAL, deadline_ms=5000, hold=None, queued=None):
+    """
+    Start a thread that acquires a slot (and releases it after `hold`, if given).
+    Returns: (thread, outcome dict) once the queue holds `queued` waiters (default: one more than before)
+    """
+    outcome = {}
+    queued = controller.stats()["queued"] + 1 if queued is None else queued
+
+    def run():
+        try:
+            controller.acquire(priority, deadline_ms)
+        except Overloaded as e:
+            outcome["error"] = e.reason
+            return
+        outcome["admitted"] = time.monotonic()
+        if hold is not None:
+            hold.wait(5)
+        controller.release()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while controller.stats()["queued"] < queued and not outcome and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return thread, outcome
+
+
+def test_admits_immediately_below_the_inflight_limit():
+    controller = AdmissionController(max_inflight=2, max_queue=1)
+    controller.acquire()
+    controller.acquire()
+    stats = controller.stats()
+    assert stats["inflight"] == 2 and stats["queued"] == 0 and stats["admitted"] == 2
+    controller.release()
+    controller.release()
+    assert controller.stats()["inflight"] == 0
+
+
+def test_rejects_when_the_queue_is_full():
+    controller = AdmissionController(max_inflight=1, max_queue=1)
+    controller.acquire()
+    thread, outcome = queued_waiter(controller)
+    with pytest.raises(Overloaded) as excinfo:
+        controller.acquire(PRIORITY_NORMAL, 5000)
+    assert excinfo.value.reason == "queue_full"
+    controller.release()
+    thread.join(5)
+    assert "admitted" in outcome
+    assert controller.stats()["shed"] == {"queue_full": 1}
+
+
+def test_higher_priority_sheds_a_queued_request():
+    controller = AdmissionController(max_inflight=1, max_queue=1)
+    controller.acquire()
+    shed_thread, shed = queued_waiter(controller, PRIORITY_NORMAL)
+    # The flagged request takes the normal one's place in the full queue
+    flagged_thread, flagged = queued_waiter(controller, PRIORITY_FLAGGED, queued=1)
+    shed_thread.join(5)
+    assert shed == {"error": "shed"}
+    controller.release()
+    flagged_thread.join(5)
+    assert "admitted" in flagged
+    stats = controller.stats()
+    assert stats["inflight"] == 0 and stats["queued"] == 0 and stats["shed"] == {"shed": 1}
+
+
+def test_release_hands_the_slot_to_the_highest_priority_waiter():
+    controller = AdmissionController(max_inflight=1, max_queue=2)
+    controller.acquire()
+    hold = threading.Event()
+    normal_thread, normal = queued_waiter(controller, PRIORITY_NORMAL, hold=hold)
+    flagged_thread, flagged = queued_waiter(controller, PRIORITY_FLAGGED, hold=hold)
+
+    controller.release()
+    flagged_deadline = time.monotonic() + 5
+    while "admitted" not in flagged and time.monotonic() < flagged_deadline:
+        time.sleep(0.001)
+    # The slot moved to the flagged waiter without ever being free
+    stats = controller.stats()
+    assert "admitted" in flagged and not normal
+    assert stats["inflight"] == 1 and stats["queued"] == 1
+
+    hold.set()
+    flagged_thread.join(5)
+    normal_thread.join(5)
+    assert normal["admitted"] >= flagged["admitted"]
+    assert controller.stats()["inflight"] == 0
+
+
+def test_deadline_gives_up_and_leaves_the_queue():
+    controller = AdmissionController(max_inflight=1, max_queue=4)
+    controller.acquire()
+    with pytest.raises(Overloaded) as excinfo:
+        controller.acquire(PRIORITY_NORMAL, deadline_ms=20)
+    assert excinfo.value.reason == "deadline"
+    assert controller.stats()["queued"] == 0
+    # The expired waiter must not receive the slot: release frees it instead
+    controller.release()
+    assert controller.stats()["inflight"] == 0
+    controller.acquire(PRIORITY_NORMAL, deadline_ms=0)
+    controller.release()
+
+
+def test_hand_off_racing_the_deadline_never_leaks_a_slot():
+    controller = AdmissionController(max_inflight=1, max_queue=8)
+    outcomes = []
+    for _ in range(200):
+        controller.acquire()
+        thread, outcome = queued_waiter(controller, deadline_ms=1)
+        # Release around the moment the waiter's deadline passes
+        controller.release()
+        thread.join(5)
+        outcomes.append(outcome)
+        stats = controller.stats()
+        assert stats["inflight"] == 0 and stats["queued"] == 0
+    # Every waiter either got the slot (and released it) or gave up; none was lost in between
+    assert all(("admitted" in outcome) != ("error" in outcome) for outcome in outcomes)
+    assert all(outcome.get("error", "deadline") == "deadline" for outcome in outcomes)
+
+
+def test_many_threads_respect_the_inflight_limit():
+    controller = AdmissionController(max_inflight=3, max_queue=64)
+    lock = threading.Lock()
+    current, peak = [0], [0]
+
+    def work():
+        with controller.admit(deadline_ms=5000):
+            with lock:
+                current[0] += 1
+                peak[0] = max(peak[0], current[0])
+            time.sleep(0.002)
+            with lock:
+                current[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    stats = controller.stats()
+    assert peak[0] <= 3
+    assert stats["admitted"] == 40 and stats["inflight"] == 0 and stats["queued"] == 0
+
+
+def test_check_threads_flags_unreachable_limits():
+    controller = AdmissionController(max_inflight=8, max_queue=32)
+    assert controller.check_threads(None)
+    assert not controller.check_threads(4)
+    assert not controller.check_threads(20)
+    assert controller.check_threads(40)
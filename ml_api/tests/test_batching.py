@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def recording(fn=lambda items: [item * 2 for item in items]):
+    """batch_fn that remembers every batch it was called with."""
+    batches = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        return fn(items)
+    return batch_fn, batches
+
+
+def submit_together(batcher, items):
+    """Submit from one thread per item, all at once. Returns: results in item order"""
+    barrier = threading.Barrier(len(items))
+    results = [None] * len(items)
+
+    def run(i):
+        barrier.wait()
+        results[i] = batcher.run(items[i], timeout=5)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_submissions_share_a_batch_and_get_their_own_result():
+    batch_fn, batches = recording()
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=200)
+    assert submit_together(batcher, list(range(8))) == [i * 2 for i in range(8)]
+    assert len(batches) < 8 and sum(len(batch) for batch in batches) == 8
+    stats = batcher.stats()
+    assert stats["items"] == 8 and stats["batches"] == len(batches) and stats["pending"] == 0
+
+
+def test_batches_never_exceed_the_max_size():
+    batch_fn, batches = recording()
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=200)
+    submit_together(batcher, list(range(10)))
+    assert max(len(batch) for batch in batches) <= 3
+
+
+def test_a_lone_item_is_flushed_after_max_wait():
+    batch_fn, batches = recording()
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=20)
+    start = time.perf_counter()
+    assert batcher.run(21, timeout=5) == 42
+    assert batches == [[21]]
+    assert time.perf_counter() - start < 2.0
+
+
+def test_batch_failure_reaches_every_caller():
+    def fail(items):
+        raise ValueError("model exploded")
+
+    batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(ValueError, match="model exploded"):
+        batcher.run(1, timeout=5)
+    # The worker keeps serving after a failed batch
+    batcher.batch_fn = lambda items: items
+    assert batcher.run(7, timeout=5) == 7
+
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="returned 0 results for 1 items"):
+        batcher.run(1, timeout=5)
+
+
+def test_batch_size_shrinks_when_p99_is_over_budget():
+    batcher = MicroBatcher(lambda items: (time.sleep(0.002), items)[1], max_batch_size=4, max_wait_ms=0,
+                           latency_budget_ms=0.001)
+    for i in range(40):
+        batcher.run(i, timeout=5)
+    assert batcher.stats()["effective_batch_size"] < 4
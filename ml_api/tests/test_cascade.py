@@ -0,0 +1,98 @@
+import pytest
+
+from cascade import Cascade
+from session_state import SessionState
+
+PERSON = ("person", 0.9, (0, 0, 100, 200))
+
+
+def detection(*labels):
+    """detectObjects-shaped output for the given (label, score, bbox) boxes."""
+    persons = sum(1 for label, _, _ in labels if label == "person")
+    return list(labels), None, persons, [label for label, _, _ in labels]
+
+
+class Tiers:
+    """Fast and heavy tier stand-ins that answer from a per-frame table and record their calls."""
+
+    def __init__(self, fast_outputs):
+        self.fast_outputs = fast_outputs
+        self.fast_calls, self.heavy_calls = [], []
+
+    def fast(self, frames, rois, min_score):
+        self.fast_calls.append(list(frames))
+        return [self.fast_outputs[frame] for frame in frames]
+
+    def heavy(self, frames, rois):
+        self.heavy_calls.append(list(frames))
+        return [detection(PERSON, ("heavy", 1.0, (0, 0, 1, 1))) for _ in frames]
+
+
+@pytest.fixture
+def cascade():
+    return Cascade(lambda *args: [], lambda *args: [], min_score=0.25, confident_score=0.6, audit_every=0)
+
+
+@pytest.mark.parametrize("boxes, face_count, reason", [
+    ((PERSON,), 1, None),
+    ((PERSON,), 0, "face_count"),
+    ((PERSON,), 2, "face_count"),
+    ((PERSON, ("cell phone", 0.9, (0, 0, 5, 5))), 1, "object"),
+    ((), 1, "person_count"),
+    ((PERSON, PERSON), 1, "person_count"),
+    ((("person", 0.4, (0, 0, 100, 200)),), 1, "uncertain"),
+])
+def test_escalation_reasons(cascade, boxes, face_count, reason):
+    assert cascade.escalation_reason(detection(*boxes), face_count) == reason
+
+
+def test_audit_escalates_an_otherwise_clean_frame(cascade):
+    assert cascade.escalation_reason(detection(PERSON), 1, audit_due=True) == "audit"
+
+
+def test_only_escalated_frames_reach_the_heavy_tier():
+    tiers = Tiers({"clean": detection(PERSON), "phone": detection(PERSON, ("cell phone", 0.8, (0, 0, 5, 5))),
+                   "empty": detection()})
+    cascade = Cascade(tiers.fast, tiers.heavy, audit_every=0)
+    states = [SessionState(f"s{i}") for i in range(3)]
+    outputs = cascade.detect(["clean", "phone", "empty"], [None] * 3, [1, 1, 1], states)
+
+    assert tiers.fast_calls == [["clean", "phone", "empty"]]
+    assert tiers.heavy_calls == [["phone", "empty"]]
+    assert [tier for _, tier in outputs] == ["fast", "heavy", "heavy"]
+    assert outputs[0][0] == detection(PERSON) and outputs[1][0][3] == ["person", "heavy"]
+
+    stats = cascade.stats()
+    assert stats["frames"] == 3
+    assert stats["tiers"]["fast"]["frames"] == 1 and stats["tiers"]["heavy"]["frames"] == 2
+    assert stats["escalations"] == {"object": 1, "person_count": 1}
+
+
+def test_clean_batch_never_runs_the_heavy_tier():
+    tiers = Tiers({"clean": detection(PERSON)})
+    cascade = Cascade(tiers.fast, tiers.heavy, audit_every=0)
+    outputs = cascade.detect(["clean"] * 4, [None] * 4, [1] * 4, [SessionState("s")] * 4)
+    assert tiers.heavy_calls == [] and all(tier == "fast" for _, tier in outputs)
+
+
+def test_periodic_audit_is_counted_per_session():
+    tiers = Tiers({"clean": detection(PERSON)})
+    cascade = Cascade(tiers.fast, tiers.heavy, audit_every=3)
+    a, b = SessionState("a"), SessionState("b")
+    tiers_seen = []
+    for _ in range(3):
+        tiers_seen.append([tier for _, tier in cascade.detect(["clean", "clean"], [None] * 2, [1, 1], [a, b])])
+    # Each session's 3rd frame is audited, whatever the other session is doing
+    assert tiers_seen == [["fast", "fast"], ["fast", "fast"], ["heavy", "heavy"]]
+    assert cascade.stats()["escalations"] == {"audit": 2}
+
+
+def test_anonymous_frames_share_one_audit_counter():
+    tiers = Tiers({"clean": detection(PERSON)})
+    cascade = Cascade(tiers.fast, tiers.heavy, audit_every=2)
+    outputs = cascade.detect(["clean"] * 4, [None] * 4, [1] * 4, [SessionState(None) for _ in range(4)])
+    assert [tier for _, tier in outputs] == ["fast", "heavy", "fast", "heavy"]
+
+
+def test_empty_batch(cascade):
+    assert cascade.detect([], [], [], []) == []
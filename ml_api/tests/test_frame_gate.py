@@ -0,0 +1,81 @@
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from frame_gate import FrameGate
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(60, 200, (480, 640, 3), dtype=np.uint8)
+
+
+def analyzed(gate, frame, result=None):
+    """A session state whose last full analysis was `frame`."""
+    state = types.SimpleNamespace(last_analysis=None)
+    cached, signature = gate.lookup(state, frame)
+    assert cached is None
+    gate.store(state, signature, result or {"violations": []})
+    return state
+
+
+def test_unchanged_frame_reuses_the_result(frame):
+    gate = FrameGate(enabled=True)
+    state = analyzed(gate, frame, {"violations": ["ml_gaze_away"]})
+    noisy = np.clip(frame.astype(np.int16) + np.random.default_rng(1).integers(-4, 5, frame.shape), 0, 255)
+    cached, _ = gate.lookup(state, noisy.astype(np.uint8))
+    assert cached == {"violations": ["ml_gaze_away"]}
+    assert gate.stats()["hits"] == 1
+
+
+def test_small_local_change_is_not_averaged_away(frame):
+    gate = FrameGate(enabled=True)
+    state = analyzed(gate, frame)
+    # A phone-sized object in a corner moves the thumbnail's mean by only a couple of levels
+    changed = frame.copy()
+    changed[370:470, 570:630] = 10
+    cached, _ = gate.lookup(state, changed)
+    assert cached is None
+
+
+def test_full_analysis_is_forced_after_max_skips(frame):
+    gate = FrameGate(enabled=True, max_skips=2, max_age_seconds=60)
+    state = analyzed(gate, frame)
+    assert gate.lookup(state, frame)[0] is not None
+    assert gate.lookup(state, frame)[0] is not None
+    assert gate.lookup(state, frame)[0] is None
+
+
+def test_full_analysis_is_forced_after_max_age(frame):
+    gate = FrameGate(enabled=True, max_age_seconds=0)
+    state = analyzed(gate, frame)
+    assert gate.lookup(state, frame)[0] is None
+
+
+def test_disabled_gate_never_reuses(frame):
+    gate = FrameGate(enabled=False)
+    state = types.SimpleNamespace(last_analysis=None)
+    _, signature = gate.lookup(state, frame)
+    gate.store(state, signature, {"violations": []})
+    assert state.last_analysis is None
+    assert gate.lookup(state, frame)[0] is None
+
+
+def test_counters_are_exact_under_concurrent_lookups(frame):
+    gate = FrameGate(enabled=True, max_skips=10 ** 9, max_age_seconds=3600)
+    states = [analyzed(gate, frame) for _ in range(8)]
+
+    def run(state):
+        for _ in range(200):
+            gate.lookup(state, frame)
+
+    threads = [threading.Thread(target=run, args=(state,)) for state in states]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = gate.stats()
+    assert stats["hits"] == 8 * 200 and stats["misses"] == 8
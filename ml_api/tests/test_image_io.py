@@ -0,0 +1,140 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+
+from image_io import (FACE_INPUT_WIDTH, YOLO_INPUT_WIDTH, FramePyramid, decode_reduced, decoded_shape,
+                      is_binary_request, jpeg_size, png_size, read_binary_images)
+
+app = Flask(__name__)
+
+
+def jpeg(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    ok, buffer = cv2.imencode(".jpg", cv2.resize(small, (width, height)))
+    assert ok
+    return buffer.tobytes()
+
+
+def test_json_requests_are_not_binary():
+    with app.test_request_context("/process-ml", method="POST", json={"image": "abc"}):
+        from flask import request
+        assert not is_binary_request(request)
+
+
+def test_raw_body_with_header_fields():
+    body = jpeg(64, 48)
+    with app.test_request_context("/process-ml", method="POST", data=body, content_type="image/jpeg",
+                                  headers={"X-Session-Id": "s1", "X-Annotate": "true"}):
+        from flask import request
+        assert is_binary_request(request)
+        (buffer, fields), = read_binary_images(request)
+        assert bytes(buffer) == body
+        assert fields == {"sessionId": "s1", "annotate": True}
+
+
+def test_query_string_fields_win_over_headers():
+    with app.test_request_context("/process-ml?sessionId=q&annotate=0", method="POST", data=jpeg(64, 48),
+                                  content_type="application/octet-stream", headers={"X-Session-Id": "h"}):
+        from flask import request
+        (_, fields), = read_binary_images(request)
+        assert fields == {"sessionId": "q", "annotate": False}
+
+
+def multipart_uploads(images, session_ids):
+    data = {"image": [(io.BytesIO(image), f"{i}.jpg") for i, image in enumerate(images)],
+            "sessionId": session_ids, "annotate": "yes"}
+    with app.test_request_context("/process-ml/batch", method="POST", data=data, content_type="multipart/form-data"):
+        from flask import request
+        assert is_binary_request(request)
+        return read_binary_images(request)
+
+
+def test_multipart_pairs_images_with_session_ids_in_order():
+    images = [jpeg(64, 48, seed) for seed in range(3)]
+    uploads = multipart_uploads(images, ["a", "b", "c"])
+    assert [bytes(buffer) for buffer, _ in uploads] == images
+    assert [fields["sessionId"] for _, fields in uploads] == ["a", "b", "c"]
+    assert all(fields["annotate"] for _, fields in uploads)
+
+
+def test_multipart_single_session_id_applies_to_every_image():
+    uploads = multipart_uploads([jpeg(64, 48, seed) for seed in range(3)], ["a"])
+    assert [fields["sessionId"] for _, fields in uploads] == ["a", "a", "a"]
+
+
+@pytest.mark.parametrize("content_type", ["image/jpeg", "multipart/form-data"])
+def test_empty_uploads(content_type):
+    with app.test_request_context("/process-ml", method="POST", data=b"" if content_type == "image/jpeg" else {},
+                                  content_type=content_type):
+        from flask import request
+        uploads = read_binary_images(request)
+    assert uploads == [] or bytes(uploads[0][0]) == b""
+
+
+@pytest.mark.parametrize("width, height", [(320, 240), (640, 480), (1920, 1080), (1281, 719)])
+def test_jpeg_size_reads_the_header(width, height):
+    assert jpeg_size(jpeg(width, height)) == (height, width)
+
+
+def test_png_size_reads_the_header():
+    ok, buffer = cv2.imencode(".png", np.zeros((30, 70, 3), np.uint8))
+    assert png_size(buffer.tobytes()) == (30, 70)
+    assert jpeg_size(buffer.tobytes()) is None
+
+
+@pytest.mark.parametrize("data", [b"", b"\xff\xd8", b"not an image at all", b"\xff\xd8\x00\x00\x00\x00\x00\x00\x00\x00\x00"])
+def test_headers_of_other_data_are_not_sizes(data):
+    assert jpeg_size(data) is None and png_size(data) is None
+
+
+@pytest.mark.parametrize("width, height, expected", [
+    (1920, 1080, (540, 960)),    # 1/2 scale is the smallest still >= 640 wide
+    (2560, 1440, (360, 640)),    # 1/4
+    (5200, 2920, (365, 650)),    # 1/8
+    (640, 480, (480, 640)),      # already small: full size
+    (1279, 719, (719, 1279)),    # 1/2 would be narrower than 640
+])
+def test_decode_reduced_picks_the_smallest_sufficient_scale(width, height, expected):
+    data = jpeg(width, height)
+    frame, original = decode_reduced(data, 640)
+    assert original == (height, width)
+    assert frame.shape[:2] == expected
+    assert decoded_shape(data, 640) == expected
+
+
+def test_decode_reduced_rejects_garbage():
+    frame, original = decode_reduced(b"\xff\xd8garbage", 640)
+    assert frame is None
+
+
+def test_pyramid_levels_are_cached_and_never_upscaled():
+    frame = FramePyramid.from_bytes(jpeg(1920, 1080))
+    assert frame.original_size == (1080, 1920)
+    assert frame.yolo.shape[1] == YOLO_INPUT_WIDTH and frame.face.shape[1] == FACE_INPUT_WIDTH
+    assert frame.yolo is frame.yolo and frame.face_rgb is frame.face_rgb
+    np.testing.assert_array_equal(frame.face_rgb, frame.face[..., ::-1])
+    small = FramePyramid.from_bytes(jpeg(320, 240))
+    assert small.yolo is small.base and small.face is small.base
+
+
+def pyramid_nbytes(frame):
+    """Bytes actually held by a pyramid with every level materialized (shared levels counted once)."""
+    arrays = {id(array): array for array in (frame.base, frame.yolo, frame.face, frame.face_rgb)}
+    return sum(array.nbytes for array in arrays.values())
+
+
+@pytest.mark.parametrize("width, height", [(320, 240), (640, 480), (1280, 720), (1920, 1080), (2560, 1440)])
+def test_estimate_nbytes_matches_the_decoded_pyramid(width, height):
+    data = jpeg(width, height)
+    frame = FramePyramid.from_bytes(data)
+    actual = pyramid_nbytes(frame)
+    estimate = FramePyramid.estimate_nbytes(data)
+    assert actual <= estimate <= actual * 1.02
+
+
+def test_estimate_nbytes_assumes_a_large_frame_without_a_header():
+    assert FramePyramid.estimate_nbytes(b"unknown") >= 1080 * 1920 * 3
@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("ultralytics")
+torch = pytest.importorskip("torch")
+inference_backend = pytest.importorskip("inference_backend")
+
+
+def test_unsupported_precision_is_rejected():
+    with pytest.raises(ValueError):
+        inference_backend.check_precision("onnx", "fp16")
+    with pytest.raises(ValueError):
+        inference_backend.check_precision("pytorch", "int8")
+
+
+def test_pytorch_fp16_needs_cuda(monkeypatch):
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+    with pytest.raises(ValueError, match="CUDA"):
+        inference_backend.check_precision("pytorch", "fp16")
+    with pytest.raises(ValueError, match="CUDA"):
+        inference_backend.export_model("pytorch", "n", precision="fp16")
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    inference_backend.check_precision("pytorch", "fp16")
+
+
+def test_cpu_precisions_need_no_gpu(monkeypatch):
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+    for backend, precision in (("pytorch", "fp32"), ("onnx", "int8"), ("openvino", "fp16")):
+        inference_backend.check_precision(backend, precision)
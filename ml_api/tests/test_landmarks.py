@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+from landmarks import HEAD_MODEL_POINTS_3D, solve_head_pose, solve_head_poses
+
+WIDTH, HEIGHT = 640, 480
+CAMERA = np.array([[WIDTH, 0, WIDTH / 2], [0, WIDTH, HEIGHT / 2], [0, 0, 1]], dtype=np.float64)
+POSES = [(0, 0, 0), (10, -20, 5), (-12, 25, -8), (5, 5, 30), (-20, -10, 0)]
+
+
+def project(rotation_degrees, translation=(30.0, -20.0, 3000.0)):
+    """Pixels of the head model seen under a known rotation and translation."""
+    rvec = np.radians(np.array(rotation_degrees, dtype=np.float64))
+    points, _ = cv2.projectPoints(HEAD_MODEL_POINTS_3D, rvec, np.array(translation), CAMERA, np.zeros(4))
+    return points.reshape(-1, 2)
+
+
+def solve_pnp(image_points):
+    """Reference pose: cv2.solvePnP, decomposed and folded like solve_head_poses."""
+    _, rvec, tvec = cv2.solvePnP(HEAD_MODEL_POINTS_3D, image_points, CAMERA, np.zeros(4),
+                                 flags=cv2.SOLVEPNP_ITERATIVE)
+    rotation, _ = cv2.Rodrigues(rvec)
+    angles = cv2.decomposeProjectionMatrix(np.hstack([rotation, tvec]))[6].ravel()
+    return (angles + 90.0) % 180.0 - 90.0
+
+
+@pytest.mark.parametrize("pose", POSES)
+def test_posit_matches_solvepnp(pose):
+    points = project(pose)
+    np.testing.assert_allclose(solve_head_poses([points], [(HEIGHT, WIDTH, 3)])[0], solve_pnp(points), atol=0.5)
+
+
+def test_faces_are_solved_together():
+    points = [project(pose) for pose in POSES]
+    batched = solve_head_poses(points, [(HEIGHT, WIDTH, 3)] * len(POSES))
+    single = np.array([solve_head_poses([p], [(HEIGHT, WIDTH, 3)])[0] for p in points])
+    np.testing.assert_allclose(batched, single, atol=1e-9)
+
+
+def test_frontal_face_is_near_zero():
+    assert np.allclose(solve_head_pose(project((0, 0, 0)), (HEIGHT, WIDTH)), 0.0, atol=0.5)
+
+
+def test_degenerate_faces_are_nan():
+    degenerate = np.full((6, 2), 100.0)
+    poses = solve_head_poses([degenerate, project((10, 10, 0))], [(HEIGHT, WIDTH)] * 2)
+    assert np.all(np.isnan(poses[0])) and np.all(np.isfinite(poses[1]))
+    assert solve_head_pose(degenerate, (HEIGHT, WIDTH)) is None
+
+
+def test_no_faces():
+    assert solve_head_poses(np.empty((0, 6, 2)), []).shape == (0, 3)
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from memory_budget import MB, FrameBufferBudget
+
+
+def test_acquire_and_release_track_in_use_and_peak():
+    budget = FrameBufferBudget(max_mb=1, wait_ms=0)
+    budget.acquire(300_000)
+    budget.acquire(400_000)
+    budget.release(300_000)
+    stats = budget.stats()
+    assert stats == {"in_use_bytes": 400_000, "peak_bytes": 700_000, "max_bytes": MB, "rejected": 0}
+
+
+def test_full_budget_waits_then_rejects():
+    budget = FrameBufferBudget(max_mb=1, wait_ms=50)
+    budget.acquire(MB)
+    start = time.monotonic()
+    with pytest.raises(Overloaded) as excinfo:
+        budget.acquire(1)
+    assert excinfo.value.reason == "frame_buffers"
+    assert time.monotonic() - start >= 0.04
+    assert budget.stats()["rejected"] == 1
+    assert budget.stats()["in_use_bytes"] == MB
+
+
+def test_waiting_caller_is_admitted_when_room_frees_up():
+    budget = FrameBufferBudget(max_mb=1, wait_ms=5000)
+    budget.acquire(MB)
+    admitted = threading.Event()
+
+    def wait_for_room():
+        budget.acquire(MB // 2)
+        admitted.set()
+
+    thread = threading.Thread(target=wait_for_room)
+    thread.start()
+    assert not admitted.wait(0.1)
+    budget.release(MB)
+    assert admitted.wait(2)
+    thread.join()
+    assert budget.stats()["in_use_bytes"] == MB // 2
+    assert budget.stats()["rejected"] == 0
+
+
+def test_oversized_frame_is_let_through_only_when_idle():
+    budget = FrameBufferBudget(max_mb=1, wait_ms=0)
+    budget.acquire(3 * MB)
+    budget.release(3 * MB)
+    budget.acquire(1)
+    with pytest.raises(Overloaded):
+        budget.acquire(3 * MB)
+
+
+def test_zero_budget_disables_the_cap():
+    budget = FrameBufferBudget(max_mb=0, wait_ms=0)
+    assert not budget.enabled
+    for _ in range(10):
+        budget.acquire(100 * MB)
+    assert budget.stats()["in_use_bytes"] == 0
+
+
+def test_reserve_releases_when_the_block_raises():
+    budget = FrameBufferBudget(max_mb=1, wait_ms=0)
+    with pytest.raises(ValueError):
+        with budget.reserve(MB):
+            assert budget.stats()["in_use_bytes"] == MB
+            raise ValueError("decode failed")
+    assert budget.stats()["in_use_bytes"] == 0
+    with budget.reserve(MB):
+        pass
@@ -0,0 +1,60 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("dlib")
+pytest.importorskip("ultralytics")
+ml_server = pytest.importorskip("ml_server")  # loads YOLO and the dlib models at import
+
+from fixtures import generate_fixtures, load_fixtures
+
+pytestmark = pytest.mark.skipif(not ml_server.capabilities.get("head_pose"), reason="shape predictor not available")
+
+
+@pytest.fixture(scope="module")
+def images():
+    """Generated fixtures, plus real snapshots with faces from ML_TEST_IMAGES when it is set."""
+    fixtures = generate_fixtures()
+    if os.environ.get("ML_TEST_IMAGES"):
+        fixtures += load_fixtures(os.environ["ML_TEST_IMAGES"])
+    return [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for _, data in fixtures]
+
+
+def same_faces(first, second):
+    for (points_a, pose_a), (points_b, pose_b) in zip(first, second):
+        if (points_a is None) != (points_b is None) or (pose_a is None) != (pose_b is None):
+            return False
+        if points_a is not None and not np.array_equal(points_a, points_b):
+            return False
+        if pose_a is not None and not np.allclose(pose_a, pose_b):
+            return False
+    return len(first) == len(second)
+
+
+def test_concurrent_batches_match_a_sequential_run(images):
+    sequential = [ml_server.face_stage([image])[0] for image in images]
+    # Several request threads each fanning their batch out over the face pool at once
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        batches = list(pool.map(lambda _: ml_server.face_stage(images), range(8)))
+    assert all(same_faces(batch, sequential) for batch in batches)
+
+
+def test_each_thread_gets_its_own_detector():
+    barrier = threading.Barrier(4)
+    detectors = []
+
+    def run():
+        barrier.wait()
+        detectors.append(ml_server.thread_detector())
+        assert ml_server.thread_detector() is detectors[-1]
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(detector) for detector in detectors}) == 4
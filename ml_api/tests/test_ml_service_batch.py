@@ -0,0 +1,40 @@
+import base64
+
+import pytest
+
+pytest.importorskip("mediapipe")
+pytest.importorskip("ultralytics")
+ml_service = pytest.importorskip("ml_service")  # loads YOLO and FaceMesh at import
+
+from fixtures import generate_fixtures
+
+
+@pytest.fixture(scope="module")
+def client():
+    return ml_service.app.test_client()
+
+
+@pytest.fixture(scope="module")
+def image_b64():
+    name, data = next(fixture for fixture in generate_fixtures() if fixture[0].startswith("webcam_640x480"))
+    return base64.b64encode(data).decode("ascii")
+
+
+@pytest.mark.parametrize("bad_item", [{"image": 123}, {"image": ""}, {"image": None}, {"image": ["x"]}, {}, "frame"])
+def test_invalid_batch_item_fails_only_itself(client, image_b64, bad_item):
+    response = client.post("/process-ml/batch", json={"frames": [{"image": image_b64}, bad_item]})
+    assert response.status_code == 200
+    valid, invalid = response.get_json()["results"]
+    assert "error" not in valid and "violations" in valid
+    assert "error" in invalid
+
+
+def test_non_string_image_is_a_bad_request(client):
+    response = client.post("/process-ml", json={"image": 123})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_batch_body_must_be_an_object(client):
+    response = client.post("/process-ml/batch", json=[{"image": "abc"}])
+    assert response.status_code == 400
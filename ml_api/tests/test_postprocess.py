@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from prohibited_classes import class_ids
+
+NAMES = {0: "person", 1: "bicycle", 63: "laptop", 67: "cell phone", 73: "book"}
+FRAME_SHAPE = (480, 640, 3)
+
+
+@pytest.fixture(scope="module")
+def ml():
+    pytest.importorskip("mediapipe")
+    pytest.importorskip("ultralytics")
+    return pytest.importorskip("ml_detections")  # loads YOLO and FaceMesh at import
+
+
+@pytest.fixture(scope="module")
+def table(ml):
+    return ml.ClassTable(NAMES)
+
+
+def test_class_ids_keep_only_registry_labels():
+    assert class_ids(NAMES) == [0, 63, 67, 73]
+    assert class_ids(NAMES, registry={"book": "book"}) == [73]
+
+
+def test_class_table_lookups(table):
+    assert table.labels[67] == "cell phone" and table.labels[2] == "unknown"
+    assert table.reported[1] == -1
+    assert table.reported_names[table.reported[67]] == "cell phone"
+    assert table.reported_names[table.person] == "person"
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+def test_confidence_and_area_filters(ml, table):
+    data = boxes(
+        (10, 10, 110, 110, 0.9, 67),     # kept
+        (10, 10, 110, 110, 0.4, 67),     # low confidence
+        (10, 10, 20, 20, 0.9, 67),       # under 1% of the frame
+        (0, 0, 300, 400, 0.8, 0),        # kept (person)
+    )
+    detections = ml.postprocess_detections(data, FRAME_SHAPE, 0.5, table)
+    assert detections["class_id"].tolist() == [67, 0]
+    assert [table.reported_names[r] for r in detections["reported"]] == ["cell phone", "person"]
+    np.testing.assert_allclose(detections["score"], [0.9, 0.8], rtol=1e-6)
+
+
+def test_scale_and_offset_map_boxes_back_to_the_original_frame(ml, table):
+    data = boxes((10, 20, 110, 120, 0.9, 73))
+    detections = ml.postprocess_detections(data, FRAME_SHAPE, 0.5, table, scale=2.0, offset=(5, 7))
+    np.testing.assert_allclose(detections["bbox"][0], [30, 54, 230, 254])
+
+
+def test_unknown_and_unreported_classes(ml, table):
+    data = boxes((0, 0, 200, 200, 0.9, 500), (0, 0, 200, 200, 0.9, 1))
+    detections = ml.postprocess_detections(data, FRAME_SHAPE, 0.5, table)
+    assert detections["class_id"].tolist() == [-1, 1]
+    assert detections["reported"].tolist() == [-1, -1]
+
+
+@pytest.mark.parametrize("data", [None, np.empty((0, 6)), np.zeros((3, 4)), np.zeros(6)])
+def test_empty_or_malformed_input(ml, table, data):
+    assert len(ml.postprocess_detections(data, FRAME_SHAPE, 0.5, table)) == 0
+
+
+def test_matches_a_per_box_loop(ml, table):
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 500, (200, 2))
+    wh = rng.uniform(1, 200, (200, 2))
+    data = np.column_stack([xy, xy + wh, rng.uniform(0, 1, 200), rng.choice([0, 1, 63, 67, 73, 90], 200)])
+    detections = ml.postprocess_detections(data, FRAME_SHAPE, 0.5, table, scale=1.5)
+
+    expected = []
+    for x1, y1, x2, y2, score, class_id in data:
+        if score > 0.5 and (x2 - x1) * (y2 - y1) > 0.01 * FRAME_SHAPE[0] * FRAME_SHAPE[1]:
+            label = NAMES.get(int(class_id), "unknown")
+            expected.append((label, (x1 * 1.5, y1 * 1.5, x2 * 1.5, y2 * 1.5)))
+    got = [(table.labels[c] if c >= 0 else "unknown", tuple(b)) for c, b in
+           zip(detections["class_id"].tolist(), detections["bbox"].tolist())]
+    assert [label for label, _ in got] == [label for label, _ in expected]
+    np.testing.assert_allclose([box for _, box in got], [box for _, box in expected], rtol=1e-5)
@@ -0,0 +1,75 @@
+import result_cache
+from result_cache import ResultCache
+
+RESPONSE = {"violations": ["ml_gaze_away"], "face_count": 1}
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = ResultCache("f1", max_entries=2, path="")
+    keys = [cache.key(bytes([i]), "s") for i in range(3)]
+    cache.put(keys[0], RESPONSE)
+    cache.put(keys[1], RESPONSE)
+    assert cache.get(keys[0]) == RESPONSE   # keys[0] is now the most recently used
+    cache.put(keys[2], RESPONSE)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == RESPONSE and cache.get(keys[2]) == RESPONSE
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["hits"]["memory"] == 3 and stats["misses"] == 1
+
+
+def test_get_returns_a_copy():
+    cache = ResultCache("f1", max_entries=4, path="")
+    key = cache.key(b"image", "s")
+    cache.put(key, dict(RESPONSE))
+    cache.get(key)["cached"] = True
+    assert "cached" not in cache.get(key)
+
+
+def test_keys_are_scoped_by_session_and_fingerprint():
+    cache = ResultCache("f1", max_entries=4, path="")
+    assert cache.key(b"image", "a") != cache.key(b"image", "b")
+    assert cache.key(b"image", "a") != ResultCache("f2", path="").key(b"image", "a")
+
+
+def test_error_responses_are_not_cached():
+    cache = ResultCache("f1", max_entries=4, path="")
+    key = cache.key(b"image")
+    cache.put(key, {"error": "overloaded"})
+    assert cache.get(key) is None
+
+
+def test_disabled_cache():
+    cache = ResultCache("f1", max_entries=0, path="")
+    assert not cache.enabled
+    key = cache.key(b"image")
+    cache.put(key, RESPONSE)
+    assert cache.get(key) is None
+
+
+def test_disk_tier_survives_a_restart_and_is_promoted(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    key = ResultCache("f1", path=path).key(b"image", "s")
+    ResultCache("f1", max_entries=4, path=path).put(key, RESPONSE)
+
+    restarted = ResultCache("f1", max_entries=4, path=path)
+    assert restarted.get(key) == RESPONSE
+    assert restarted.get(key) == RESPONSE
+    assert restarted.stats()["hits"] == {"memory": 1, "disk": 1}
+
+
+def test_new_fingerprint_keeps_old_disk_entries_until_pruned(tmp_path, monkeypatch):
+    path = str(tmp_path / "results.sqlite")
+    old = ResultCache("f1", max_entries=0, path=path, disk_max=2)
+    old.put(old.key(b"image"), RESPONSE)
+
+    new = ResultCache("f2", max_entries=0, path=path, disk_max=2)
+    assert new.get(new.key(b"image")) is None
+    # Workers still on the old configuration (rolling restart) keep hitting their rows
+    assert ResultCache("f1", max_entries=0, path=path).get(old.key(b"image")) == RESPONSE
+
+    # The size limit reclaims them once newer results push them out
+    monkeypatch.setattr(result_cache, "PRUNE_EVERY", 1)
+    for i in range(2):
+        new.put(new.key(b"image %d" % i), RESPONSE)
+    assert ResultCache("f1", max_entries=0, path=path).get(old.key(b"image")) is None
+    assert ResultCache("f2", max_entries=0, path=path).get(new.key(b"image 1")) == RESPONSE
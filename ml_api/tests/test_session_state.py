@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+import session_state
+from session_state import SessionStateStore
+
+
+class FakeMesh:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock for the session store."""
+    now = [1000.0]
+    monkeypatch.setattr(session_state, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_sessions_get_their_own_state():
+    store = SessionStateStore(mesh_factory=FakeMesh)
+    first, second = store.get("a"), store.get("b")
+    assert first is store.get("a") and first is not second
+    assert first.face_mesh is not second.face_mesh
+    first.rule_history[0] = "x"
+    assert second.rule_history == {}
+
+
+def test_face_mesh_is_created_on_first_use():
+    created = []
+    store = SessionStateStore(mesh_factory=lambda: created.append(FakeMesh()) or created[-1])
+    state = store.get("a")
+    assert created == []
+    assert state.face_mesh is state.face_mesh and len(created) == 1
+
+
+def test_least_recently_used_session_is_evicted_and_closed(clock):
+    store = SessionStateStore(mesh_factory=FakeMesh, max_sessions=2)
+    a = store.get("a")
+    mesh_a = a.face_mesh
+    mesh_b = store.get("b").face_mesh
+    store.get("a")       # b is now the least recently used
+    store.get("c")
+    assert len(store) == 2
+    assert mesh_b.closed and not mesh_a.closed
+    assert store.get("a") is a
+
+
+def test_idle_sessions_expire_after_the_ttl(clock):
+    store = SessionStateStore(mesh_factory=FakeMesh, ttl_seconds=60)
+    old = store.get("old")
+    mesh = old.face_mesh
+    clock[0] += 30
+    store.get("recent")
+    clock[0] += 31
+    store.get("recent")
+    assert len(store) == 1 and mesh.closed
+    assert store.get("old") is not old
+
+
+def test_discard_and_clear_release_meshes():
+    store = SessionStateStore(mesh_factory=FakeMesh)
+    meshes = [store.get(session).face_mesh for session in ("a", "b", "c")]
+    store.discard("a")
+    store.discard("missing")
+    assert meshes[0].closed and len(store) == 2
+    store.clear()
+    assert all(mesh.closed for mesh in meshes) and len(store) == 0
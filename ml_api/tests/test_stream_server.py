@@ -0,0 +1,168 @@
+import asyncio
+import gc
+import json
+import threading
+import time
+import weakref
+
+import pytest
+
+pytest.importorskip("websockets")
+pytest.importorskip("mediapipe")
+pytest.importorskip("ultralytics")
+stream_server = pytest.importorskip("stream_server")  # imports ml_service, which loads the models
+
+
+class FakeSocket:
+    """Client connection: frames are pushed into `incoming`, results collected in `sent`."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def send(self, text):
+        self.sent.append(json.loads(text))
+
+    def frame(self, session_id, frame_id):
+        self.incoming.put_nowait(json.dumps({"sessionId": session_id, "frameId": frame_id, "image": "aGk="}))
+
+    def by_frame(self, frame_id):
+        return next(message for message in self.sent if message.get("frameId") == frame_id)
+
+
+class BlockingAnalyze:
+    """Stand-in for stream_server.analyze: frames listed in `hold` wait until released."""
+
+    def __init__(self, hold=()):
+        self.hold = {frame_id: threading.Event() for frame_id in hold}
+        self.started = []
+
+    def __call__(self, header, image_bytes, image_b64):
+        self.started.append(header["frameId"])
+        event = self.hold.get(header["frameId"])
+        if event is not None:
+            event.wait(5)
+        return {"violations": []}
+
+    def release(self, frame_id):
+        self.hold[frame_id].set()
+
+
+async def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.002)
+
+
+def run_connection(server, scenario):
+    """Run server.handle on a FakeSocket while `scenario(socket)` drives it."""
+    async def main():
+        socket = FakeSocket()
+        handler = asyncio.create_task(server.handle(socket))
+        try:
+            await scenario(socket)
+        finally:
+            socket.incoming.put_nowait(None)
+            await handler
+        return socket
+    return asyncio.run(main())
+
+
+def test_newer_frame_supersedes_a_pending_one(monkeypatch):
+    analyze = BlockingAnalyze(hold=[1])
+    monkeypatch.setattr(stream_server, "analyze", analyze)
+    server = stream_server.StreamServer(workers=2, max_queued=8)
+
+    async def scenario(socket):
+        socket.frame("a", 1)
+        await until(lambda: analyze.started == [1])
+        socket.frame("a", 2)
+        socket.frame("a", 3)
+        await until(lambda: len(socket.sent) == 1)
+        analyze.release(1)
+        await until(lambda: len(socket.sent) == 3)
+
+    socket = run_connection(server, scenario)
+    assert socket.sent[0] == {"frameId": 2, "sessionId": "a", "dropped": True, "reason": "superseded"}
+    assert [message["frameId"] for message in socket.sent[1:]] == [1, 3]
+    assert analyze.started == [1, 3]
+    assert server.stats.dropped == {"superseded": 1}
+
+
+def test_new_sessions_are_dropped_when_too_many_lanes_wait(monkeypatch):
+    analyze = BlockingAnalyze(hold=[1])
+    monkeypatch.setattr(stream_server, "analyze", analyze)
+    server = stream_server.StreamServer(workers=1, max_queued=1)
+
+    async def scenario(socket):
+        socket.frame("a", 1)                        # takes the only slot
+        await until(lambda: analyze.started == [1])
+        socket.frame("b", 2)                        # waits for the slot
+        await until(lambda: server.queued == 1)
+        socket.frame("c", 3)                        # nothing left to wait in
+        await until(lambda: len(socket.sent) == 1)
+        analyze.release(1)
+        await until(lambda: len(socket.sent) == 3)
+
+    socket = run_connection(server, scenario)
+    assert socket.by_frame(3) == {"frameId": 3, "sessionId": "c", "dropped": True, "reason": "overloaded"}
+    assert "violations" in socket.by_frame(1) and "violations" in socket.by_frame(2)
+    assert server.queued == 0
+
+
+def test_frames_that_waited_too_long_are_stale(monkeypatch):
+    analyze = BlockingAnalyze(hold=[1])
+    monkeypatch.setattr(stream_server, "analyze", analyze)
+    server = stream_server.StreamServer(workers=1, max_queued=8, max_age_ms=20)
+
+    async def scenario(socket):
+        socket.frame("a", 1)
+        await until(lambda: analyze.started == [1])
+        socket.frame("b", 2)
+        await asyncio.sleep(0.05)
+        analyze.release(1)
+        await until(lambda: len(socket.sent) == 2)
+
+    socket = run_connection(server, scenario)
+    assert socket.by_frame(2) == {"frameId": 2, "sessionId": "b", "dropped": True, "reason": "stale"}
+    assert analyze.started == [1]
+
+
+def test_idle_session_lanes_are_released(monkeypatch):
+    monkeypatch.setattr(stream_server, "analyze", BlockingAnalyze())
+    lanes = weakref.WeakSet()
+
+    class TrackedLane(stream_server.SessionLane):
+        def __init__(self):
+            super().__init__()
+            lanes.add(self)
+
+    monkeypatch.setattr(stream_server, "SessionLane", TrackedLane)
+    server = stream_server.StreamServer(workers=4, max_queued=1000)
+
+    async def scenario(socket):
+        # Many exam sessions over one long-lived connection
+        for i in range(200):
+            socket.frame(f"session-{i}", i)
+        await until(lambda: len(socket.sent) == 200)
+        await until(lambda: server.queued == 0)
+        gc.collect()
+        # At most the handler's loop variable still points at the last lane
+        assert len(lanes) <= 1
+        # A session seen again later gets a fresh lane and is still served
+        socket.frame("session-0", 1000)
+        await until(lambda: len(socket.sent) == 201)
+
+    socket = run_connection(server, scenario)
+    assert socket.by_frame(1000)["violations"] == []
+    assert server.queued == 0
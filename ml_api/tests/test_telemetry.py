@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import telemetry
+from telemetry import Counter, Gauge, Histogram, Registry
+
+ML_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_counter_renders_one_series_per_label_set():
+    registry = Registry()
+    frames = Counter("test_frames_total", "Frames", ["result"], registry=registry)
+    frames.inc("ok")
+    frames.inc("ok", amount=2)
+    frames.inc("dropped")
+    text = registry.render()
+    assert "# TYPE test_frames_total counter" in text
+    assert f'test_frames_total{{result="ok",pid="{telemetry.PID}"}} 3' in text
+    assert f'test_frames_total{{result="dropped",pid="{telemetry.PID}"}} 1' in text
+    assert text.endswith("\n")
+
+
+def test_wrong_label_count_is_rejected():
+    frames = Counter("test_labels_total", "Frames", ["result"], registry=Registry())
+    with pytest.raises(ValueError):
+        frames.inc()
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    Counter("test_escape_total", "Escape", ["type"], registry=registry).inc('a"b\\c\nd')
+    assert 'type="a\\"b\\\\c\\nd"' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = Registry()
+    latency = Histogram("test_seconds", "Latency", ["stage"], buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "yolo")
+    lines = registry.render().splitlines()
+    pid = telemetry.PID
+    assert f'test_seconds_bucket{{stage="yolo",pid="{pid}",le="0.1"}} 2' in lines
+    assert f'test_seconds_bucket{{stage="yolo",pid="{pid}",le="1.0"}} 3' in lines
+    assert f'test_seconds_bucket{{stage="yolo",pid="{pid}",le="+Inf"}} 4' in lines
+    assert f'test_seconds_sum{{stage="yolo",pid="{pid}"}} 3.65' in lines
+    assert f'test_seconds_count{{stage="yolo",pid="{pid}"}} 4' in lines
+
+
+def test_histogram_time_observes_even_when_the_block_raises():
+    registry = Registry()
+    latency = Histogram("test_timed_seconds", "Latency", ["stage"], registry=registry)
+    with pytest.raises(RuntimeError):
+        with latency.time("face"):
+            raise RuntimeError("boom")
+    assert f'test_timed_seconds_count{{stage="face",pid="{telemetry.PID}"}} 1' in registry.render()
+
+
+def test_gauge_reads_its_callback_at_render_time():
+    registry = Registry()
+    depth = {"value": 1}
+    Gauge("test_depth", "Depth", lambda: depth["value"], registry=registry)
+    Gauge("test_sizes", "Sizes", lambda: {("a",): 2, ("b",): 5}, labelnames=["name"], registry=registry)
+    depth["value"] = 7
+    text = registry.render()
+    assert f'test_depth{{pid="{telemetry.PID}"}} 7' in text
+    assert f'test_sizes{{name="b",pid="{telemetry.PID}"}} 5' in text
+
+
+def test_failing_gauge_is_skipped_not_raised():
+    registry = Registry()
+    Gauge("test_broken", "Broken", lambda: 1 / 0, registry=registry)
+    Counter("test_after_total", "After", registry=registry).inc()
+    text = registry.render()
+    assert "# TYPE test_broken gauge" in text and "test_broken{" not in text
+    assert f'test_after_total{{pid="{telemetry.PID}"}} 1' in text
+
+
+def test_count_violations_counts_each_type():
+    before = dict(telemetry.VIOLATIONS._values)
+    telemetry.count_violations(["no_face", "phone", "phone"])
+    values = telemetry.VIOLATIONS._values
+    assert values[("phone",)] - before.get(("phone",), 0) == 2
+    assert values[("no_face",)] - before.get(("no_face",), 0) == 1
+
+
+def test_log_frame_follows_the_sample_rate(monkeypatch, caplog):
+    caplog.set_level("INFO", logger="ml.frames")
+    monkeypatch.setattr(telemetry, "FRAME_LOG_SAMPLE", 0.0)
+    telemetry.log_frame("frame %s", "skipped")
+    monkeypatch.setattr(telemetry, "FRAME_LOG_SAMPLE", 1.0)
+    telemetry.log_frame("frame %s", "logged")
+    assert [record.getMessage() for record in caplog.records] == ["frame logged"]
+
+
+def run_isolated(script):
+    """Run a script in a fresh interpreter (async logging rewires the root logger). Returns: stdout"""
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(script)], cwd=ML_API,
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_async_logging_writes_through_the_background_listener():
+    out = run_isolated("""
+        import logging, sys, threading
+        import telemetry
+        logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(threadName)s %(message)s")
+        telemetry.configure_async_logging()
+        telemetry.configure_async_logging()
+        logging.info("hello %s", "world")
+        telemetry._listener.stop()
+        print(len(logging.getLogger().handlers))
+    """)
+    lines = out.splitlines()
+    assert lines[0] == "MainThread hello world"
+    assert lines[1] == "1"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_async_logging_restarts_its_listener_in_forked_children():
+    out = run_isolated("""
+        import logging, os, sys
+        import telemetry
+        logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(process)d %(message)s")
+        telemetry.configure_async_logging()
+        # Fork while the listener is idle, not halfway through writing a record
+        pid = os.fork()
+        if pid == 0:
+            logging.info("child pid label %s", telemetry.PID == str(os.getpid()))
+            telemetry._listener.stop()
+            sys.stdout.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        logging.info("parent")
+        telemetry._listener.stop()
+    """)
+    assert "parent" in out
+    assert "child pid label True" in out
@@ -0,0 +1,97 @@
+import numpy as np
+
+from tracker import SessionTracker, greedy_match, iou_matrix
+
+
+def phone(x, score=0.9):
+    return ("cell phone", score, (x, 100.0, x + 60.0, 200.0))
+
+
+def test_iou_matrix():
+    iou = iou_matrix([(0, 0, 10, 10)], [(0, 0, 10, 10), (5, 0, 15, 10), (20, 20, 30, 30)])
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]])
+
+
+def test_greedy_match_uses_each_row_and_column_once():
+    iou = np.array([[0.9, 0.8], [0.85, 0.1]])
+    assert greedy_match(iou, 0.3) == [(0, 0)]
+    assert greedy_match(np.array([[0.9, 0.8], [0.85, 0.4]]), 0.3) == [(0, 0), (1, 1)]
+
+
+def test_moving_object_keeps_its_identity():
+    tracker = SessionTracker(detect_every=1)
+    for step in range(5):
+        tracker.update([phone(100.0 + 8 * step)], float(step))
+    tracks = tracker.describe()
+    assert len(tracker) == 1
+    assert tracks[0]["id"] == 1 and tracks[0]["frames"] == 5 and tracks[0]["duration"] == 4.0
+
+
+def test_labels_never_match_each_other():
+    tracker = SessionTracker(detect_every=1)
+    tracker.update([phone(100.0)], 0.0)
+    tracker.update([("book", 0.9, (100.0, 100.0, 160.0, 200.0))], 1.0)
+    assert sorted(track["label"] for track in tracker.describe()) == ["book"]
+    assert len(tracker) == 2
+
+
+def test_track_survives_max_missed_frames_then_is_dropped():
+    tracker = SessionTracker(max_missed=2, detect_every=1)
+    tracker.update([phone(100.0)], 0.0)
+    tracker.update([], 1.0)
+    tracker.update([], 2.0)
+    assert len(tracker) == 1 and tracker.describe() == []
+    tracker.update([phone(100.0)], 3.0)
+    assert tracker.describe()[0]["id"] == 1
+    for now in (4.0, 5.0, 6.0):
+        tracker.update([], now)
+    assert len(tracker) == 0
+
+
+def test_a_tracked_object_is_reported_once():
+    tracker = SessionTracker(detect_every=1)
+    tracker.update([phone(100.0)], 0.0)
+    assert tracker.pending() == [("cell phone", 0.9)]
+    assert tracker.mark_reported({"cell phone"}) == [1]
+    tracker.update([phone(104.0)], 1.0)
+    assert tracker.pending() == []
+    assert tracker.mark_reported({"cell phone"}) == []
+    # A second phone is a new object
+    tracker.update([phone(104.0), phone(400.0)], 2.0)
+    assert tracker.mark_reported({"cell phone"}) == [2]
+
+
+def test_min_hits_delays_confirmation():
+    tracker = SessionTracker(min_hits=2, detect_every=1)
+    tracker.update([phone(100.0)], 0.0)
+    assert tracker.pending() == []
+    tracker.update([phone(102.0)], 1.0)
+    assert tracker.pending() == [("cell phone", 0.9)]
+
+
+def test_failed_detection_hides_stale_tracks():
+    tracker = SessionTracker(detect_every=1)
+    tracker.update([phone(100.0)], 0.0)
+    tracker.miss(1.0)
+    assert tracker.pending() == [] and tracker.describe() == []
+    assert len(tracker) == 1
+
+
+def test_carry_reuses_predicted_boxes_between_detector_frames():
+    tracker = SessionTracker(detect_every=3)
+    assert tracker.should_detect()
+    tracker.update([phone(100.0)], 0.0)
+    tracker.update([phone(110.0)], 1.0)
+    # Frames 0 and 1 ran the detector; frame 2 is carried, frame 3 detects again
+    assert not tracker.should_detect() and tracker.should_detect(1)
+    (label, score, box), = tracker.carry(2.0)
+    assert label == "cell phone" and score == 0.9
+    # Constant velocity: the box keeps moving right
+    assert box[0] > 110.0 and abs(box[2] - box[0] - 60.0) < 1.0
+    assert tracker.describe()[0]["duration"] == 2.0
+
+
+def test_detector_runs_when_there_are_no_tracks():
+    tracker = SessionTracker(detect_every=5)
+    tracker.update([], 0.0)
+    assert tracker.should_detect()
@@ -0,0 +1,106 @@
+import pytest
+
+from violation_rules import RuleEngine, VIOLATION_CODES
+
+CLEAN = {"face_count": 1, "person_count": 1, "gaze": "center", "head_pose": (0.0, 0.0, 0.0), "objects": []}
+
+
+def observe(**changes):
+    return dict(CLEAN, **changes)
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return RuleEngine.load()
+
+
+def test_default_table_uses_backend_codes(rules):
+    assert {rule.code for rule in rules.rules} <= set(VIOLATION_CODES)
+    assert rules.evaluate(CLEAN) == []
+
+
+@pytest.mark.parametrize("changes, code", [
+    ({"face_count": 0}, "ml_no_face_detected"),
+    ({"face_count": 2}, "ml_multiple_faces_detected"),
+    ({"person_count": 3}, "ml_multiple_faces_detected"),
+    ({"gaze": "left"}, "ml_gaze_away"),
+    ({"head_pose": (0.0, 20.0, 0.0)}, "ml_head_pose_away"),
+    ({"head_pose": (-16.0, 0.0, 0.0)}, "ml_head_pose_away"),
+    ({"objects": [("cell phone", 0.9)]}, "ml_object_detected"),
+])
+def test_each_rule_fires_on_its_signal(rules, changes, code):
+    assert rules.evaluate(observe(**changes)) == [code]
+
+
+def test_codes_are_reported_once_per_frame(rules):
+    assert rules.evaluate(observe(face_count=2, person_count=2)) == ["ml_multiple_faces_detected"]
+
+
+def test_single_face_rules_need_exactly_one_face(rules):
+    assert rules.evaluate(observe(face_count=2, gaze="left", head_pose=(0.0, 40.0, 0.0))) == \
+        ["ml_multiple_faces_detected"]
+
+
+def test_objects_below_confidence_or_unlisted_are_ignored(rules):
+    assert rules.evaluate(observe(objects=[("cell phone", 0.3), ("person", 0.99), ("cup", 0.9)])) == []
+
+
+def test_persistence_needs_hits_within_the_window(rules):
+    phone, clear = observe(objects=[("cell phone", 0.9)]), CLEAN
+    history = {}
+    # hits 2 of window 3
+    assert rules.evaluate(phone, history) == []
+    assert rules.evaluate(clear, history) == []
+    assert rules.evaluate(phone, history) == ["ml_object_detected"]
+    assert rules.evaluate(clear, history) == []
+    assert rules.evaluate(phone, history) == ["ml_object_detected"]
+    assert rules.evaluate(clear, history) == []
+    assert rules.evaluate(clear, history) == []
+
+
+def test_persistence_is_per_history(rules):
+    phone = observe(objects=[("cell phone", 0.9)])
+    first, second = {}, {}
+    rules.evaluate(phone, first)
+    assert rules.evaluate(phone, second) == []
+    assert rules.evaluate(phone, first) == ["ml_object_detected"]
+
+
+def test_without_history_persistent_rules_fire_on_first_hit(rules):
+    assert rules.evaluate(observe(objects=[("book", 0.6)])) == ["ml_object_detected"]
+
+
+def test_object_codes_and_labels(rules):
+    assert rules.object_codes() == {"ml_object_detected"}
+    assert "cell phone" in rules.object_labels(["ml_object_detected"])
+    assert rules.object_labels(["ml_gaze_away"]) == set()
+
+
+def test_object_code_shared_with_another_signal_is_not_once_per_track():
+    engine = RuleEngine({"rules": [
+        {"code": "x", "signal": "objects", "classes": ["Cell Phone"]},
+        {"code": "x", "signal": "face_count", "equals": 0},
+        {"code": "y", "signal": "objects", "classes": ["book"]},
+    ]})
+    assert engine.object_codes() == {"y"}
+    assert engine.object_labels(["x"]) == {"cell phone"}
+
+
+def test_fingerprint_follows_table_contents():
+    table = {"version": "1", "rules": [{"code": "a", "signal": "face_count", "equals": 0}]}
+    changed = {"version": "1", "rules": [{"code": "a", "signal": "face_count", "equals": 1}]}
+    assert RuleEngine(table).fingerprint == RuleEngine(dict(table)).fingerprint
+    assert RuleEngine(table).fingerprint != RuleEngine(changed).fingerprint
+
+
+@pytest.mark.parametrize("spec", [
+    {"code": "a", "signal": "temperature"},
+    {"signal": "face_count", "equals": 0},
+    {"code": "a", "signal": "face_count"},
+    {"code": "a", "signal": "gaze", "in": []},
+    {"code": "a", "signal": "head_pose"},
+    {"code": "a", "signal": "objects", "classes": []},
+])
+def test_invalid_rules_are_rejected(spec):
+    with pytest.raises(ValueError):
+        RuleEngine({"rules": [spec]})
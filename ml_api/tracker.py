@@ -0,0 +1,220 @@
+"""
+Per-session multi-object tracking on top of detectObjects output (pure NumPy).
+
+Each session keeps a SessionTracker. Detections are associated with existing tracks by IoU
+(same label only, greedy by best overlap) after a constant-velocity Kalman prediction, so an
+object keeps its identity across snapshots and a detection that flickers around the confidence
+threshold does not start a new object every time: a track survives up to TRACK_MAX_MISSED frames
+without a detection. All tracks of a session are predicted and updated as arrays at once.
+
+With TRACK_DETECT_EVERY = N > 1 the detector only runs on every Nth frame of a session; the
+frames in between reuse the tracks' predicted boxes.
+"""
+import os
+
+import numpy as np
+
+# Tracking configuration (overridable through the environment)
+TRACKING_ENABLED = os.environ.get("ML_TRACKING", "1").lower() in ("1", "true", "yes")
+TRACK_IOU_THRESHOLD = float(os.environ.get("ML_TRACK_IOU", "0.3"))      # minimum overlap to continue a track
+TRACK_MAX_MISSED = int(os.environ.get("ML_TRACK_MAX_MISSED", "3"))      # frames a track survives without a detection
+TRACK_MIN_HITS = int(os.environ.get("ML_TRACK_MIN_HITS", "1"))          # detections before a track is reported
+TRACK_DETECT_EVERY = int(os.environ.get("ML_TRACK_DETECT_EVERY", "1"))  # run the detector on every Nth frame
+
+# Constant-velocity model over (cx, cy, w, h, vx, vy), one step per analyzed frame, in pixels
+_F = np.eye(6)
+_F[0, 4] = _F[1, 5] = 1.0
+_H = np.eye(4, 6)
+_Q = np.diag([25.0, 25.0, 25.0, 25.0, 10.0, 10.0])    # process noise
+_R = np.diag([16.0, 16.0, 16.0, 16.0])                # measurement noise
+_P0 = np.diag([16.0, 16.0, 16.0, 16.0, 1000.0, 1000.0])  # new tracks: position known, velocity not
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes. Returns: (N, M)"""
+    a, b = np.asarray(a, dtype=np.float64).reshape(-1, 4), np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, inter / union, 0.0)
+
+
+def _boxes(states):
+    """(N, 6) Kalman states -> (N, 4) x1, y1, x2, y2 boxes."""
+    cx, cy, w, h = states[:, 0], states[:, 1], np.maximum(states[:, 2], 1.0), np.maximum(states[:, 3], 1.0)
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def _measurements(boxes):
+    """(N, 4) x1, y1, x2, y2 boxes -> (N, 4) cx, cy, w, h."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2,
+                     boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]], axis=1)
+
+
+def greedy_match(iou, threshold):
+    """Pairs (row, column) by descending IoU, each row and column used once. Returns: list of pairs"""
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows, used_cols, pairs = set(), set(), []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row not in used_rows and col not in used_cols:
+            used_rows.add(row)
+            used_cols.add(col)
+            pairs.append((row, col))
+    return pairs
+
+
+class SessionTracker:
+    """
+    Tracks of one session. Not thread-safe: use it under the session's SessionState.lock.
+
+    A track is visible while it was detected on the latest detector frame. Visible, confirmed
+    tracks that have not been reported yet are `pending`; once the violation rules fired for
+    them they are marked reported and never raise a violation again.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_missed=TRACK_MAX_MISSED,
+                 min_hits=TRACK_MIN_HITS, detect_every=TRACK_DETECT_EVERY):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max(0, int(max_missed))
+        self.min_hits = max(1, int(min_hits))
+        self.detect_every = max(1, int(detect_every))
+        self.frames = 0          # frames seen, detector or carried
+        self._next_id = 1
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.labels = np.empty(0, dtype=object)
+        self.scores = np.empty(0)
+        self.x = np.empty((0, 6))
+        self.P = np.empty((0, 6, 6))
+        self.hits = np.empty(0, dtype=np.int64)
+        self.missed = np.empty(0, dtype=np.int64)
+        self.first_seen = np.empty(0)
+        self.last_seen = np.empty(0)
+        self.reported = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def should_detect(self, offset=0):
+        """Whether the session's frame `offset` frames from now needs the detector (every Nth frame, or no tracks)."""
+        return self.detect_every <= 1 or (self.frames + offset) % self.detect_every == 0 or not len(self.ids)
+
+    def update(self, detections, now):
+        """
+        Advance one detector frame.
+
+        Args:
+            detections (list): (label, score, (x1, y1, x2, y2)) tuples, e.g. detectObjects' labels_this_frame.
+            now (float): Frame time in seconds (monotonic), for track durations.
+        """
+        self.frames += 1
+        self._predict()
+
+        labels = np.array([label for label, _, _ in detections], dtype=object)
+        scores = np.array([score for _, score, _ in detections], dtype=np.float64)
+        boxes = np.array([bbox for _, _, bbox in detections], dtype=np.float64).reshape(-1, 4)
+
+        iou = iou_matrix(_boxes(self.x), boxes)
+        iou[self.labels[:, None] != labels[None, :]] = 0.0
+        pairs = greedy_match(iou, self.iou_threshold)
+
+        matched_tracks = np.array([t for t, _ in pairs], dtype=np.int64)
+        matched_dets = np.array([d for _, d in pairs], dtype=np.int64)
+        self.missed += 1
+        if len(pairs):
+            self._correct(matched_tracks, _measurements(boxes[matched_dets]))
+            self.missed[matched_tracks] = 0
+            self.hits[matched_tracks] += 1
+            self.scores[matched_tracks] = scores[matched_dets]
+            self.last_seen[matched_tracks] = now
+
+        self._drop(self.missed > self.max_missed)
+
+        new = np.setdiff1d(np.arange(len(detections)), matched_dets)
+        if len(new):
+            self._add(labels[new], scores[new], boxes[new], now)
+
+    def miss(self, now):
+        """Advance one detector frame on which detection failed: every track goes one frame unseen."""
+        self.update([], now)
+
+    def carry(self, now):
+        """
+        Advance one frame without the detector: predicted boxes of the visible tracks.
+        Returns: (label, score, (x1, y1, x2, y2)) tuples shaped like detectObjects' labels_this_frame
+        """
+        self.frames += 1
+        self._predict()
+        visible = self.missed == 0
+        self.last_seen[visible] = now
+        return [(label, score, tuple(box)) for label, score, box in
+                zip(self.labels[visible].tolist(), self.scores[visible].tolist(), _boxes(self.x[visible]).tolist())]
+
+    def pending(self):
+        """(label, score) of visible, confirmed tracks that have not raised a violation yet."""
+        mask = self._confirmed() & ~self.reported
+        return list(zip(self.labels[mask].tolist(), self.scores[mask].tolist()))
+
+    def mark_reported(self, labels):
+        """Pending tracks with one of `labels` have raised their violation. Returns: their track ids"""
+        mask = self._confirmed() & ~self.reported & np.isin(self.labels, list(labels))
+        self.reported |= mask
+        return self.ids[mask].tolist()
+
+    def describe(self, new_ids=()):
+        """Visible, confirmed tracks for the response: id, label, duration (s), frames seen, reported this frame."""
+        mask = self._confirmed()
+        new_ids = set(new_ids)
+        return [{"id": track_id, "label": label, "duration": round(last - first, 2), "frames": hits,
+                 "new": track_id in new_ids}
+                for track_id, label, first, last, hits in zip(
+                    self.ids[mask].tolist(), self.labels[mask].tolist(), self.first_seen[mask].tolist(),
+                    self.last_seen[mask].tolist(), self.hits[mask].tolist())]
+
+    def _confirmed(self):
+        return (self.missed == 0) & (self.hits >= self.min_hits)
+
+    def _predict(self):
+        if len(self.ids):
+            self.x = self.x @ _F.T
+            self.P = _F @ self.P @ _F.T + _Q
+
+    def _correct(self, tracks, measurements):
+        """Kalman update of the matched tracks, all at once."""
+        P = self.P[tracks]
+        S = _H @ P @ _H.T + _R                       # (k, 4, 4)
+        K = P @ _H.T @ np.linalg.inv(S)              # (k, 6, 4)
+        residual = measurements - self.x[tracks] @ _H.T
+        self.x[tracks] += np.einsum("kij,kj->ki", K, residual)
+        self.P[tracks] = (np.eye(6) - K @ _H) @ P
+
+    def _add(self, labels, scores, boxes, now):
+        count = len(labels)
+        states = np.zeros((count, 6))
+        states[:, :4] = _measurements(boxes)
+        self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + count)])
+        self._next_id += count
+        self.labels = np.concatenate([self.labels, labels])
+        self.scores = np.concatenate([self.scores, scores])
+        self.x = np.concatenate([self.x, states])
+        self.P = np.concatenate([self.P, np.repeat(_P0[None], count, axis=0)])
+        self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+        self.missed = np.concatenate([self.missed, np.zeros(count, dtype=np.int64)])
+        self.first_seen = np.concatenate([self.first_seen, np.full(count, now)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(count, now)])
+        self.reported = np.concatenate([self.reported, np.zeros(count, dtype=bool)])
+
+    def _drop(self, mask):
+        if not np.any(mask):
+            return
+        keep = ~mask
+        for name in ("ids", "labels", "scores", "x", "P", "hits", "missed", "first_seen", "last_seen", "reported"):
+            setattr(self, name, getattr(self, name)[keep])
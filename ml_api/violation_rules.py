@@ -0,0 +1,171 @@
+"""
+Data-driven violation rules shared by both ML servers.
+
+The rule table (violation_rules.json, or the file named by ML_VIOLATION_RULES) maps per-frame
+observations to the canonical violation codes counted by the backend Session schema. Each rule
+names one signal of the observation and a condition on it:
+
+    {"code": "ml_gaze_away", "signal": "gaze", "in": ["left", "right"], "single_face": true}
+    {"code": "ml_object_detected", "signal": "objects", "classes": ["cell phone"],
+     "min_confidence": 0.5, "persist": {"hits": 2, "window": 3}}
+
+Signals and their conditions:
+    face_count, person_count   equals / min / max
+    gaze                       in (list of gaze labels)
+    head_pose                  max_abs_pitch / max_abs_yaw / max_abs_roll (degrees)
+    objects                    classes (model labels), min_confidence
+
+`single_face` limits a rule to frames with exactly one face. `persist` only reports a rule
+once it held in `hits` of the session's last `window` frames. The table is compiled once at
+startup into plain closures over sets and dicts, so evaluating a frame does no string scanning.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+
+RULES_PATH = os.environ.get("ML_VIOLATION_RULES",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "violation_rules.json"))
+
+# Violation codes the backend Session schema keeps counts for
+VIOLATION_CODES = (
+    "ml_no_face_detected",
+    "ml_multiple_faces_detected",
+    "ml_head_pose_away",
+    "ml_gaze_away",
+    "ml_object_detected",
+)
+
+
+def _count_condition(signal, spec):
+    equals, minimum, maximum = spec.get("equals"), spec.get("min"), spec.get("max")
+    if equals is None and minimum is None and maximum is None:
+        raise ValueError(f"{signal} rule needs equals, min or max")
+
+    def check(observation):
+        value = observation.get(signal)
+        if value is None:
+            return False
+        return ((equals is None or value == equals) and (minimum is None or value >= minimum)
+                and (maximum is None or value <= maximum))
+    return check
+
+
+def _gaze_condition(signal, spec):
+    labels = frozenset(spec.get("in", ()))
+    if not labels:
+        raise ValueError("gaze rule needs a non-empty `in` list")
+    return lambda observation: observation.get("gaze") in labels
+
+
+def _head_pose_condition(signal, spec):
+    limits = [(axis, float(spec[key])) for axis, key in enumerate(("max_abs_pitch", "max_abs_yaw", "max_abs_roll"))
+              if spec.get(key) is not None]
+    if not limits:
+        raise ValueError("head_pose rule needs max_abs_pitch, max_abs_yaw or max_abs_roll")
+
+    def check(observation):
+        pose = observation.get("head_pose")
+        return pose is not None and any(abs(pose[axis]) > limit for axis, limit in limits)
+    return check
+
+
+def _objects_condition(signal, spec):
+    classes = frozenset(label.lower() for label in spec.get("classes", ()))
+    if not classes:
+        raise ValueError("objects rule needs a non-empty `classes` list")
+    min_confidence = float(spec.get("min_confidence", 0.0))
+
+    def check(observation):
+        return any(score >= min_confidence and label in classes for label, score in observation.get("objects", ()))
+    return check
+
+
+CONDITIONS = {
+    "face_count": _count_condition,
+    "person_count": _count_condition,
+    "gaze": _gaze_condition,
+    "head_pose": _head_pose_condition,
+    "objects": _objects_condition,
+}
+
+
+class Rule:
+    """One compiled rule: a predicate over an observation plus its persistence window."""
+
+    def __init__(self, index, spec):
+        signal = spec.get("signal")
+        if signal not in CONDITIONS:
+            raise ValueError(f"Rule {index}: unknown signal {signal!r} (expected one of {sorted(CONDITIONS)})")
+        if not spec.get("code"):
+            raise ValueError(f"Rule {index}: missing code")
+        self.index = index
+        self.code = spec["code"]
+        self.signal = signal
+        self.single_face = bool(spec.get("single_face", False))
+        self.condition = CONDITIONS[signal](signal, spec)
+        self.classes = frozenset(label.lower() for label in spec.get("classes", ())) if signal == "objects" else frozenset()
+        persist = spec.get("persist") or {}
+        self.window = max(1, int(persist.get("window", 1)))
+        self.hits = min(self.window, max(1, int(persist.get("hits", 1))))
+
+    def matches(self, observation):
+        if self.single_face and observation.get("face_count") != 1:
+            return False
+        return self.condition(observation)
+
+
+class RuleEngine:
+    """
+    Evaluates the compiled rule table against one frame's observation:
+
+        face_count (int or None), person_count (int), gaze (str), head_pose ((pitch, yaw, roll) or None),
+        objects (list of (model label, confidence))
+
+    `history` is a dict owned by the caller's session (SessionState.rule_history) holding each
+    persistent rule's recent outcomes; without one, every rule reports on its first hit.
+    """
+
+    def __init__(self, table):
+        self.version = str(table.get("version", "0"))
+        # Changes with any edit of the table, version bump or not (result-cache invalidation)
+        self.fingerprint = hashlib.blake2b(json.dumps(table, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+        self.rules = [Rule(index, spec) for index, spec in enumerate(table.get("rules", []))]
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def evaluate(self, observation, history=None):
+        """Returns: the violation codes raised by this frame, each once, in rule-table order"""
+        codes = []
+        for rule in self.rules:
+            hit = rule.matches(observation)
+            if rule.window > 1 and history is not None:
+                outcomes = history.get(rule.index)
+                if outcomes is None:
+                    outcomes = history[rule.index] = deque(maxlen=rule.window)
+                outcomes.append(hit)
+                hit = sum(outcomes) >= rule.hits
+            if hit and rule.code not in codes:
+                codes.append(rule.code)
+        return codes
+
+    def object_codes(self):
+        """Codes raised only by `objects` rules (reported once per tracked object when tracking is on)."""
+        other = {rule.code for rule in self.rules if rule.signal != "objects"}
+        return {rule.code for rule in self.rules if rule.signal == "objects"} - other
+
+    def object_labels(self, codes):
+        """Model labels of the `objects` rules behind the given codes."""
+        labels = set()
+        for rule in self.rules:
+            if rule.signal == "objects" and rule.code in codes:
+                labels |= rule.classes
+        return labels
+
+    def describe(self):
+        """Rule table summary for /capabilities."""
+        return {"version": self.version, "fingerprint": self.fingerprint,
+                "codes": sorted({rule.code for rule in self.rules}), "rules": len(self.rules)}